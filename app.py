@@ -1,10 +1,10 @@
 import os
-from robyn import Robyn
-from controllers.dna_controller import DNAController
-from controllers.identifi_controller import IdentifiController
-from controllers.persona_controller import PersonaController
-from controllers.tweet_controller import TweetController
-from utils.libs_loader import libs_loader
+import orjson
+from robyn import Robyn, Response
+from utils.compute_pool import compute_pool
+from utils.model_sidecar import model_sidecar
+from utils.model_lifecycle import model_lifecycle
+from utils.service_profile import SERVICE_PROFILE, register_profile
 
 app = Robyn(__file__)
 
@@ -12,13 +12,28 @@ app = Robyn(__file__)
 def health_check():
     return "OK"
 
+@app.get("/ready")
+def ready_check():
+    # liveness stays on /health; this only turns 200 once this worker's models are warm
+    status = model_lifecycle.status()
+    return Response(
+        status_code=200 if status["ready"] else 503,
+        headers={"Content-Type": "application/json"},
+        description=orjson.dumps(status)
+    )
+
 print("Initializing AI Rep Service")
-libs_loader.load_all()
 
-DNAController(app)
-PersonaController(app)
-IdentifiController(app)
-TweetController(app)
+# SERVICE_PROFILE picks which controllers (and their dependencies) this pod imports
+register_profile(app, SERVICE_PROFILE)
+
+# runs in every Robyn worker process once it starts
+app.startup_handler(model_lifecycle.start)
 
 if __name__ == "__main__":
+    # inside the guard: process-kind pool workers re-import this module as __mp_main__
+    if model_sidecar.enabled:
+        # one model footprint for every Robyn process; workers connect lazily
+        model_sidecar.spawn()
+    compute_pool.start()
     app.start(host="0.0.0.0", port=8080)
@@ -0,0 +1,113 @@
+"""
+Per-badge background-removal latency: a fresh rembg session per call (the old
+DNAService path) against the persistent session pool.
+
+Modes, per model:
+    fresh   rembg.remove(image) with a new session every call, as before
+    pooled  rembg_pool.remove(image) on sessions created once up front
+    burst   `--concurrency` removals submitted at once to the pool's worker
+
+The input is a deterministic 1024x1024 badge-like RGB image (the size
+gpt-image returns), or `--image` for a real badge. Models are downloaded by
+rembg to ~/.u2net on first use.
+
+Usage (from the repo root):
+    python -m benchmarks.rembg_latency
+    python -m benchmarks.rembg_latency --models u2net u2netp silueta --runs 10
+    REMBG_POOL_SIZE=2 REMBG_ORT_THREADS=4 python -m benchmarks.rembg_latency --concurrency 4
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw
+from rembg import new_session, remove
+
+from utils.rembg_pool import RembgSessionPool, rembg_pool, session_options
+
+
+def badge_image(size: int = 1024) -> Image.Image:
+    """Glowing hexagon on a flat backdrop, close enough to a generated badge."""
+    rng = np.random.default_rng(3)
+    backdrop = (rng.normal(0, 6, (size, size, 3)) + (232, 228, 240)).clip(0, 255).astype(np.uint8)
+    image = Image.fromarray(backdrop, "RGB")
+    draw = ImageDraw.Draw(image)
+    c, r = size / 2, size * 0.36
+    hexagon = [(c + r * np.cos(a), c + r * np.sin(a)) for a in np.linspace(0, 2 * np.pi, 7)[:-1] + np.pi / 6]
+    draw.polygon(hexagon, fill=(92, 60, 190), outline=(250, 210, 90), width=size // 40)
+    draw.ellipse((c - r / 3, c - r / 3, c + r / 3, c + r / 3), fill=(90, 220, 240))
+    return image
+
+
+def percentiles(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "p50": statistics.median(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+    }
+
+
+def time_fresh(image: Image.Image, model: str, runs: int, ort_threads: int) -> list:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        remove(image, session=new_session(model, sess_opts=session_options(ort_threads)))
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def time_pooled(pool: RembgSessionPool, image: Image.Image, runs: int) -> list:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        pool.remove(image)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def time_burst(pool: RembgSessionPool, image: Image.Image, concurrency: int) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(pool.run(pool.remove, image) for _ in range(concurrency)))
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--models", nargs="+", default=["u2net", "u2netp", "silueta"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--image", help="badge PNG to use instead of the synthetic one")
+    args = parser.parse_args()
+
+    if args.image:
+        image = Image.open(args.image).convert("RGB")
+    else:
+        image = badge_image()
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    print(f"input {image.size[0]}x{image.size[1]}, {len(buffer.getvalue()) / 1024:.0f} KiB PNG; "
+          f"pool size {rembg_pool.size}, {rembg_pool.ort_threads} intra-op threads per session\n")
+
+    print(f"{'model':<10} {'fresh p50':>10} {'fresh p95':>10} {'pooled p50':>11} {'pooled p95':>11} "
+          f"{'speedup':>8} {'session ms':>11} {'burst ms/img':>13}")
+    for model in args.models:
+        # the singleton is built from env; point it at this model and rebuild its sessions
+        rembg_pool.model_name = model
+        rembg_pool._pid = None
+        rembg_pool.start()
+        rembg_pool.remove(image)  # first run pays ORT's lazy allocations in both modes
+
+        fresh = percentiles(time_fresh(image, model, args.runs, rembg_pool.ort_threads))
+        pooled = percentiles(time_pooled(rembg_pool, image, args.runs))
+        burst_ms = asyncio.run(time_burst(rembg_pool, image, args.concurrency))
+        print(f"{model:<10} {fresh['p50']:>10.0f} {fresh['p95']:>10.0f} {pooled['p50']:>11.0f} "
+              f"{pooled['p95']:>11.0f} {fresh['p50'] / pooled['p50']:>7.1f}x "
+              f"{rembg_pool.stats()['session_ms']:>11.0f} {burst_ms / args.concurrency:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
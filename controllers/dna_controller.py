@@ -1,10 +1,31 @@
-from robyn import Request, Robyn, Response
+from robyn import Headers, Request, Robyn, Response, StreamingResponse
 from typing import Dict, Any
+import os
 import orjson
 
 from services.dna_service import DNAService
-from models.requests.dna_request import RequestDigitalDNA, RequestDigitalDNAImage
+from models.requests.dna_request import (
+    RequestDNACatalog,
+    RequestDigitalDNA,
+    RequestDigitalDNAImage,
+    RequestDigitalDNAImageBatch,
+    RequestDigitalDNAImagePregenerate,
+)
 from models.responses.base_response import BaseResponse, ErrorResponse
+from utils.badge_cache import badge_cache, badge_handles, badge_json
+from utils.compute_pool import ComputePoolFullError
+from utils.dna_catalog import DNA_CATALOG_MAX_BYTES, UnknownCatalogError, dna_catalog
+from utils.image_helper import MIME_TYPES, sniff_format
+from utils.rembg_pool import rembg_pool
+
+DNA_PREGENERATE_MAX_TITLES = int(os.getenv('DNA_PREGENERATE_MAX_TITLES', '500'))
+DNA_PREGENERATE_CONCURRENCY = int(os.getenv('DNA_PREGENERATE_CONCURRENCY', '4'))
+DNA_IMAGE_BATCH_MAX_TITLES = int(os.getenv('DNA_IMAGE_BATCH_MAX_TITLES', '100'))
+DNA_IMAGE_BATCH_CONCURRENCY = int(os.getenv('DNA_IMAGE_BATCH_CONCURRENCY', '8'))
+
+# badges are content addressed: a handle's bytes never change
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+IMAGE_RESPONSE_MODES = ("json", "binary", "handle")
 
 
 class DNAController:
@@ -17,7 +38,16 @@ class DNAController:
     def _register_routes(self):
         """Register all routes for this controller"""
         self.app.post("/api/dna/generate", openapi_tags=["DNA"], openapi_name="Get Digital DNA")(self.generate_digital_dna)
+        self.app.post("/api/dna/catalog", openapi_tags=["DNA"], openapi_name="Register DNA Catalog")(self.register_dna_catalog)
+        self.app.get("/api/dna/catalog/:version", openapi_tags=["DNA"], openapi_name="Get DNA Catalog")(self.get_dna_catalog)
+        self._register_image_routes()
+
+    def _register_image_routes(self):
         self.app.post("/api/dna/image", openapi_tags=["DNA"], openapi_name="Generate DNA Image")(self.generate_dna_image)
+        self.app.post("/api/dna/image/batch", openapi_tags=["DNA"], openapi_name="Generate DNA Images")(self.generate_dna_images_batch)
+        self.app.get("/api/dna/image/stats", openapi_tags=["DNA"], openapi_name="Get DNA Image Stats")(self.get_dna_image_stats)
+        self.app.get("/api/dna/image/asset/:handle", openapi_tags=["DNA"], openapi_name="Get DNA Image Asset")(self.get_dna_image_asset)
+        self.app.post("/api/dna/image/pregenerate", openapi_tags=["DNA"], openapi_name="Pregenerate DNA Images")(self.pregenerate_dna_images)
     
     async def generate_digital_dna(self, request: Request, body: RequestDigitalDNA) -> Response:
         """
@@ -40,6 +70,51 @@ class DNAController:
                 headers={"Content-Type": "application/json"},
                 description=orjson.dumps(success_response.model_dump())
             )    
+        except UnknownCatalogError as e:
+            return self._unknown_catalog(e)
+        except ComputePoolFullError as e:
+            return self._overloaded(e)
+        except Exception as e:
+            error_response = ErrorResponse(
+                success=False,
+                message="Internal server error",
+                error_code="INTERNAL_ERROR",
+                details={"error": str(e)}
+            )
+            return Response(
+                status_code=500,
+                headers={"Content-Type": "application/json"},
+                description=orjson.dumps(error_response.model_dump())
+            )
+
+    async def register_dna_catalog(self, request: Request, body: RequestDNACatalog) -> Response:
+        """
+        Handle POST /api/dna/catalog endpoint
+
+        Register a unique_id / title catalog and return its content-hash
+        catalog_version for /api/dna/generate. Registering the same lists
+        again returns the same version.
+        """
+        try:
+            if len(request.body) > DNA_CATALOG_MAX_BYTES:
+                return self._bad_request(f"catalog body must be at most {DNA_CATALOG_MAX_BYTES} bytes")
+            payload = orjson.loads(request.body)
+            validated_payload = RequestDNACatalog(**payload)
+            try:
+                catalog, created = dna_catalog.register(validated_payload.unique_id, validated_payload.title)
+            except ValueError as e:
+                return self._bad_request(str(e))
+
+            response = BaseResponse(
+                success=True,
+                message="OK",
+                data={**DNAService.catalog_stats(catalog), "created": created}
+            )
+            return Response(
+                status_code=201 if created else 200,
+                headers={"Content-Type": "application/json"},
+                description=orjson.dumps(response.model_dump())
+            )
         except Exception as e:
             error_response = ErrorResponse(
                 success=False,
@@ -53,11 +128,127 @@ class DNAController:
                 description=orjson.dumps(error_response.model_dump())
             )
 
+    async def get_dna_catalog(self, request: Request) -> Response:
+        """
+        Handle GET /api/dna/catalog/:version endpoint
+
+        Stats of a registered catalog: label counts, the DNA mode it selects
+        and which derived structures this worker has built.
+        """
+        try:
+            catalog = dna_catalog.get(request.path_params["version"])
+            response = BaseResponse(
+                success=True,
+                message="OK",
+                data={**DNAService.catalog_stats(catalog), "store": dna_catalog.stats()}
+            )
+            return Response(
+                status_code=200,
+                headers={"Content-Type": "application/json"},
+                description=orjson.dumps(response.model_dump())
+            )
+        except UnknownCatalogError as e:
+            return self._unknown_catalog(e)
+        except Exception as e:
+            error_response = ErrorResponse(
+                success=False,
+                message="Internal server error",
+                error_code="INTERNAL_ERROR",
+                details={"error": str(e)}
+            )
+            return Response(
+                status_code=500,
+                headers={"Content-Type": "application/json"},
+                description=orjson.dumps(error_response.model_dump())
+            )
+
+    @staticmethod
+    def _unknown_catalog(error: UnknownCatalogError) -> Response:
+        # clients re-register the catalog (POST /api/dna/catalog) and retry
+        error_response = ErrorResponse(
+            success=False,
+            message=str(error),
+            error_code="UNKNOWN_CATALOG",
+        )
+        return Response(
+            status_code=404,
+            headers={"Content-Type": "application/json"},
+            description=orjson.dumps(error_response.model_dump())
+        )
+
+    @staticmethod
+    def _overloaded(error: ComputePoolFullError) -> Response:
+        # load shedding, not a bug: clients back off for Retry-After seconds and retry
+        error_response = ErrorResponse(
+            success=False,
+            message="Service overloaded, retry later",
+            error_code="OVERLOADED",
+            details={"error": str(error)}
+        )
+        return Response(
+            status_code=503,
+            headers={"Content-Type": "application/json", "Retry-After": str(error.retry_after)},
+            description=orjson.dumps(error_response.model_dump())
+        )
+
+    @staticmethod
+    def _bad_request(message: str) -> Response:
+        error_response = ErrorResponse(
+            success=False,
+            message=message,
+            error_code="BAD_REQUEST",
+        )
+        return Response(
+            status_code=400,
+            headers={"Content-Type": "application/json"},
+            description=orjson.dumps(error_response.model_dump())
+        )
+
+    @staticmethod
+    def _etag_matches(request: Request, etag: str) -> bool:
+        if_none_match = request.headers.get("if-none-match") or ""
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+    @staticmethod
+    def _image_response(request: Request, data: bytes, digest: str, extra_headers: Dict[str, str]) -> Response:
+        etag = f'"{digest}"'
+        headers = {"ETag": etag, "Cache-Control": ASSET_CACHE_CONTROL, **extra_headers}
+        if DNAController._etag_matches(request, etag):
+            return Response(status_code=304, headers=headers, description=b"")
+        return Response(
+            status_code=200,
+            headers={"Content-Type": MIME_TYPES[sniff_format(data) or "png"], **headers},
+            description=data
+        )
+
     async def generate_dna_image(self, request: Request, body: RequestDigitalDNAImage) -> Response:
+        """
+        Handle POST /api/dna/image endpoint
+
+        ?mode=json    (default) base64 image in the JSON body
+        ?mode=binary  raw image/png or image/webp body, background hex in X-Background-Hex;
+                      &size=256 picks a thumbnail
+        ?mode=handle  JSON with a handle and URL per size, fetched from /api/dna/image/asset/:handle
+        """
         try:
+            mode = request.query_params.get("mode", "json") or "json"
+            if mode not in IMAGE_RESPONSE_MODES:
+                return self._bad_request(f"mode must be one of {', '.join(IMAGE_RESPONSE_MODES)}")
+
             payload = orjson.loads(request.body)
-            result = await DNAService.generate_dna_image(RequestDigitalDNAImage(**payload))
-            response = BaseResponse(success=True, message="OK", data=result)
+            badge = await DNAService.generate_dna_image(RequestDigitalDNAImage(**payload))
+
+            if mode == "binary":
+                size = request.query_params.get("size", badge["sizes"][0]) or badge["sizes"][0]
+                if size not in badge["images"]:
+                    return self._bad_request(f"size must be one of {', '.join(badge['sizes'])}")
+                return self._image_response(request, badge["images"][size], badge["digests"][size], {
+                    "X-Background-Hex": badge["background_hex"],
+                    "X-Image-Handle": badge["digests"][size],
+                })
+
+            data = badge_handles(badge) if mode == "handle" else badge_json(badge)
+            response = BaseResponse(success=True, message="OK", data=data)
             return Response(
                 status_code=200, 
                 headers={"Content-Type": "application/json"},
@@ -74,4 +265,162 @@ class DNAController:
                 status_code=500,
                 headers={"Content-Type": "application/json"},
                 description=orjson.dumps(error_response.model_dump())
-            )
\ No newline at end of file
+            )
+
+    async def generate_dna_images_batch(self, request: Request, body: RequestDigitalDNAImageBatch):
+        """
+        Handle POST /api/dna/image/batch endpoint
+
+        Badges for many titles, streamed as NDJSON in completion order, one
+        line per title: {"index", "title", "success", "source", "data"} or
+        {"index", "title", "success": false, "error"}. ?mode=json|handle
+        picks the shape of "data" as on /api/dna/image.
+        """
+        try:
+            mode = request.query_params.get("mode", "json") or "json"
+            if mode not in ("json", "handle"):
+                return self._bad_request("mode must be one of json, handle")
+
+            payload = orjson.loads(request.body)
+            titles = payload.get("titles") if isinstance(payload, dict) else None
+            if not isinstance(titles, list) or not titles or len(titles) > DNA_IMAGE_BATCH_MAX_TITLES:
+                return self._bad_request(f"titles must be a list of 1 to {DNA_IMAGE_BATCH_MAX_TITLES} titles")
+            validated_payload = RequestDigitalDNAImageBatch(**payload)
+            to_data = badge_handles if mode == "handle" else badge_json
+
+            async def lines():
+                async for result in DNAService.generate_dna_images_batch(validated_payload.titles, DNA_IMAGE_BATCH_CONCURRENCY):
+                    if "error" in result:
+                        line = {**result, "success": False}
+                    else:
+                        badge = result.pop("badge")
+                        line = {**result, "success": True, "data": to_data(badge)}
+                    yield orjson.dumps(line) + b"\n"
+
+            return StreamingResponse(
+                content=lines(),
+                status_code=200,
+                headers=Headers({"Content-Type": "application/x-ndjson"}),
+                media_type="application/x-ndjson",
+            )
+        except Exception as e:
+            error_response = ErrorResponse(
+                success=False,
+                message="Internal server error",
+                error_code="INTERNAL_ERROR",
+                details={"error": str(e)}
+            )
+            return Response(
+                status_code=500,
+                headers={"Content-Type": "application/json"},
+                description=orjson.dumps(error_response.model_dump())
+            )
+
+    async def get_dna_image_stats(self, request: Request) -> Response:
+        """
+        Handle GET /api/dna/image/stats endpoint
+
+        This worker's badge cache, rembg pool and background-path counters.
+        """
+        response = BaseResponse(
+            success=True,
+            message="OK",
+            data={
+                "cache": badge_cache.stats(),
+                "rembg": rembg_pool.stats(),
+                "background": DNAService.image_background_stats(),
+            }
+        )
+        return Response(
+            status_code=200,
+            headers={"Content-Type": "application/json"},
+            description=orjson.dumps(response.model_dump())
+        )
+
+    async def get_dna_image_asset(self, request: Request) -> Response:
+        """
+        Handle GET /api/dna/image/asset/:handle endpoint
+
+        Badge image bytes by handle; answers 304 to a matching If-None-Match.
+        """
+        try:
+            handle = request.path_params["handle"]
+            data = await badge_cache.get_asset_async(handle)
+            if data is None:
+                error_response = ErrorResponse(
+                    success=False,
+                    message="Unknown image handle",
+                    error_code="NOT_FOUND",
+                )
+                return Response(
+                    status_code=404,
+                    headers={"Content-Type": "application/json"},
+                    description=orjson.dumps(error_response.model_dump())
+                )
+            return self._image_response(request, data, handle, {})
+        except Exception as e:
+            error_response = ErrorResponse(
+                success=False,
+                message="Internal server error",
+                error_code="INTERNAL_ERROR",
+                details={"error": str(e)}
+            )
+            return Response(
+                status_code=500,
+                headers={"Content-Type": "application/json"},
+                description=orjson.dumps(error_response.model_dump())
+            )
+
+    async def pregenerate_dna_images(self, request: Request, body: RequestDigitalDNAImagePregenerate) -> Response:
+        """
+        Handle POST /api/dna/image/pregenerate endpoint
+
+        Warm the badge cache for a list of catalog titles; titles already
+        cached are not generated again.
+        """
+        try:
+            payload = orjson.loads(request.body)
+            titles = payload.get("titles") if isinstance(payload, dict) else None
+            if not isinstance(titles, list) or not titles or len(titles) > DNA_PREGENERATE_MAX_TITLES:
+                error_response = ErrorResponse(
+                    success=False,
+                    message=f"titles must be a list of 1 to {DNA_PREGENERATE_MAX_TITLES} titles",
+                    error_code="BAD_REQUEST",
+                )
+                return Response(
+                    status_code=400,
+                    headers={"Content-Type": "application/json"},
+                    description=orjson.dumps(error_response.model_dump())
+                )
+
+            validated_payload = RequestDigitalDNAImagePregenerate(**payload)
+            results = await DNAService.pregenerate_dna_images(validated_payload.titles, DNA_PREGENERATE_CONCURRENCY)
+            response = BaseResponse(
+                success=True,
+                message="OK",
+                data={"titles": results, "cache": badge_cache.stats()}
+            )
+            return Response(
+                status_code=200,
+                headers={"Content-Type": "application/json"},
+                description=orjson.dumps(response.model_dump())
+            )
+        except Exception as e:
+            error_response = ErrorResponse(
+                success=False,
+                message="Internal server error",
+                error_code="INTERNAL_ERROR",
+                details={"error": str(e)}
+            )
+            return Response(
+                status_code=500,
+                headers={"Content-Type": "application/json"},
+                description=orjson.dumps(error_response.model_dump())
+            )
+
+
+class DNAImageController(DNAController):
+    """Only the /api/dna/image* routes, for image-only pods (SERVICE_PROFILE=dna_image)"""
+
+    def _register_routes(self):
+        self._register_image_routes()
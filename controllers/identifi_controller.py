@@ -1,10 +1,15 @@
 from robyn import Request, Robyn, Response
 from typing import Dict, Any
+import os
 import orjson
 
 from services.identifi_service import IdentifiScore
-from models.requests.identifi_request import RequestIdentifiScore, RequestIdentifiScoreV2
+from services.identifi_state_service import InvalidStateError
+from models.requests.identifi_request import RequestIdentifiScore, RequestIdentifiScoreV2, RequestIdentifiScoreV2Batch
 from models.responses.base_response import BaseResponse, ErrorResponse
+from utils.compute_pool import ComputePoolFullError
+
+IDENTIFI_BATCH_MAX_ITEMS = int(os.getenv('IDENTIFI_BATCH_MAX_ITEMS', '500'))
 
 
 class IdentifiController:
@@ -20,6 +25,37 @@ class IdentifiController:
         self.app.post("/api/identifi/v2", 
         openapi_tags=["Identifi Score"], 
         openapi_name="Get identifi score v2")(self.get_identifi_score_v2)
+        self.app.post("/api/identifi/v2/batch", 
+        openapi_tags=["Identifi Score"], 
+        openapi_name="Get identifi score v2 for many users")(self.get_identifi_score_v2_batch)
+
+    @staticmethod
+    def _overloaded(error: ComputePoolFullError) -> Response:
+        # load shedding, not a bug: clients back off for Retry-After seconds and retry
+        error_response = ErrorResponse(
+            success=False,
+            message="Service overloaded, retry later",
+            error_code="OVERLOADED",
+            details={"error": str(error)}
+        )
+        return Response(
+            status_code=503,
+            headers={"Content-Type": "application/json", "Retry-After": str(error.retry_after)},
+            description=orjson.dumps(error_response.dict())
+        )
+
+    @staticmethod
+    def _invalid_state(error: InvalidStateError) -> Response:
+        error_response = ErrorResponse(
+            success=False,
+            message=str(error),
+            error_code="INVALID_STATE",
+        )
+        return Response(
+            status_code=400,
+            headers={"Content-Type": "application/json"},
+            description=orjson.dumps(error_response.dict())
+        )
 
     async def get_identifi_score_log(self, request: Request, body: RequestIdentifiScore) -> Response:
         try:
@@ -68,6 +104,60 @@ class IdentifiController:
                 headers={"Content-Type": "application/json"},
                 description=orjson.dumps(success_response.dict())
             )  
+        except ComputePoolFullError as e:
+            return self._overloaded(e)
+        except InvalidStateError as e:
+            return self._invalid_state(e)
+        except Exception as e:
+            error_response = ErrorResponse(
+                success=False,
+                message="Internal server error",
+                error_code="INTERNAL_ERROR",
+                details={"error": str(e)}
+            )
+            return Response(
+                status_code=500,
+                headers={"Content-Type": "application/json"},
+                description=orjson.dumps(error_response.dict())
+            )
+
+    async def get_identifi_score_v2_batch(self, request: Request, body: RequestIdentifiScoreV2Batch) -> Response:
+        try:
+            payload_body = orjson.loads(body)
+            # accept {"items": [...]} or a bare list of v2 payloads
+            items = payload_body.get("items") if isinstance(payload_body, dict) else payload_body
+            if not isinstance(items, list) or not items or len(items) > IDENTIFI_BATCH_MAX_ITEMS:
+                error_response = ErrorResponse(
+                    success=False,
+                    message=f"items must be a list of 1 to {IDENTIFI_BATCH_MAX_ITEMS} payloads",
+                    error_code="BAD_REQUEST",
+                )
+                return Response(
+                    status_code=400,
+                    headers={"Content-Type": "application/json"},
+                    description=orjson.dumps(error_response.dict())
+                )
+
+            validated_payloads = []
+            for item in items:
+                try:
+                    validated_payloads.append(RequestIdentifiScoreV2(**item))
+                except Exception as e:
+                    validated_payloads.append(e)
+            result = await IdentifiScore.calculate_identifi_v2_batch(validated_payloads)
+
+            success_response = BaseResponse(
+                success=True,
+                message="OK",
+                data=result
+            )
+            return Response(
+                status_code=200,
+                headers={"Content-Type": "application/json"},
+                description=orjson.dumps(success_response.dict())
+            )
+        except ComputePoolFullError as e:
+            return self._overloaded(e)
         except Exception as e:
             error_response = ErrorResponse(
                 success=False,
@@ -79,4 +169,4 @@ class IdentifiController:
                 status_code=500,
                 headers={"Content-Type": "application/json"},
                 description=orjson.dumps(error_response.dict())
-            )
\ No newline at end of file
+            )
@@ -1,15 +1,34 @@
 
 
-from typing import List
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, model_validator
 from robyn.types import Body
 from models.requests.tweet_request import TweetUserData
 
 
 class RequestDigitalDNA(BaseModel, Body):
     socmed_data: TweetUserData
+    # a version from POST /api/dna/catalog replaces the unique_id / title lists
+    catalog_version: Optional[str] = None
+    unique_id: Optional[List[str]] = None
+    title: Optional[List[str]] = None
+
+    @model_validator(mode="after")
+    def _catalog_given(self):
+        if not self.catalog_version and (self.unique_id is None or self.title is None):
+            raise ValueError("either catalog_version or both unique_id and title are required")
+        return self
+
+class RequestDNACatalog(BaseModel, Body):
     unique_id: List[str]
     title: List[str]
 
 class RequestDigitalDNAImage(BaseModel, Body):
-    title: str
\ No newline at end of file
+    title: str
+
+class RequestDigitalDNAImagePregenerate(BaseModel, Body):
+    # catalog titles to warm the badge cache with
+    titles: List[str]
+
+class RequestDigitalDNAImageBatch(BaseModel, Body):
+    titles: List[str]
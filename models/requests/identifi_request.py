@@ -26,4 +26,11 @@ class RequestIdentifiScoreV2(TweetUserData):
     address: Optional[str]
     badges_minted: int
     quest_completed: int 
-    total_badges_reward: int
\ No newline at end of file
+    total_badges_reward: int
+    # incremental rescoring: opaque state from a previous response, tweets then only carries new ones
+    incremental: bool = False
+    state: Optional[str] = None
+
+class RequestIdentifiScoreV2Batch(BaseModel, Body):
+    # items are validated one by one, an invalid item only fails its own result
+    items: List[RequestIdentifiScoreV2]
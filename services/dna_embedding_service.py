@@ -0,0 +1,133 @@
+"""
+DNA Embedding Context - the embeddings of one digital_dna_genai call
+
+The DNA pipeline compares the same tweets and titles in several stages:
+shortlist query, unmatched-tweet detection, clustering, category
+percentages, canonical-label and proposal matching. The context encodes
+each distinct text once and keeps normalized float32 NumPy matrices, so
+every similarity is a plain matrix product:
+
+    ctx = DNAEmbeddingContext(truncated_texts, label_titles, label_embeddings)
+    with ctx.stage("find_unmatched"):
+        max_sims = ctx.tweet_label_sims().max(axis=1)
+    category_embs = ctx.text_matrix(category_titles)   # catalog titles reuse their label rows
+
+Tweets go through the per-tweet feature cache, so a user's next request
+still reuses them. ctx.report() gives wall time, encode time and encoded
+text counts per stage.
+
+label_embeddings is used as given: catalog label rows come from the label
+index, already normalized float32, and are shared with concurrent requests,
+so the context only reads them.
+
+Stages of one request run one after another, through
+compute_pool.run_local: on threads of this process whatever
+COMPUTE_POOL_KIND is, so the context (and the label matrix it shares) is
+never pickled and what one stage encodes is reused by the next.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from services.embedding_service import embedder, normalize_rows
+from utils.feature_cache import feature_cache
+
+
+class DNAEmbeddingContext:
+    """Request-scoped tweet, label and free-text embeddings."""
+
+    def __init__(self, tweets: list, label_titles: list, label_embeddings: Optional[np.ndarray]):
+        self.tweets = tweets
+        self.label_titles = label_titles
+        self.label_matrix = label_embeddings
+
+        self._tweet_rows = {str(tweet["id"]): row for row, tweet in enumerate(tweets)}
+        self._tweet_matrix: Optional[np.ndarray] = None
+        self._tweet_label_sims: Optional[np.ndarray] = None
+        self._label_rows: Optional[Dict[str, int]] = None
+        self._texts: Dict[str, np.ndarray] = {}
+
+        self._stage = "other"
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        previous, self._stage = self._stage, name
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            stat = self._stat(name)
+            stat["wall_ms"] += (time.perf_counter() - started) * 1000
+            self._stage = previous
+
+    def _stat(self, name: str) -> Dict[str, float]:
+        return self.stages.setdefault(name, {"wall_ms": 0.0, "encode_ms": 0.0, "encoded": 0, "reused": 0})
+
+    def _encoded(self, count: int, reused: int, started: float) -> None:
+        stat = self._stat(self._stage)
+        stat["encode_ms"] += (time.perf_counter() - started) * 1000
+        stat["encoded"] += count
+        stat["reused"] += reused
+
+    def tweet_matrix(self) -> np.ndarray:
+        """All tweets, (len(tweets), dim), encoded on first use."""
+        if self._tweet_matrix is None:
+            started = time.perf_counter()
+            keys = [feature_cache.key(str(tweet["id"]), tweet["tweet"]) for tweet in self.tweets]
+            embs = feature_cache.encode(keys, [tweet["tweet"] for tweet in self.tweets], embedder)
+            self._tweet_matrix = normalize_rows(embs) if len(self.tweets) else np.zeros((0, 0), dtype=np.float32)
+            self._encoded(len(self.tweets), 0, started)
+        else:
+            self._stat(self._stage)["reused"] += len(self.tweets)
+        return self._tweet_matrix
+
+    def tweet_rows(self, tweets: list) -> np.ndarray:
+        return np.asarray([self._tweet_rows[str(tweet["id"])] for tweet in tweets], dtype=np.int64)
+
+    def tweets_matrix(self, tweets: list) -> np.ndarray:
+        """Rows of a subset of the request's tweets, in `tweets` order."""
+        return self.tweet_matrix()[self.tweet_rows(tweets)]
+
+    def tweet_label_sims(self) -> np.ndarray:
+        """Cosine similarity of every tweet to every catalog label, (tweets, labels)."""
+        if self._tweet_label_sims is None:
+            self._tweet_label_sims = self.tweet_matrix() @ self.label_matrix.T
+        return self._tweet_label_sims
+
+    def text_matrix(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeddings of free texts (category and proposal titles), (len(texts), dim).
+
+        Catalog titles reuse their label rows; other texts are encoded in one
+        call and kept for later stages.
+        """
+        if self._label_rows is None:
+            self._label_rows = {}
+            for row, title in enumerate(self.label_titles if self.label_matrix is not None else []):
+                self._label_rows.setdefault(title, row)
+
+        missing = list(dict.fromkeys(
+            text for text in texts if text not in self._texts and text not in self._label_rows
+        ))
+        started = time.perf_counter()
+        if missing:
+            fresh = normalize_rows(embedder.encode(missing, normalize_embeddings=True, show_progress_bar=False))
+            self._texts.update(zip(missing, fresh))
+        self._encoded(len(missing), len(texts) - len(missing), started)
+
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([
+            self._texts[text] if text in self._texts else self.label_matrix[self._label_rows[text]]
+            for text in texts
+        ])
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {**stat, "wall_ms": round(stat["wall_ms"], 2), "encode_ms": round(stat["encode_ms"], 2)}
+            for name, stat in self.stages.items()
+        }
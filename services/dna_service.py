@@ -1,20 +1,43 @@
+import asyncio
+import contextlib
 import os
 import copy
 from collections import Counter
 from openai import AsyncOpenAI
 from models.requests.dna_request import RequestDigitalDNA, RequestDigitalDNAImage
-from utils.image_helper import get_average_hex_color
+from utils.image_helper import (
+    DNA_IMAGE_BACKGROUND,
+    DNA_IMAGE_FORMAT,
+    DNA_IMAGE_SIZES,
+    DNA_MATTE_SIZE,
+    DNA_TRANSPARENT_MIN_FRACTION,
+    ImageStages,
+    apply_mask,
+    downscale_for_matte,
+    encode_sizes,
+    get_average_hex_color,
+    transparent_fraction,
+)
 from utils.text_cleaner import emoji_to_codepoints
-from google import genai
-from google.genai.types import HarmCategory, HarmBlockThreshold
-from sentence_transformers import util
-from services.identifi_service import embedder
+from services.embedding_service import EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME, cos_sim, embedder
+from utils.compute_pool import compute_pool
+from services.dna_embedding_service import DNAEmbeddingContext
+from services.tweet_cluster_service import TweetClusterEngine
+from utils.label_index import LabelRows, label_index
+from utils.model_sidecar import model_sidecar
+from utils.model_lifecycle import model_lifecycle
+from utils.rembg_pool import rembg_pool
+from utils.badge_cache import badge_cache
+from utils.dna_catalog import DNACatalog, dna_catalog
+from utils.ann_index import DNA_ANN_KIND, build_index, load_index, save_index
+import numpy as np
 import orjson
 from PIL import Image
-from rembg import remove
 from io import BytesIO
 import base64
+import hashlib
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
@@ -33,8 +56,13 @@ DNA_UNMATCHED_THRESHOLD = float(os.getenv("DNA_UNMATCHED_THRESHOLD", "0.70"))
 DNA_UNMATCHED_MIN_TWEETS = int(os.getenv("DNA_UNMATCHED_MIN_TWEETS", "2"))
 DNA_NEW_DNA_MAX_CLUSTERS = int(os.getenv("DNA_NEW_DNA_MAX_CLUSTERS", "3"))
 DNA_CLUSTER_THRESHOLD = float(os.getenv("DNA_CLUSTER_THRESHOLD", "0.75"))
+# leader | components | complete, see services/tweet_cluster_service.py
+DNA_CLUSTER_MODE = os.getenv("DNA_CLUSTER_MODE", "leader").lower()
 DNA_NEW_DNA_NAMING_TEMPERATURE = float(os.getenv("DNA_NEW_DNA_NAMING_TEMPERATURE", "0.2"))
 
+# label embeddings and shortlist indexes are only valid for the model that produced them
+EMBEDDING_NAMESPACE = f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_BACKEND}"
+
 NEW_DNA_NAMING_SCHEMA = {
     "type": "ARRAY",
     "description": "Proposed new DNA categories for unmatched tweet clusters.",
@@ -85,12 +113,20 @@ INSIGHT_REGENERATION_SCHEMA = {
 
 DNA_INSIGHT_REGEN_TEMPERATURE = float(os.getenv("DNA_INSIGHT_REGEN_TEMPERATURE", "0.2"))
 
-SAFETY_SETTINGS = [
-    {"category": HarmCategory.HARM_CATEGORY_HATE_SPEECH, "threshold": HarmBlockThreshold.BLOCK_NONE},
-    {"category": HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT, "threshold": HarmBlockThreshold.BLOCK_NONE},
-    {"category": HarmCategory.HARM_CATEGORY_HARASSMENT, "threshold": HarmBlockThreshold.BLOCK_NONE},
-    {"category": HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT, "threshold": HarmBlockThreshold.BLOCK_NONE},
-]
+# per-process count of badges by background path, see DNAService.image_background_stats
+_IMAGE_BACKGROUND_STATS = Counter({"rembg": 0, "transparent": 0, "transparent_fallback": 0})
+
+
+def _safety_settings() -> list:
+    # the genai SDK is imported on use: image-only pods (SERVICE_PROFILE=dna_image) never load it
+    from google.genai.types import HarmCategory, HarmBlockThreshold
+
+    return [
+        {"category": HarmCategory.HARM_CATEGORY_HATE_SPEECH, "threshold": HarmBlockThreshold.BLOCK_NONE},
+        {"category": HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT, "threshold": HarmBlockThreshold.BLOCK_NONE},
+        {"category": HarmCategory.HARM_CATEGORY_HARASSMENT, "threshold": HarmBlockThreshold.BLOCK_NONE},
+        {"category": HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT, "threshold": HarmBlockThreshold.BLOCK_NONE},
+    ]
 
 
 class DNAService:
@@ -175,37 +211,111 @@ class DNAService:
         )
 
     @staticmethod
-    def _build_label_embeddings(label_titles: list):
-        if not label_titles:
-            return None
-        return embedder.encode(
-            label_titles, normalize_embeddings=True, show_progress_bar=False
+    def _encode_label_titles(label_titles: list):
+        """Normalized embeddings of catalog titles the label index does not hold yet."""
+        return np.asarray(
+            embedder.encode(label_titles, normalize_embeddings=True, show_progress_bar=False), dtype=np.float32
         )
 
     @staticmethod
-    def _build_shortlist(label_titles: list, truncated_texts: list, top_k: int):
-        if not label_titles:
-            return [], None
+    def _resolve_catalog(payload: RequestDigitalDNA) -> DNACatalog:
+        if payload.catalog_version:
+            return dna_catalog.get(payload.catalog_version)
+        return dna_catalog.inline(payload.unique_id, payload.title)
 
-        label_embeddings = DNAService._build_label_embeddings(label_titles)
+    @staticmethod
+    async def _build_label_rows(label_titles: list) -> LabelRows:
+        # looked up in this process, whatever the pool kind: the rows index this process's label index
+        counted = False
+        while True:
+            label_rows, missing = await asyncio.to_thread(
+                label_index.lookup, label_titles, EMBEDDING_NAMESPACE, not counted
+            )
+            counted = True
+            if label_rows is not None:
+                return label_rows
+            vectors = await compute_pool.run(
+                "dna.label_embeddings", DNAService._encode_label_titles, list(missing.values())
+            )
+            await asyncio.to_thread(label_index.add, EMBEDDING_NAMESPACE, list(missing), vectors)
+
+    @staticmethod
+    async def _catalog_label_embeddings(catalog: DNACatalog):
+        """
+        Label embeddings of `catalog`. The catalog keeps only its rows in the
+        label index; requests using it at the same time share one gathered matrix.
+        """
+        if not catalog.titles:
+            return None
+        while True:
+            label_rows = await catalog.derived_async(
+                "label_rows", lambda: DNAService._build_label_rows(catalog.titles)
+            )
+            label_embeddings = await asyncio.to_thread(label_index.gather, label_rows)
+            if label_embeddings is not None:
+                return label_embeddings
+            # the label index reached LABEL_INDEX_MAX_ROWS and started over since
+            catalog.discard("label_rows", label_rows)
 
-        if not truncated_texts:
-            top_k = min(top_k, len(label_titles))
-            shortlist_titles = label_titles[:top_k]
-            return shortlist_titles, label_embeddings
+    @staticmethod
+    def _build_shortlist_index(label_embeddings, path=None):
+        """ANN index over catalog label embeddings (exact below DNA_ANN_MIN_LABELS), loaded from `path` when saved."""
+        # a layout saved while DNA_ANN_KIND was ivf must not override exact search
+        if path is not None and DNA_ANN_KIND == "ivf":
+            index = load_index(path, label_embeddings)
+            if index is not None:
+                return index
+
+        index = build_index(label_embeddings)
+        if path is not None:
+            try:
+                save_index(index, path)
+            except OSError as e:
+                logger.warning("shortlist index write failed for %s: %s", path, e)
+        return index
 
-        sample_tweets = [t["tweet"] for t in truncated_texts[:30]]
-        tweet_embeddings = embedder.encode(
-            sample_tweets, normalize_embeddings=True, show_progress_bar=False
+    @staticmethod
+    async def _catalog_shortlist_index(catalog: DNACatalog):
+        """Shortlist index of `catalog`, built (or loaded from the catalog dir) once per version."""
+        label_embeddings = await DNAService._catalog_label_embeddings(catalog)
+        path = dna_catalog.artifact_path(catalog, f"ann-{re.sub(r'[^A-Za-z0-9._-]+', '_', EMBEDDING_NAMESPACE)}.npz")
+        return await catalog.derived_async(
+            "shortlist_index",
+            lambda: compute_pool.run_local(
+                "dna.shortlist_index", DNAService._build_shortlist_index, label_embeddings, path
+            ),
         )
-        query_vec = tweet_embeddings.mean(axis=0, keepdims=True)
 
-        sims = util.cos_sim(query_vec, label_embeddings)[0].cpu().numpy()
+    @staticmethod
+    def catalog_stats(catalog: DNACatalog) -> dict:
+        label_count = len(set(catalog.unique_ids))
+        if label_count < DNA_TINY_THRESHOLD:
+            mode = "tiny"
+        elif label_count < DNA_CAP_THRESHOLD:
+            mode = "discovery"
+        else:
+            mode = "classification"
+        index = catalog.peek("shortlist_index")
+        return {**catalog.stats(), "mode": mode, "shortlist_index": index.stats() if index is not None else None}
+
+    @staticmethod
+    def _build_shortlist(ctx: DNAEmbeddingContext, top_k: int, index=None) -> list:
+        label_titles = ctx.label_titles
+        if not label_titles:
+            return []
+
         top_k = min(top_k, len(label_titles))
-        top_indices = sims.argsort()[-top_k:][::-1]
-        shortlist_titles = [label_titles[i] for i in top_indices]
+        if not ctx.tweets:
+            return label_titles[:top_k]
 
-        return shortlist_titles, label_embeddings
+        with ctx.stage("shortlist"):
+            query_vec = ctx.tweet_matrix()[:30].mean(axis=0, keepdims=True)
+            if index is not None:
+                top_indices, _ = index.search(query_vec, top_k, ctx.label_matrix)
+            else:
+                sims = cos_sim(query_vec, ctx.label_matrix)[0]
+                top_indices = sims.argsort()[-top_k:][::-1]
+        return [label_titles[i] for i in top_indices]
 
     @staticmethod
     def _build_classification_schema(base_schema: dict, shortlist_titles: list) -> dict:
@@ -245,8 +355,7 @@ class DNAService:
     def _resolve_canonical_label(
         entry: dict,
         labels: set,
-        label_titles: list,
-        label_embeddings,
+        ctx: DNAEmbeddingContext,
         title_to_uid: dict,
         uid_to_title: dict,
         threshold: float,
@@ -261,16 +370,13 @@ class DNAService:
         if unique_id in labels:
             return unique_id, uid_to_title.get(unique_id, category_name), True
 
-        if label_embeddings is not None and label_titles:
-            candidate_embed = embedder.encode(
-                [category_name], normalize_embeddings=True, show_progress_bar=False
-            )
-            sims = util.cos_sim(candidate_embed, label_embeddings)[0].cpu().numpy()
+        if ctx.label_matrix is not None and ctx.label_titles:
+            sims = ctx.label_matrix @ ctx.text_matrix([category_name])[0]
             max_sim = float(sims.max())
             nearest_idx = int(sims.argmax())
 
             if max_sim >= threshold:
-                nearest_title = label_titles[nearest_idx]
+                nearest_title = ctx.label_titles[nearest_idx]
                 uid = title_to_uid.get(nearest_title) or DNAService._normalize_unique_id(nearest_title)
                 return uid, nearest_title, True
 
@@ -280,8 +386,7 @@ class DNAService:
     def _canonicalize_dna(
         dna_dict: dict,
         labels: set,
-        label_titles: list,
-        label_embeddings,
+        ctx: DNAEmbeddingContext,
         mode: str,
         threshold: float,
         title_to_uid: dict,
@@ -289,88 +394,73 @@ class DNAService:
     ):
         processed = {}
 
-        for entry in dna_dict.values():
-            unique_id, title, _ = DNAService._resolve_canonical_label(
-                entry=entry,
-                labels=labels,
-                label_titles=label_titles,
-                label_embeddings=label_embeddings,
-                title_to_uid=title_to_uid,
-                uid_to_title=uid_to_title,
-                threshold=threshold,
-            )
+        with ctx.stage("canonicalize"):
+            if ctx.label_matrix is not None:
+                # off-catalog names are matched by embedding; encode them in one call
+                ctx.text_matrix([
+                    entry["title"]
+                    for entry in dna_dict.values()
+                    if entry["title"] not in title_to_uid and entry["unique_id"] not in labels
+                ])
+
+            for entry in dna_dict.values():
+                unique_id, title, _ = DNAService._resolve_canonical_label(
+                    entry=entry,
+                    labels=labels,
+                    ctx=ctx,
+                    title_to_uid=title_to_uid,
+                    uid_to_title=uid_to_title,
+                    threshold=threshold,
+                )
 
-            if mode == "classification" and unique_id not in labels:
-                continue
+                if mode == "classification" and unique_id not in labels:
+                    continue
 
-            canonical_entry = entry.copy()
-            canonical_entry["unique_id"] = unique_id
-            canonical_entry["title"] = title
+                canonical_entry = entry.copy()
+                canonical_entry["unique_id"] = unique_id
+                canonical_entry["title"] = title
 
-            if unique_id in processed:
-                processed[unique_id]["percentage"] += canonical_entry["percentage"]
-                continue
+                if unique_id in processed:
+                    processed[unique_id]["percentage"] += canonical_entry["percentage"]
+                    continue
 
-            processed[unique_id] = canonical_entry
+                processed[unique_id] = canonical_entry
 
         return list(processed.values()), []
 
     @staticmethod
-    def _find_unmatched_tweets(truncated_texts: list, label_embeddings, threshold: float) -> list:
-        if not truncated_texts or label_embeddings is None:
+    def _find_unmatched_tweets(ctx: DNAEmbeddingContext, threshold: float) -> list:
+        if not ctx.tweets or ctx.label_matrix is None:
             return []
 
-        tweet_texts = [t["tweet"] for t in truncated_texts]
-        tweet_embs = embedder.encode(
-            tweet_texts, normalize_embeddings=True, show_progress_bar=False
-        )
-        sims = util.cos_sim(tweet_embs, label_embeddings).cpu().numpy()
-        max_sims = sims.max(axis=1)
+        with ctx.stage("find_unmatched"):
+            max_sims = ctx.tweet_label_sims().max(axis=1)
 
         return [
-            truncated_texts[idx]
+            ctx.tweets[idx]
             for idx, max_sim in enumerate(max_sims)
             if float(max_sim) < threshold
         ]
 
     @staticmethod
-    def _cluster_unmatched_tweets(unmatched_tweets: list, max_clusters: int) -> list:
+    def _cluster_unmatched_tweets(ctx: DNAEmbeddingContext, unmatched_tweets: list, max_clusters: int) -> list:
         if not unmatched_tweets:
             return []
 
-        texts = [t["tweet"] for t in unmatched_tweets]
-        embs = embedder.encode(texts, normalize_embeddings=True, show_progress_bar=False)
-        assigned = set()
-        clusters = []
-
-        for i in range(len(unmatched_tweets)):
-            if i in assigned:
-                continue
-
-            cluster = [unmatched_tweets[i]]
-            assigned.add(i)
-
-            for j in range(i + 1, len(unmatched_tweets)):
-                if j in assigned:
-                    continue
-                sim = float(util.cos_sim(embs[i : i + 1], embs[j : j + 1]).item())
-                if sim >= DNA_CLUSTER_THRESHOLD:
-                    cluster.append(unmatched_tweets[j])
-                    assigned.add(j)
-
-            clusters.append(cluster)
-            if len(clusters) >= max_clusters:
-                break
-
-        clusters.sort(key=len, reverse=True)
-        return clusters[:max_clusters]
+        with ctx.stage("cluster_unmatched"):
+            groups = TweetClusterEngine.cluster(
+                ctx.tweets_matrix(unmatched_tweets),
+                DNA_CLUSTER_THRESHOLD,
+                max_clusters,
+                mode=DNA_CLUSTER_MODE,
+            )
+        return [[unmatched_tweets[i] for i in group] for group in groups]
 
     @staticmethod
     def _filter_proposed_new_dna(
         proposals: list,
         labels: set,
-        label_titles: list,
-        label_embeddings,
+        ctx: DNAEmbeddingContext,
         threshold: float,
     ) -> list:
         if not proposals:
@@ -379,6 +469,12 @@ class DNAService:
         filtered = []
         seen_uids = set()
 
+        max_sims = {}
+        if ctx.label_matrix is not None and ctx.label_titles:
+            with ctx.stage("filter_new_dna"):
+                titles = [proposal["title"] for proposal in proposals]
+                max_sims = dict(zip(titles, (ctx.text_matrix(titles) @ ctx.label_matrix.T).max(axis=1)))
+
         for proposal in proposals:
             title = proposal["title"]
             unique_id = DNAService._normalize_unique_id(title)
@@ -386,15 +482,8 @@ class DNAService:
             if unique_id in labels or unique_id in seen_uids:
                 continue
 
-            if label_embeddings is not None and label_titles:
-                candidate_embed = embedder.encode(
-                    [title], normalize_embeddings=True, show_progress_bar=False
-                )
-                max_sim = float(
-                    util.cos_sim(candidate_embed, label_embeddings).max().item()
-                )
-                if max_sim >= threshold:
-                    continue
+            if title in max_sims and float(max_sims[title]) >= threshold:
+                continue
 
             seen_uids.add(unique_id)
             filtered.append({
@@ -410,11 +499,14 @@ class DNAService:
         client,
         unmatched_tweets: list,
         labels: set,
-        label_titles: list,
-        label_embeddings,
+        ctx: DNAEmbeddingContext,
     ) -> list:
-        clusters = DNAService._cluster_unmatched_tweets(
-            unmatched_tweets, DNA_NEW_DNA_MAX_CLUSTERS
+        clusters = await compute_pool.run_local(
+            "dna.cluster_unmatched",
+            DNAService._cluster_unmatched_tweets,
+            ctx,
+            unmatched_tweets,
+            DNA_NEW_DNA_MAX_CLUSTERS,
         )
         if not clusters:
             return []
@@ -428,7 +520,7 @@ class DNAService:
             for idx, cluster in enumerate(clusters)
         ]
 
-        existing_hint = ", ".join(label_titles[:80])
+        existing_hint = ", ".join(ctx.label_titles[:80])
         naming_prompt = f"""These tweet clusters do not match any existing DNA category closely enough.
         Existing categories (do NOT duplicate or rephrase these):
         {existing_hint}
@@ -468,11 +560,12 @@ class DNAService:
         response_text = naming_task.text.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
         proposals = orjson.loads(response_text)
 
-        return DNAService._filter_proposed_new_dna(
+        return await compute_pool.run_local(
+            "dna.filter_new_dna",
+            DNAService._filter_proposed_new_dna,
             proposals=proposals,
             labels=labels,
-            label_titles=label_titles,
-            label_embeddings=label_embeddings,
+            ctx=ctx,
             threshold=DNA_SIMILARITY_THRESHOLD,
         )
 
@@ -480,16 +573,17 @@ class DNAService:
     async def _discover_new_dna_hybrid(
         client,
         mode: str,
-        truncated_texts: list,
         labels: set,
-        label_titles: list,
-        label_embeddings,
+        ctx: DNAEmbeddingContext,
     ) -> list:
         if mode not in ("tiny", "discovery"):
             return []
 
-        unmatched = DNAService._find_unmatched_tweets(
-            truncated_texts, label_embeddings, DNA_UNMATCHED_THRESHOLD
+        unmatched = await compute_pool.run_local(
+            "dna.find_unmatched",
+            DNAService._find_unmatched_tweets,
+            ctx,
+            DNA_UNMATCHED_THRESHOLD,
         )
         if len(unmatched) < DNA_UNMATCHED_MIN_TWEETS:
             logger.info(
@@ -504,8 +598,7 @@ class DNAService:
             client=client,
             unmatched_tweets=unmatched,
             labels=labels,
-            label_titles=label_titles,
-            label_embeddings=label_embeddings,
+            ctx=ctx,
         )
 
     @staticmethod
@@ -534,27 +627,23 @@ class DNAService:
         return max(non_empty_indices, key=lambda i: sims[i, category_idx])
 
     @staticmethod
-    def _compute_category_tweet_sims(dna_list: list, truncated_texts: list):
+    def _compute_category_tweet_sims(dna_list: list, ctx: DNAEmbeddingContext):
         scorable_texts = [
             (idx, tweet)
-            for idx, tweet in enumerate(truncated_texts)
+            for idx, tweet in enumerate(ctx.tweets)
             if tweet["tweet"].strip()
         ]
         if not scorable_texts or not dna_list:
             return None
 
         tweet_indices = [idx for idx, _ in scorable_texts]
-        tweet_texts = [tweet["tweet"] for _, tweet in scorable_texts]
         category_titles = [entry["title"] for entry in dna_list]
 
-        tweet_embs = embedder.encode(
-            tweet_texts, normalize_embeddings=True, show_progress_bar=False
-        )
-        category_embs = embedder.encode(
-            category_titles, normalize_embeddings=True, show_progress_bar=False
-        )
-
-        sims = util.cos_sim(tweet_embs, category_embs).cpu().numpy()
+        with ctx.stage("category_sims"):
+            tweet_embs = ctx.tweet_matrix()[tweet_indices]
+            # canonical titles are mostly catalog titles: their label rows are reused
+            category_embs = ctx.text_matrix(category_titles)
+            sims = tweet_embs @ category_embs.T
         return {
             "sims": sims,
             "tweet_indices": tweet_indices,
@@ -717,7 +806,7 @@ class DNAService:
     @staticmethod
     def _build_llm_config(temperature: float, response_schema: dict) -> dict:
         config = {
-            "safety_settings": SAFETY_SETTINGS,
+            "safety_settings": _safety_settings(),
             "response_mime_type": "application/json",
             "response_schema": response_schema,
             "temperature": temperature,
@@ -735,10 +824,15 @@ class DNAService:
             logger.info("digital_dna_genai start %s", username)
 
             tw = payload.socmed_data.tweets
-            labels = set(payload.unique_id)
-            label_titles = list(payload.title)
-            title_to_uid = DNAService._build_title_to_uid_map(payload.title, payload.unique_id)
-            uid_to_title = DNAService._build_uid_to_title_map(payload.title, payload.unique_id)
+            catalog = DNAService._resolve_catalog(payload)
+            labels = catalog.derived("labels", lambda: set(catalog.unique_ids))
+            label_titles = catalog.titles
+            title_to_uid = catalog.derived(
+                "title_to_uid", lambda: DNAService._build_title_to_uid_map(catalog.titles, catalog.unique_ids)
+            )
+            uid_to_title = catalog.derived(
+                "uid_to_title", lambda: DNAService._build_uid_to_title_map(catalog.titles, catalog.unique_ids)
+            )
             label_count = len(labels)
 
             texts = sorted(
@@ -764,6 +858,8 @@ class DNAService:
                 raise "INSUFFICIENT_TWEETS"
 
             response_schema = DNAService._get_base_response_schema()
+            from google import genai
+
             client = genai.Client(api_key=os.getenv("GENAI_API_KEY"))
 
             dna_generated_count = 10
@@ -830,13 +926,14 @@ class DNAService:
                 str(tweet["id"]) for tweet in truncated_texts
             ]
 
-            label_embeddings = None
             active_schema = response_schema
             enum_titles = label_titles
+            label_embeddings = await DNAService._catalog_label_embeddings(catalog)
+            # every embedding stage below shares this request's tweet, label and title matrices
+            ctx = DNAEmbeddingContext(truncated_texts, label_titles, label_embeddings)
 
             if label_count < DNA_TINY_THRESHOLD:
                 mode = "tiny"
-                label_embeddings = DNAService._build_label_embeddings(label_titles)
                 enum_titles = label_titles
                 active_schema = DNAService._build_active_schema(
                     response_schema, enum_titles, eligible_tweet_ids
@@ -855,8 +952,11 @@ class DNAService:
                 temperature = DNA_TINY_TEMPERATURE
             elif label_count < DNA_CAP_THRESHOLD:
                 mode = "discovery"
-                enum_titles, label_embeddings = DNAService._build_shortlist(
-                    label_titles, truncated_texts, DNA_SHORTLIST_SIZE
+                enum_titles = await compute_pool.run_local(
+                    "dna.shortlist",
+                    DNAService._build_shortlist,
+                    ctx,
+                    DNA_SHORTLIST_SIZE,
                 )
                 active_schema = DNAService._build_active_schema(
                     response_schema, enum_titles, eligible_tweet_ids
@@ -875,8 +975,12 @@ class DNAService:
                 temperature = DNA_DISCOVERY_TEMPERATURE
             else:
                 mode = "classification"
-                enum_titles, label_embeddings = DNAService._build_shortlist(
-                    label_titles, truncated_texts, DNA_CLASSIFICATION_SHORTLIST_SIZE
+                enum_titles = await compute_pool.run_local(
+                    "dna.shortlist",
+                    DNAService._build_shortlist,
+                    ctx,
+                    DNA_CLASSIFICATION_SHORTLIST_SIZE,
+                    await DNAService._catalog_shortlist_index(catalog),
                 )
                 active_schema = DNAService._build_active_schema(
                     response_schema, enum_titles, eligible_tweet_ids
@@ -934,11 +1038,12 @@ class DNAService:
             dna_dict = DNAService._parse_llm_response(
                 response_text_dict, title_to_uid, tweet_by_id
             )
-            dna, _ = DNAService._canonicalize_dna(
+            dna, _ = await compute_pool.run_local(
+                "dna.canonicalize",
+                DNAService._canonicalize_dna,
                 dna_dict=dna_dict,
                 labels=labels,
-                label_titles=label_titles,
-                label_embeddings=label_embeddings,
+                ctx=ctx,
                 mode=mode,
                 threshold=DNA_SIMILARITY_THRESHOLD,
                 title_to_uid=title_to_uid,
@@ -946,7 +1051,12 @@ class DNAService:
             )
 
             # 
-            sims_data = DNAService._compute_category_tweet_sims(dna, truncated_texts)
+            sims_data = await compute_pool.run_local(
+                "dna.category_sims",
+                DNAService._compute_category_tweet_sims,
+                dna,
+                ctx,
+            )
             await DNAService._resolve_tweet_samples(
                 client, dna, truncated_texts, tweet_by_id, sims_data
             )
@@ -955,11 +1065,10 @@ class DNAService:
             new_dna = await DNAService._discover_new_dna_hybrid(
                 client=client,
                 mode=mode,
-                truncated_texts=truncated_texts,
                 labels=labels,
-                label_titles=label_titles,
-                label_embeddings=label_embeddings,
+                ctx=ctx,
             )
+            logger.info("digital_dna_genai user %s embedding stages %s", username, ctx.report())
 
             dna.sort(key=lambda e: e["unique_id"])
             new_dna.sort(key=lambda e: e["unique_id"])
@@ -980,11 +1089,196 @@ class DNAService:
             raise e
 
     @staticmethod
-    async def generate_dna_image(payload: RequestDigitalDNAImage) -> str:
+    def _segment_masks(images: list) -> list:
+        """Foreground masks ("L") of `images` from the rembg session pool or the sidecar."""
+        if model_sidecar.enabled:
+            masks = []
+            for image in images:
+                buffer = BytesIO()
+                # uncompressed: the bytes only cross a local socket / shm
+                image.save(buffer, format="BMP")
+                masks.append(Image.fromarray(model_sidecar.remove_background(buffer.getvalue())[..., 3], "L"))
+            return masks
+        return model_lifecycle.get("rembg").remove_masks(images)
+
+    @staticmethod
+    def _finish_badge(image: Image.Image, mask: Image.Image, stages: ImageStages) -> dict:
+        nobg_image = apply_mask(image, mask, stages)
+
+        with stages.stage("average_hex"):
+            average_hex = get_average_hex_color(nobg_image)
+
+        outputs = encode_sizes(nobg_image, DNA_IMAGE_SIZES, DNA_IMAGE_FORMAT, stages)
+
+        with stages.stage("digest"):
+            digests = {size: hashlib.sha256(data).hexdigest() for size, data in outputs.items()}
+
+        logger.info("DNA_IMAGE_POSTPROCESS %s", orjson.dumps(stages.report()).decode())
+
+        # raw bytes; base64 only happens if the JSON response mode asks for it
+        return {
+            "background_hex": average_hex,
+            "image_format": DNA_IMAGE_FORMAT,
+            "sizes": [str(size) for size in DNA_IMAGE_SIZES],
+            "images": {str(size): data for size, data in outputs.items()},
+            "digests": {str(size): digest for size, digest in digests.items()},
+        }
+
+    @staticmethod
+    def _remove_background_batch(images_base64: list) -> list:
+        """
+        Cut out generated badges and encode them per DNA_IMAGE_SIZES; see
+        utils.badge_cache for the badge shape. All masks come from one
+        segmentation call. A badge that fails is returned as its exception.
+        """
+        results = [None] * len(images_base64)
+        prepared = []
+        for idx, image_base64 in enumerate(images_base64):
+            stages = ImageStages()
+            try:
+                with stages.stage("decode"):
+                    image_bytes = base64.b64decode(image_base64)
+                    input_image = Image.open(BytesIO(image_bytes))
+                    input_image.load()
+                stages.add_bytes("decode", len(image_bytes))
+                image, small = downscale_for_matte(input_image, DNA_MATTE_SIZE, stages)
+                prepared.append((idx, image, small, stages))
+            except Exception as e:
+                results[idx] = e
+
+        if prepared:
+            segment = ImageStages()
+            with segment.stage("matte_segment"):
+                masks = DNAService._segment_masks([small for _, _, small, _ in prepared])
+            segment.stages["matte_segment"]["batch_size"] = len(prepared)
+
+            for (idx, image, _, stages), mask in zip(prepared, masks):
+                # one segmentation call for the whole batch
+                stages.stages["matte_segment"] = segment.stages["matte_segment"]
+                try:
+                    results[idx] = DNAService._finish_badge(image, mask, stages)
+                except Exception as e:
+                    results[idx] = e
+        return results
+
+    @staticmethod
+    def _remove_background(image_base64: str) -> dict:
+        badge = DNAService._remove_background_batch([image_base64])[0]
+        if isinstance(badge, Exception):
+            raise badge
+        return badge
+
+    @staticmethod
+    async def generate_dna_image(payload: RequestDigitalDNAImage, client=None) -> dict:
+        """
+        Badge for `payload.title`, from the badge cache or generated once for all concurrent callers.
+
+        Args:
+            client: AsyncOpenAI-compatible client (chat.completions / images); a new
+                AsyncOpenAI by default, a stub for offline runs
+        """
+        badge, source = await badge_cache.get_or_generate(
+            payload.title,
+            lambda: DNAService._render_dna_image(payload, client=client),
+        )
+        logger.info(f"GENERATE_DNA_IMAGE {payload.title} SOURCE {source}")
+        return badge
+
+    @staticmethod
+    async def generate_dna_images_batch(titles: list, concurrency: int, client=None):
+        """
+        Badges for `titles`, yielded as each one finishes:
+        {"index", "title", "source", "badge"} or {"index", "title", "error"}.
+
+        At most `concurrency` rewrite + image generations run at once;
+        background removal of badges that finish close together shares one
+        batched inference (utils.rembg_pool.run_batched).
+        """
+        limiter = asyncio.Semaphore(concurrency)
+
+        async def one(index: int, title: str) -> dict:
+            try:
+                badge, source = await badge_cache.get_or_generate(
+                    title,
+                    lambda: DNAService._render_dna_image(RequestDigitalDNAImage(title=title), limiter, client),
+                )
+                return {"index": index, "title": title, "source": source, "badge": badge}
+            except Exception as e:
+                logger.exception("generate_dna_images_batch_err %s: %s", title, e)
+                return {"index": index, "title": title, "error": str(e)}
+
+        tasks = [asyncio.ensure_future(one(index, title)) for index, title in enumerate(titles)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            # client went away mid-stream: stop waiting; badge_cache cancels a generation only once
+            # no other request waits on it, so theirs never see this cancellation
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    async def pregenerate_dna_images(titles: list, concurrency: int) -> list:
+        """Warm the badge cache for `titles`, at most `concurrency` generations at a time."""
+        results = [None] * len(titles)
+        async for result in DNAService.generate_dna_images_batch(titles, concurrency):
+            result.pop("badge", None)
+            results[result.pop("index")] = result
+        return results
+
+    @staticmethod
+    async def _render_dna_image(payload: RequestDigitalDNAImage, limiter=None, client=None) -> dict:
+        """Rewrite, image generation (under `limiter`, if given) and background removal for one title."""
+        transparent = DNA_IMAGE_BACKGROUND == "transparent"
+        async with limiter or contextlib.nullcontext():
+            image_b64 = await DNAService._generate_badge_source(payload, client, transparent)
+
+        image = None
+        if transparent:
+            image, fraction = await rembg_pool.run(DNAService._transparent_badge, image_b64)
+            path = "transparent" if image is not None else "transparent_fallback"
+            logger.info(f"GENERATE_DNA_IMAGE {payload.title} TRANSPARENT FRACTION {fraction:.3f} PATH {path}")
+        else:
+            path = "rembg"
+        _IMAGE_BACKGROUND_STATS[path] += 1
+
+        if image is None:
+            # segmented together with other badges finishing within REMBG_BATCH_WAIT_MS
+            image = await rembg_pool.run_batched(DNAService._remove_background_batch, image_b64)
+
+        logger.info(f"GENERATE_DNA_IMAGE {payload.title} IMAGE FINISH")
+        return image
+
+    @staticmethod
+    def _transparent_badge(image_base64: str) -> tuple:
+        """(badge, transparent fraction) using the image's own alpha, or (None, fraction) if it is not transparent."""
+        stages = ImageStages()
+        with stages.stage("decode"):
+            image_bytes = base64.b64decode(image_base64)
+            input_image = Image.open(BytesIO(image_bytes))
+            input_image.load()
+        stages.add_bytes("decode", len(image_bytes))
+
+        with stages.stage("alpha_check"):
+            fraction = transparent_fraction(input_image)
+        if fraction < DNA_TRANSPARENT_MIN_FRACTION:
+            return None, fraction
+
+        rgba = input_image.convert("RGBA")
+        return DNAService._finish_badge(rgba.convert("RGB"), rgba.getchannel("A"), stages), fraction
+
+    @staticmethod
+    def image_background_stats() -> dict:
+        """How badges lost their background: rembg, transparent (API alpha kept) or transparent_fallback."""
+        return {"mode": DNA_IMAGE_BACKGROUND, **_IMAGE_BACKGROUND_STATS}
+
+    @staticmethod
+    async def _generate_badge_source(payload: RequestDigitalDNAImage, client=None, transparent: bool = False) -> str:
+        """gpt-4o-mini visual rewrite of the title, then gpt-image; base64 of the generated image."""
         try:
             logger.info(f"GENERATE_DNA_IMAGE {payload.title}")
 
-            client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+            client = client or AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
             text_prompt = """
             Convert the input title into a rich, descriptive, safe visual concept for a fantasy-tech badge icon.
 
@@ -1043,34 +1337,34 @@ class DNAService:
                 **Input Prompt:** {visual}
                 """
 
+            # transparent mode: the badge comes back as an RGBA PNG with the background already cut out
+            background = {"background": "transparent", "output_format": "png"} if transparent else {}
             response = await client.images.generate(
                 model="gpt-image-2",
                 prompt=image_prompt,
                 size="1024x1024",
                 quality="low",
                 n=1,
+                **background,
             )
             logger.info(f"GENERATE_DNA_IMAGE {payload.title} IMAGE GENERATED - REMOVING BACKGROUND")
+            return response.data[0].b64_json
+        except Exception as e:
+            logger.exception("generate_dna_image_err: %s", e)
+            raise
 
-            image_base64 = response.data[0].b64_json
-            image_bytes = base64.b64decode(image_base64)
-            input_image = Image.open(BytesIO(image_bytes))
-            nobg_image = remove(input_image)
 
-            average_hex = get_average_hex_color(nobg_image)
+def _load_rembg_pool():
+    # sidecar mode keeps the rembg sessions in the sidecar process
+    if model_sidecar.enabled:
+        return None
+    return rembg_pool.start()
 
-            buffer = BytesIO()
-            nobg_image.save(buffer, format="PNG")
-            buffer.seek(0)
-            image_b64 = base64.b64encode(buffer.read()).decode("utf-8")
 
-            logger.info(f"GENERATE_DNA_IMAGE {payload.title} IMAGE FINISH")
-            image = {
-                "image_b64": image_b64,
-                "background_hex": average_hex
-            }
+def _warm_rembg(_):
+    buffer = BytesIO()
+    Image.new("RGB", (64, 64), (120, 80, 200)).save(buffer, format="PNG")
+    DNAService._remove_background(base64.b64encode(buffer.getvalue()).decode("utf-8"))
 
-            return image
-        except Exception as e:
-            logger.exception("generate_dna_image_err: %s", e)
-            raise
+
+model_lifecycle.register("rembg", _load_rembg_pool, warmup=_warm_rembg)
@@ -0,0 +1,569 @@
+"""
+Embedding Backends - MiniLM sentence embeddings through torch or ONNX Runtime
+
+Every backend exposes the SentenceTransformer `encode` signature the services
+already use, so the global `embedder` can be swapped without touching callers.
+
+    torch      SentenceTransformer on PyTorch (reference)
+    onnx       ONNX Runtime, fp32 graph exported from the torch model
+    onnx-int8  ONNX Runtime, dynamically int8-quantized copy of the fp32 graph
+
+The ONNX graphs are exported once into EMBEDDING_ONNX_DIR (torch is only
+needed for that export). Each export is checked against the torch vectors on
+a fixed probe set; a backend whose minimum cosine agreement falls below
+EMBEDDING_PARITY_MIN_COSINE refuses to load. The probe result is stored next
+to the graph, so later starts need neither torch nor a re-check.
+
+Configuration (env):
+    EMBEDDING_BACKEND            torch | onnx | onnx-int8 (default: torch)
+    EMBEDDING_MODEL_NAME         model id (default: sentence-transformers/all-MiniLM-L6-v2)
+    EMBEDDING_ONNX_DIR           export directory (default: ~/.cache/ai-reputation-service/onnx)
+    EMBEDDING_PARITY_MIN_COSINE  minimum per-probe cosine vs torch (default: 0.98)
+    EMBEDDING_ORT_THREADS        ONNX Runtime intra-op threads (default: 0, runtime decides)
+
+Cross-request micro-batching (EmbeddingBatcher):
+    EMBEDDING_BATCH_ENABLED      1 | 0 (default: 1)
+    EMBEDDING_BATCH_MAX_SIZE     texts per coalesced forward pass (default: 256)
+    EMBEDDING_BATCH_MAX_WAIT_MS  how long the first caller waits for company (default: 2;
+                                 0 still coalesces whatever queued while the model was busy)
+    EMBEDDING_BATCH_BUCKET_SIZE  texts per length bucket inside a pass (default: 32)
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import orjson
+
+from utils.model_lifecycle import model_lifecycle
+from utils.model_sidecar import SidecarEmbedder, model_sidecar
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_ONNX_DIR = os.getenv(
+    "EMBEDDING_ONNX_DIR", os.path.expanduser("~/.cache/ai-reputation-service/onnx")
+)
+EMBEDDING_PARITY_MIN_COSINE = float(os.getenv("EMBEDDING_PARITY_MIN_COSINE", "0.98"))
+EMBEDDING_ORT_THREADS = int(os.getenv("EMBEDDING_ORT_THREADS", "0"))
+EMBEDDING_BATCH_ENABLED = os.getenv("EMBEDDING_BATCH_ENABLED", "1") == "1"
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "256"))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "2"))
+EMBEDDING_BATCH_BUCKET_SIZE = int(os.getenv("EMBEDDING_BATCH_BUCKET_SIZE", "32"))
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# all-MiniLM-L6-v2 truncates at 256 word pieces
+MAX_SEQ_LENGTH = 256
+
+# short tweet-like and label-like texts in both scored languages
+PARITY_PROBES = (
+    "gm gm, new week new alpha",
+    "Just bridged my tokens to the new L2, fees are way lower now",
+    "DeFi yield farming strategies for stablecoins",
+    "NFT art and digital collectibles",
+    "Hari ini aku belajar smart contract di Solidity, seru banget",
+    "Airdrop season is here, don't forget to claim before the snapshot",
+    "Macroeconomics, interest rates and the crypto market",
+    "Kalau mau mulai investasi, pahami dulu risikonya",
+    "Gaming guilds and play-to-earn economies",
+    "Thread: why account abstraction matters for onboarding the next billion users",
+    "🚀🚀🚀",
+    "follow for follow",
+)
+
+
+class EmbeddingParityError(RuntimeError):
+    """Raised when an ONNX backend disagrees with the torch reference beyond the threshold."""
+
+
+class _EncodeRequest:
+    __slots__ = ("texts", "normalize", "future", "enqueued")
+
+    def __init__(self, texts: List[str], normalize: bool):
+        self.texts = texts
+        self.normalize = normalize
+        self.future: Future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent encode calls into shared forward passes.
+
+    Handlers (and compute pool threads) each encode a few texts, often a
+    single label. Calls are queued; one dispatcher thread takes the first
+    waiting call, gathers more for up to EMBEDDING_BATCH_MAX_WAIT_MS or until
+    EMBEDDING_BATCH_MAX_SIZE texts, dedupes the texts, orders them by length
+    so each EMBEDDING_BATCH_BUCKET_SIZE bucket pads to similar lengths, and
+    runs one encode. Every caller gets its own rows back.
+
+    `encode` keeps the SentenceTransformer signature and blocks, so existing
+    sync call sites are unchanged; `encode_async` returns an awaitable for
+    code on the event loop. Calls that are already large, or that pass
+    options other than normalize_embeddings/show_progress_bar, go straight
+    to the model.
+
+    The dispatcher is restarted when it is not alive: after a fork (the child
+    gets the queue but not the thread) or after it died, in which case the
+    requests it stranded are failed instead of waiting forever.
+    """
+
+    def __init__(self, model, max_size: int = EMBEDDING_BATCH_MAX_SIZE, max_wait_ms: float = EMBEDDING_BATCH_MAX_WAIT_MS):
+        self.model = model
+        self.max_size = max(1, max_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: "queue.Queue[_EncodeRequest]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        self.batches = 0
+        self.requests = 0
+        self.texts = 0
+        self.unique_texts = 0
+        self.direct_calls = 0
+        self.total_wait_ms = 0.0
+        self.total_encode_ms = 0.0
+
+        # fork copies the queue and locks (possibly held) but not the dispatcher thread
+        self._pid = os.getpid()
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() is not None and ref()._after_fork())
+
+    def _after_fork(self) -> None:
+        # the child runs single-threaded here; the parent's queued requests are not ours to answer
+        self._pid = os.getpid()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        # caller holds _start_lock
+        if self._pid != os.getpid():
+            self._after_fork()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def _collect(self) -> List[_EncodeRequest]:
+        batch = []
+        size = 0
+        deadline = None
+
+        while size < self.max_size:
+            if deadline is None:
+                request = self._queue.get()
+            else:
+                try:
+                    remaining = deadline - time.perf_counter()
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            # cancelled callers are dropped; the rest can no longer be cancelled
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            if deadline is None:
+                deadline = request.enqueued + self.max_wait
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self) -> None:
+        batch = []
+        try:
+            while True:
+                batch = self._collect()
+                for normalize in (True, False):
+                    group = [r for r in batch if r.normalize == normalize]
+                    if group:
+                        self._encode_group(group, normalize)
+        except BaseException as e:
+            logger.exception("embedding batcher dispatcher stopped")
+            with self._start_lock:
+                stranded, self._queue = self._queue, queue.Queue()
+                self._thread = None
+            # the next submit starts a new dispatcher; nothing would ever answer these
+            error = RuntimeError(f"embedding batcher dispatcher stopped: {e!r}")
+            while True:
+                try:
+                    batch.append(stranded.get_nowait())
+                except queue.Empty:
+                    break
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(error)
+
+    def _encode_group(self, group: List[_EncodeRequest], normalize: bool) -> None:
+        started = time.perf_counter()
+        unique = list(dict.fromkeys(text for request in group for text in request.texts))
+        # length order: each bucket of the pass pads to neighbours of similar length
+        unique.sort(key=len)
+
+        try:
+            vectors = np.asarray(self.model.encode(
+                unique,
+                batch_size=EMBEDDING_BATCH_BUCKET_SIZE,
+                normalize_embeddings=normalize,
+                show_progress_bar=False,
+            ))
+        except Exception as e:
+            for request in group:
+                request.future.set_exception(e)
+            return
+
+        row_of = {text: row for row, text in enumerate(unique)}
+        for request in group:
+            request.future.set_result(vectors[[row_of[text] for text in request.texts]])
+
+        finished = time.perf_counter()
+        with self._stats_lock:
+            self.batches += 1
+            self.requests += len(group)
+            self.texts += sum(len(r.texts) for r in group)
+            self.unique_texts += len(unique)
+            self.total_wait_ms += sum(started - r.enqueued for r in group) * 1000
+            self.total_encode_ms += (finished - started) * 1000
+
+    def submit(self, sentences, normalize_embeddings: bool = False) -> Future:
+        """Queue an encode; the future resolves to a (len(sentences), dim) array."""
+        request = _EncodeRequest(list(sentences), bool(normalize_embeddings))
+        if not request.texts:
+            request.future.set_result(np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32))
+            return request.future
+
+        # under the lock: a dying dispatcher swaps the queue, nothing may land in the old one
+        with self._start_lock:
+            self._ensure_started()
+            self._queue.put(request)
+        return request.future
+
+    def _direct(self, sentences, kwargs: Dict[str, Any]) -> bool:
+        extra = set(kwargs) - {"normalize_embeddings", "show_progress_bar", "batch_size"}
+        size = 1 if isinstance(sentences, str) else len(sentences)
+        return bool(extra) or size >= self.max_size
+
+    def encode(self, sentences, **kwargs):
+        if self._direct(sentences, kwargs):
+            with self._stats_lock:
+                self.direct_calls += 1
+            return self.model.encode(sentences, **kwargs)
+
+        single = isinstance(sentences, str)
+        vectors = self.submit(
+            [sentences] if single else sentences, kwargs.get("normalize_embeddings", False)
+        ).result()
+        return vectors[0] if single else vectors
+
+    async def encode_async(self, sentences, **kwargs):
+        if self._direct(sentences, kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, lambda: self.encode(sentences, **kwargs))
+
+        single = isinstance(sentences, str)
+        vectors = await asyncio.wrap_future(self.submit(
+            [sentences] if single else sentences, kwargs.get("normalize_embeddings", False)
+        ))
+        return vectors[0] if single else vectors
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch counts, mean fill ratio (texts per pass / max size) and queue wait."""
+        with self._stats_lock:
+            batches = max(self.batches, 1)
+            return {
+                "max_size": self.max_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self.batches,
+                "requests": self.requests,
+                "texts": self.texts,
+                "unique_texts": self.unique_texts,
+                "direct_calls": self.direct_calls,
+                "queued": self._queue.qsize(),
+                "mean_requests_per_batch": self.requests / batches,
+                "mean_fill_ratio": self.unique_texts / (batches * self.max_size),
+                "mean_wait_ms": self.total_wait_ms / max(self.requests, 1),
+                "mean_encode_ms": self.total_encode_ms / batches,
+            }
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+def normalize_rows(matrix) -> np.ndarray:
+    """Rows of `matrix` as unit-length float32 vectors, (n, dim); a single vector becomes one row."""
+    vectors = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def cos_sim(a, b) -> np.ndarray:
+    """NumPy equivalent of sentence_transformers.util.cos_sim, (len(a), len(b))."""
+    return normalize_rows(a) @ normalize_rows(b).T
+
+
+class TorchEmbeddingBackend:
+    """
+    SentenceTransformer on PyTorch CPU.
+
+    The HF fast tokenizer is not safe to share between threads (each call
+    reconfigures truncation/padding and raises "Already borrowed" under
+    contention), so tokenization goes through a lock; forward passes of
+    concurrent encode calls still run in parallel.
+    """
+
+    name = "torch"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self._tokenize_lock = threading.Lock()
+        tokenize = self.model.tokenize
+
+        def locked_tokenize(texts):
+            with self._tokenize_lock:
+                return tokenize(texts)
+
+        # SentenceTransformer.encode looks tokenize up on the instance
+        self.model.tokenize = locked_tokenize
+
+    def encode(self, sentences, **kwargs):
+        return self.model.encode(sentences, **kwargs)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+
+class OnnxEmbeddingBackend:
+    """
+    Exported MiniLM graph on ONNX Runtime.
+
+    Tokenization uses the model's own tokenizer.json through `tokenizers`;
+    mean pooling over the attention mask and the final l2 normalization
+    reproduce the SentenceTransformer pipeline. Only tokenization is
+    serialized; ONNX Runtime sessions run concurrent forward passes.
+    """
+
+    def __init__(self, model_path: Path, tokenizer_path: Path, name: str):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.name = name
+        self.tokenizer = Tokenizer.from_file(str(tokenizer_path))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.no_padding()
+        self._tokenize_lock = threading.Lock()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if EMBEDDING_ORT_THREADS > 0:
+            options.intra_op_num_threads = EMBEDDING_ORT_THREADS
+        self.session = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.dim = self.session.get_outputs()[0].shape[-1]
+
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        with self._tokenize_lock:
+            encodings = self.tokenizer.encode_batch(texts)
+        width = max(len(e.ids) for e in encodings)
+        input_ids = np.zeros((len(texts), width), dtype=np.int64)
+        attention_mask = np.zeros((len(texts), width), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feeds)[0]
+
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        # the model's Normalize module: output is always unit length
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(
+        self,
+        sentences,
+        batch_size: int = 32,
+        normalize_embeddings: bool = False,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+        **kwargs,
+    ):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if not texts:
+            return out[0] if single else out
+
+        # length-sorted batches keep padding small, as SentenceTransformer does
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            out[idx] = self._forward([texts[i] for i in idx])
+
+        return out[0] if single else out
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+
+class EmbeddingBackendFactory:
+    """Builds, exports and parity-checks the configured embedding backend"""
+
+    @staticmethod
+    def _export_dir(model_name: str) -> Path:
+        return Path(EMBEDDING_ONNX_DIR) / model_name.replace("/", "__")
+
+    @staticmethod
+    def export_onnx(model_name: str, export_dir: Path) -> Path:
+        """Export the torch model to fp32 ONNX plus its tokenizer. Requires torch."""
+        import torch
+
+        torch_backend = TorchEmbeddingBackend(model_name)
+        transformer = torch_backend.model[0].auto_model.eval()
+        tokenizer = torch_backend.model.tokenizer
+
+        export_dir.mkdir(parents=True, exist_ok=True)
+        tokenizer.save_pretrained(str(export_dir))
+
+        sample = tokenizer(list(PARITY_PROBES[:2]), padding=True, return_tensors="pt")
+        input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+        dynamic = {n: {0: "batch", 1: "seq"} for n in input_names}
+        dynamic["last_hidden_state"] = {0: "batch", 1: "seq"}
+
+        model_path = export_dir / "model.onnx"
+        tmp_path = export_dir / "model.onnx.tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(sample[n] for n in input_names),
+                str(tmp_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic,
+                opset_version=17,
+                do_constant_folding=True,
+            )
+        tmp_path.replace(model_path)
+        return model_path
+
+    @staticmethod
+    def quantize_int8(fp32_path: Path) -> Path:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = fp32_path.with_name("model.int8.onnx")
+        tmp_path = fp32_path.with_name("model.int8.onnx.tmp")
+        quantize_dynamic(str(fp32_path), str(tmp_path), weight_type=QuantType.QInt8)
+        tmp_path.replace(int8_path)
+        return int8_path
+
+    @staticmethod
+    def parity_check(backend, model_name: str) -> Dict[str, float]:
+        """Cosine agreement of `backend` with the torch model on PARITY_PROBES."""
+        reference = TorchEmbeddingBackend(model_name).encode(
+            list(PARITY_PROBES), normalize_embeddings=True, show_progress_bar=False
+        )
+        candidate = backend.encode(list(PARITY_PROBES), normalize_embeddings=True)
+        reference = np.asarray(reference, dtype=np.float32)
+        if reference.shape != candidate.shape:
+            raise EmbeddingParityError(
+                f"{backend.name} backend returns {candidate.shape[1]}-d vectors, torch returns {reference.shape[1]}-d"
+            )
+        cosines = (reference * candidate).sum(axis=1)
+        return {
+            "min_cosine": float(cosines.min()),
+            "mean_cosine": float(cosines.mean()),
+            "probes": len(PARITY_PROBES),
+        }
+
+    @staticmethod
+    def _load_onnx(model_name: str, quantized: bool) -> OnnxEmbeddingBackend:
+        name = "onnx-int8" if quantized else "onnx"
+        export_dir = EmbeddingBackendFactory._export_dir(model_name)
+        fp32_path = export_dir / "model.onnx"
+        model_path = export_dir / ("model.int8.onnx" if quantized else "model.onnx")
+        parity_path = export_dir / f"parity.{name}.json"
+
+        if not fp32_path.exists():
+            logger.info("exporting %s to ONNX in %s", model_name, export_dir)
+            EmbeddingBackendFactory.export_onnx(model_name, export_dir)
+        if quantized and not model_path.exists():
+            logger.info("quantizing %s to int8", fp32_path)
+            EmbeddingBackendFactory.quantize_int8(fp32_path)
+
+        backend = OnnxEmbeddingBackend(model_path, export_dir / "tokenizer.json", name)
+
+        parity: Optional[dict] = None
+        if parity_path.exists():
+            parity = orjson.loads(parity_path.read_bytes())
+            if parity.get("model_mtime") != model_path.stat().st_mtime_ns:
+                parity = None
+        if parity is None:
+            parity = EmbeddingBackendFactory.parity_check(backend, model_name)
+            parity["model_mtime"] = model_path.stat().st_mtime_ns
+            parity_path.write_bytes(orjson.dumps(parity))
+
+        if parity["min_cosine"] < EMBEDDING_PARITY_MIN_COSINE:
+            raise EmbeddingParityError(
+                f"{name} backend min cosine {parity['min_cosine']:.4f} vs torch is below "
+                f"EMBEDDING_PARITY_MIN_COSINE={EMBEDDING_PARITY_MIN_COSINE}"
+            )
+        logger.info(
+            "%s backend parity vs torch: min cosine %.4f, mean %.4f",
+            name, parity["min_cosine"], parity["mean_cosine"],
+        )
+        return backend
+
+    @staticmethod
+    def create(backend: str = EMBEDDING_BACKEND, model_name: str = EMBEDDING_MODEL_NAME):
+        if backend not in BACKENDS:
+            raise ValueError(f"EMBEDDING_BACKEND must be one of {BACKENDS}, got {backend!r}")
+
+        started = time.perf_counter()
+        if backend == "torch":
+            instance = TorchEmbeddingBackend(model_name)
+        else:
+            instance = EmbeddingBackendFactory._load_onnx(model_name, quantized=backend == "onnx-int8")
+        logger.info("embedding backend %s loaded in %.2fs", backend, time.perf_counter() - started)
+        return instance
+
+    @staticmethod
+    def create_embedder(backend: str = EMBEDDING_BACKEND, model_name: str = EMBEDDING_MODEL_NAME, local: bool = False):
+        """
+        The process-wide embedder: the backend, behind the micro-batcher when enabled.
+
+        With MODEL_SIDECAR=1 (and not `local`) no model is loaded here; encodes
+        go to the shared model sidecar instead.
+        """
+        if model_sidecar.enabled and not local:
+            return SidecarEmbedder(model_sidecar)
+
+        model = EmbeddingBackendFactory.create(backend, model_name)
+        if EMBEDDING_BATCH_ENABLED:
+            return EmbeddingBatcher(model)
+        return model
+
+
+model_lifecycle.register(
+    "embedder",
+    EmbeddingBackendFactory.create_embedder,
+    # first forward pass pays for torch / ORT lazy init and thread pool start-up
+    warmup=lambda model: model.encode(
+        ["warm up the embedder", "gm"], normalize_embeddings=True, show_progress_bar=False
+    ),
+)
+# process-wide embedder, loaded on first use or by model_lifecycle.start() at worker startup
+embedder = model_lifecycle.proxy("embedder")
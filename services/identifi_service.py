@@ -1,41 +1,43 @@
+import asyncio
 import logging
 import math
 from statistics import mean
 from models.requests.identifi_request import RequestIdentifiScore, RequestIdentifiScoreV2
 from models.requests.tweet_request import Tweets
 from services.identifi_util_service import IdentifiScoreUtil
-from services.somnia_referral_service import SomniaReferralService
+from services.spam_similarity_service import SpamSimilarityEngine
+from services.readability_service import ReadabilityEngine
+from services.language_service import LanguageDetector
+from services.identifi_state_service import IdentifiStateCodec, IncrementalSpamIndex, InvalidStateError, TOTAL_FIELDS
 import math
-import re
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer, util
+from services.embedding_service import embedder
 import time
 import os
+from utils.compute_pool import compute_pool
+from utils.feature_cache import feature_cache
+from utils.model_lifecycle import model_lifecycle
 
 os.environ['CUDA_VISIBLE_DEVICES'] = ''
 
 logger = logging.getLogger(__name__)
 
-tfidf = TfidfVectorizer(min_df=1,
-    max_features=2000,
-    ngram_range=(1, 2) )
-embedder = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+# "tweet" (default): detect per tweet, as scores always have; "user": opt in to one
+# language estimate per timeline for readability, which saves detection but changes scores
+IDENTIFI_LANGUAGE_SCOPE = os.getenv('IDENTIFI_LANGUAGE_SCOPE', 'tweet').lower()
+
+# encode batch size for the cross-user encode of /api/identifi/v2/batch
+IDENTIFI_BATCH_ENCODE_SIZE = int(os.getenv('IDENTIFI_BATCH_ENCODE_SIZE', '128'))
+# tweets per /api/identifi/v2/batch chunk: each chunk is one compute job with its own
+# cross-user encode, which bounds the texts and embeddings held at once
+IDENTIFI_BATCH_CHUNK_TWEETS = int(os.getenv('IDENTIFI_BATCH_CHUNK_TWEETS', '4096'))
 
 
 class IdentifiScore:
     """Service to handle identifi score calculation"""
 
-    # Indonesian stopwords (extend as needed)
-    ID_STOPWORDS = set("""
-    yang untuk pada dengan tidak dari bahwa karena oleh sebagai dalam
-    itu ada kami mereka dia ini kamu saja bisa atau jadi kalau maka
-    """.split())
-
-    # English stopwords
-    EN_STOPWORDS = set("""
-    the a an is are was were be to of and or in on for as by with this that it
-    """.split())
+    ID_STOPWORDS = ReadabilityEngine.ID_STOPWORDS
+    EN_STOPWORDS = ReadabilityEngine.EN_STOPWORDS
 
     MEDIA_RICHNESS_WEIGHT = {
         "image": float(os.getenv('MEDIA_RICHNESS_WEIGHT_IMAGE', '0.3')),
@@ -59,86 +61,46 @@ class IdentifiScore:
         return round(score, 2) * 10
     
     @staticmethod
-    def get_readability_score(text: str) -> float:
-        if not text or not text.strip():
-            return 0.3  # minimum score
-
-        lang = IdentifiScoreUtil.detect_language_safe(text)
-        tokens = IdentifiScoreUtil.tokenize(text)
-        token_count = len(tokens)
-
-        words = [t for t in tokens if re.match(r"\w+", t)]
-        word_count = len(words)
-
-        if word_count == 0:
-            return 0.3
-
-        # ---------- BASE METRICS ----------
-        sentences = IdentifiScoreUtil.count_sentences(text)
-        avg_sentence_len = word_count / sentences
-        avg_word_len = sum(len(w) for w in words) / word_count
-        max_word_len = max(len(w) for w in words)
-
-        # Stopwords
-        stopwords = IdentifiScore.ID_STOPWORDS if lang.startswith("id") else IdentifiScore.EN_STOPWORDS
-        stopword_ratio = sum(1 for w in words if w.lower() in stopwords) / word_count
-
-        # ---------- NOISE METRICS ----------
-        hashtag_density = len([t for t in tokens if t.startswith("#")]) / token_count
-        emoji_density = IdentifiScoreUtil.emoji_count(text) / token_count
-        punct_complexity = len(re.findall(r"[,;:—]", text)) / token_count
-
-        # ---------- NATURALNESS METRICS ----------
-        # Token diversity: low diversity = unnatural (spammy)
-        unique_tokens = len(set(words))
-        token_diversity = unique_tokens / word_count
-        low_diversity_penalty = 1 - token_diversity
-
-        # Very long word penalty
-        long_word_penalty = min(max_word_len / 20, 1.0)
-
-        # Vowel penalty (new)
-        vowel_penalties = sum(1 - min(IdentifiScoreUtil.vowel_ratio(w) * 2, 1.0) for w in words)
-        vowel_penalty = vowel_penalties / word_count
-
-        # Zero-stopword penalty (for non-short text)
-        zero_stopword_penalty = 1.0 if (stopword_ratio == 0 and len(text) > 20) else 0.0
-
-        # ---------- NORMALIZATION HELPERS ----------
-        def inverse_norm(x, cap=30):
-            x = min(x, cap)
-            return 1 / (1 + x)
-
-        f_sentence = inverse_norm(avg_sentence_len)
-        f_word = inverse_norm(avg_word_len, cap=15)
-
-        # ---------- FINAL RAW SCORE ----------
-        raw = (
-            # Structure (45%)
-            0.25 * f_sentence +
-            0.20 * f_word +
-
-            # Naturalness (32%)
-            -0.15 * long_word_penalty +
-            -0.15 * vowel_penalty +
-            -0.07 * low_diversity_penalty +
-
-            # Noise (12%)
-            -0.10 * hashtag_density +
-            -0.03 * emoji_density +
-            -0.05 * punct_complexity +
-
-            # Stopwords (11%)
-            0.15 * stopword_ratio -
-            0.08 * zero_stopword_penalty
-        )
+    def get_readability_score(text: str, lang: str = None) -> float:
+        return ReadabilityEngine.get_readability_scores([text], [lang])[0]
 
-        # Normalize raw score into 0–1
-        raw_norm = max(0.0, min(1.0, raw + 0.5))
+    @staticmethod
+    def get_cached_readability_scores(keys: list, texts: list, lang: str = None) -> list:
+        """
+        Readability per text through the feature cache; misses are scored in one batch.
+
+        With `lang` set (a user-level estimate) every text uses it; otherwise
+        each tweet's language is detected and cached individually.
+        """
+        if lang is None:
+            langs = [
+                feature_cache.get_or_compute(key, "lang", lambda: LanguageDetector.detect(text))
+                for key, text in zip(keys, texts)
+            ]
+        else:
+            langs = [lang] * len(texts)
 
-        # Map to readability band 0.3 → 0.9
-        final = 0.3 + 0.6 * raw_norm
-        return round(final, 4)
+        # readability only depends on the stopword list, so cache per list
+        fields = ["readability_id" if l.startswith("id") else "readability_en" for l in langs]
+        scores = [feature_cache.get(key, field) for key, field in zip(keys, fields)]
+        missing = [idx for idx, score in enumerate(scores) if score is None]
+        if not missing:
+            return scores
+
+        fresh = ReadabilityEngine.get_readability_scores(
+            [texts[idx] for idx in missing], [langs[idx] for idx in missing]
+        )
+        for idx, score in zip(missing, fresh):
+            scores[idx] = score
+            feature_cache.put(keys[idx], **{fields[idx]: score})
+        return scores
+
+    @staticmethod
+    def estimate_language(texts: list):
+        """User-level language for IDENTIFI_LANGUAGE_SCOPE=user, None when detecting per tweet."""
+        if IDENTIFI_LANGUAGE_SCOPE != "user":
+            return None
+        return LanguageDetector.estimate_user_language(texts)
 
     @staticmethod
     def get_originality_score(tweet: Tweets) -> float:
@@ -163,66 +125,213 @@ class IdentifiScore:
         return -max_penalty  # negative score for spam
 
     @staticmethod
-    def prepare_spam_features(tweets_list, embedder, tfidf):
+    def new_tfidf() -> TfidfVectorizer:
+        """Request-scoped vectorizer; fit_transform mutates its vocabulary, so it is never shared."""
+        return TfidfVectorizer(min_df=1,
+            max_features=2000,
+            ngram_range=(1, 2) )
+
+    @staticmethod
+    def prepare_spam_features(tweets_list, embedder, tfidf, keys=None, embed_matrix=None):
         tfidf_matrix = tfidf.fit_transform(tweets_list)
-        embed_matrix = embedder.encode(tweets_list, normalize_embeddings=True, show_progress_bar=False)
+        if embed_matrix is not None:
+            return tfidf_matrix, embed_matrix
+        if keys is not None:
+            embed_matrix = feature_cache.encode(keys, tweets_list, embedder)
+        else:
+            embed_matrix = embedder.encode(tweets_list, normalize_embeddings=True, show_progress_bar=False)
         return tfidf_matrix, embed_matrix
     
     @staticmethod
-    def get_spam_score(current_tweet, index, tfidf_matrix, embed_matrix, embedder, tfidf):
-        current_tfidf = tfidf.transform([current_tweet])
-        sims_tfidf = cosine_similarity(current_tfidf, tfidf_matrix)[0]
+    async def calculate_identifi_v2(payload: RequestIdentifiScoreV2):
+        if payload.incremental or payload.state:
+            return await compute_pool.run(
+                "identifi.score_incremental", IdentifiScore.score_identifi_v2_incremental, payload
+            )
+        return await compute_pool.run("identifi.score", IdentifiScore.score_identifi_v2, payload)
 
-        # exclude curr tweet tfidf
-        sims_tfidf[index] = -1
-        sim_tfidf = sims_tfidf.max()
+    @staticmethod
+    async def calculate_identifi_v2_batch(payloads: list):
+        # chunks run as separate compute jobs, so workers share a large batch; at most one
+        # per worker is in flight so a big batch does not fill COMPUTE_POOL_MAX_PENDING alone
+        limiter = asyncio.Semaphore(compute_pool.workers)
 
-        # embedding similarity
-        current_embed = embedder.encode([current_tweet], normalize_embeddings=True, show_progress_bar=False)
-        sims_embed = util.cos_sim(current_embed, embed_matrix).cpu().numpy()[0]
+        async def one(chunk: list) -> list:
+            async with limiter:
+                return await compute_pool.run("identifi.score_batch", IdentifiScore.score_identifi_v2_batch, chunk)
 
-        # exclude curr tweet similarity
-        sims_embed[index] = -1
-        sim_embed = sims_embed.max()
+        parts = await asyncio.gather(*(one(chunk) for chunk in IdentifiScore.batch_chunks(payloads)))
+        return [result for part in parts for result in part]
 
-        # penalties
-        freq_penalty = float((sim_tfidf + sim_embed) / 2 > 0.75)
+    @staticmethod
+    def batch_chunks(payloads: list) -> list:
+        """
+        Split a batch, in order, into runs of at most IDENTIFI_BATCH_CHUNK_TWEETS
+        tweets. A payload larger than that forms a chunk of its own.
+        """
+        chunks, chunk, chunk_tweets = [], [], 0
+        for payload in payloads:
+            tweets = 0 if isinstance(payload, Exception) else len(payload.tweets)
+            if chunk and chunk_tweets + tweets > IDENTIFI_BATCH_CHUNK_TWEETS:
+                chunks.append(chunk)
+                chunk, chunk_tweets = [], 0
+            chunk.append(payload)
+            chunk_tweets += tweets
+        if chunk:
+            chunks.append(chunk)
+        return chunks
 
-        text_len = len(current_tweet)
-        short_penalty = 1 if text_len <= 4 else 0.5 if text_len <= 8 else 0
+    @staticmethod
+    def score_identifi_v2_batch(payloads: list) -> list:
+        """
+        Identifi v2 for many users, with one embedding pass per chunk.
+
+        Payloads are scored in chunks of IDENTIFI_BATCH_CHUNK_TWEETS tweets
+        (see batch_chunks); within a chunk every user's cleaned tweets go
+        through one encode call. Both embedding backends sort their input by
+        length before batching, so tweets from all users share length buckets
+        instead of each user padding its own small batch. Results keep the
+        order of `payloads`.
+
+        Args:
+            payloads: RequestIdentifiScoreV2 items; an Exception in place of a
+                payload (e.g. a validation error) is reported for that item only
+
+        Returns:
+            One {"success", "data"} or {"success", "error"} dict per payload
+        """
+        t0 = time.time()
+        results = []
+        for chunk in IdentifiScore.batch_chunks(payloads):
+            results.extend(IdentifiScore._score_batch_chunk(chunk))
+
+        finished_ms = (time.time() - t0) * 1000
+        logger.info(f"IDENTIFI_SCORE_V2_BATCH {len(payloads)} users FINISHED in {finished_ms:.2f} ms\n")
+        return results
 
-        z = (
-            1.2 * sim_embed +
-            0.8 * sim_tfidf +
-            0.3 * freq_penalty +
-            0.4 * short_penalty
+    @staticmethod
+    def _score_batch_chunk(payloads: list) -> list:
+        t0 = time.time()
+        results = [None] * len(payloads)
+        collected = {}
+
+        for idx, payload in enumerate(payloads):
+            if isinstance(payload, Exception):
+                results[idx] = {"success": False, "error": str(payload)}
+                continue
+            try:
+                if payload.incremental or payload.state:
+                    results[idx] = {"success": True, "data": IdentifiScore.score_identifi_v2_incremental(payload)}
+                else:
+                    collected[idx] = IdentifiScore.collect_v2_tweets(payload)
+            except Exception as e:
+                logger.exception(f"IDENTIFI_SCORE_V2_BATCH_ERR {payload.username} {e}")
+                results[idx] = {"success": False, "error": str(e)}
+
+        # one cross-user encode; spans map each payload back to its rows
+        all_keys = []
+        all_texts = []
+        spans = {}
+        for idx, item in collected.items():
+            spans[idx] = (len(all_texts), len(all_texts) + len(item["tweets_list"]))
+            all_keys.extend(item["tweets_keys"])
+            all_texts.extend(item["tweets_list"])
+
+        embed_matrix = None
+        if all_texts:
+            try:
+                embed_matrix = feature_cache.encode(
+                    all_keys, all_texts, embedder, batch_size=IDENTIFI_BATCH_ENCODE_SIZE
+                )
+            except Exception as e:
+                # fall back to per-user encodes inside score_identifi_v2
+                logger.exception(f"IDENTIFI_SCORE_V2_BATCH_ENCODE_ERR {e}")
+
+        for idx, item in collected.items():
+            payload = payloads[idx]
+            start, end = spans[idx]
+            try:
+                result = IdentifiScore.score_identifi_v2(
+                    payload,
+                    collected=item,
+                    embed_matrix=embed_matrix[start:end] if embed_matrix is not None and end > start else None,
+                )
+                results[idx] = {"success": True, "data": result}
+            except Exception as e:
+                results[idx] = {"success": False, "error": str(e)}
+
+        finished_ms = (time.time() - t0) * 1000
+        logger.info(
+            f"IDENTIFI_SCORE_V2_BATCH_CHUNK {len(payloads)} users, {len(all_texts)} tweets FINISHED in {finished_ms:.2f} ms"
         )
+        return results
 
-        return float(1 / (1 + math.exp(-z)))
+    @staticmethod
+    def collect_v2_tweets(payload: RequestIdentifiScoreV2) -> dict:
+        """
+        Dedupe payload tweets by id and clean their text in place.
+
+        Runs once per payload: cleaning is not idempotent, so callers that need
+        the texts before scoring (the batch endpoint) pass the result on to
+        score_identifi_v2 instead of collecting again.
+        """
+        tweet_obj_list = []
+        seen_tweet_ids = set()
+        tweets_list = []
+        tweets_keys = []  # feature cache keys aligned with tweets_list
+        tweet_keys = []  # feature cache keys aligned with tweet_obj_list
+        tweet_set_detect_spam = set()
+        tweet_text_index_map = {}  # maps original index to filtered index
+
+        # ensure unique tweet id
+        for tweet in payload.tweets:
+            if tweet.id not in seen_tweet_ids:
+                current_index = len(tweet_obj_list)  # store before appending
+                tweet_obj_list.append(tweet)
+                seen_tweet_ids.add(tweet.id)
+                raw_text = tweet.text
+                tweet.text = feature_cache.get_or_compute(
+                    feature_cache.key(tweet.id, raw_text),
+                    "clean",
+                    lambda: IdentifiScoreUtil.clean_tweet(raw_text),
+                )
+                tweet_keys.append(feature_cache.key(tweet.id, tweet.text))
+                if len(tweet.text) > 0:
+                    tweet_text_index_map[current_index] = len(tweets_list)  # map original to filtered
+                    tweets_list.append(tweet.text)
+                    tweets_keys.append(tweet_keys[-1])
+                    tweet_set_detect_spam.add(tweet.id)
+
+        return {
+            "tweet_obj_list": tweet_obj_list,
+            "tweet_keys": tweet_keys,
+            "tweets_list": tweets_list,
+            "tweets_keys": tweets_keys,
+            "tweet_set_detect_spam": tweet_set_detect_spam,
+            "tweet_text_index_map": tweet_text_index_map,
+        }
 
     @staticmethod
-    async def calculate_identifi_v2(payload: RequestIdentifiScoreV2):
+    def score_identifi_v2(payload: RequestIdentifiScoreV2, collected: dict = None, embed_matrix=None):
+        """
+        Synchronous identifi v2 scoring. Holds no shared mutable state, safe to run from worker threads.
+
+        Args:
+            collected: Output of collect_v2_tweets for this payload, if already run
+            embed_matrix: Embeddings aligned with collected["tweets_list"], if already encoded
+        """
         logger.info(f'IDENTIFI_SCORE_V2 {payload.username} START')
         try:
             t0 = time.time()
 
-            tweet_obj_list = []
-            seen_tweet_ids = set()
-            tweets_list = []
-            tweet_set_detect_spam = set()
-            tweet_text_index_map = {}  # maps original index to filtered index
-
-            # ensure unique tweet id
-            for tweet in payload.tweets:
-                if tweet.id not in seen_tweet_ids:
-                    current_index = len(tweet_obj_list)  # store before appending
-                    tweet_obj_list.append(tweet)
-                    seen_tweet_ids.add(tweet.id)
-                    tweet.text = IdentifiScoreUtil.clean_tweet(tweet.text)
-                    if len(tweet.text) > 0:
-                        tweet_text_index_map[current_index] = len(tweets_list)  # map original to filtered
-                        tweets_list.append(tweet.text)
-                        tweet_set_detect_spam.add(tweet.id)
+            if collected is None:
+                collected = IdentifiScore.collect_v2_tweets(payload)
+            tweet_obj_list = collected["tweet_obj_list"]
+            tweet_keys = collected["tweet_keys"]
+            tweets_list = collected["tweets_list"]
+            tweets_keys = collected["tweets_keys"]
+            tweet_set_detect_spam = collected["tweet_set_detect_spam"]
+            tweet_text_index_map = collected["tweet_text_index_map"]
             tweet_len = len(tweet_obj_list)
 
             # accumulators
@@ -241,12 +350,20 @@ class IdentifiScore:
             
             # Prepare spam detection features from all tweets
             if len(tweets_list) > 0:
-                tfidf_matrix, embed_matrix = IdentifiScore.prepare_spam_features(tweets_list, embedder, tfidf)
+                tfidf_matrix, embed_matrix = IdentifiScore.prepare_spam_features(
+                    tweets_list, embedder, IdentifiScore.new_tfidf(), keys=tweets_keys, embed_matrix=embed_matrix
+                )
+                spam_scores = SpamSimilarityEngine.get_spam_scores(tweets_list, tfidf_matrix, embed_matrix)
+
+            tweet_texts = [tweet.text for tweet in tweet_obj_list]
+            readability_scores = IdentifiScore.get_cached_readability_scores(
+                tweet_keys, tweet_texts, lang=IdentifiScore.estimate_language(tweet_texts)
+            )
 
             # calculate scores
             for index, tweet in enumerate(tweet_obj_list):
                 # content
-                readability_score += IdentifiScore.get_readability_score(tweet.text)
+                readability_score += readability_scores[index]
                 image_count += len(tweet.photos)
                 video_count += len(tweet.videos)
 
@@ -261,7 +378,7 @@ class IdentifiScore:
                     # spam similarity score. only detect spam if tweet is marked 
                     if tweet.id in tweet_set_detect_spam:
                         filtered_index = tweet_text_index_map[index]
-                        sim_score = IdentifiScore.get_spam_score(tweet.text, filtered_index, tfidf_matrix, embed_matrix, embedder, tfidf)
+                        sim_score = float(spam_scores[filtered_index])
                         # print(f"{tweet.text} || SIM SCORE: {sim_score}")
                         if sim_score >= IdentifiScore.SIMILARITY_SPAM_THRESHOLDS:
                             spam_sim_arr.append(sim_score)
@@ -270,147 +387,301 @@ class IdentifiScore:
                                 "id": tweet.id
                             })
 
-                    spammy_link_score += IdentifiScore.get_link_spam_score(tweet.text)
+                    spammy_link_score += feature_cache.get_or_compute(
+                        tweet_keys[index], "link_spam", lambda: IdentifiScore.get_link_spam_score(tweet.text)
+                    )
                     original_count += 1
                     detect_text += tweet.text + "\n\n"
 
                 # elapsed_ms = (time.time() - start_time) * 1000
 
-            avg_views = 0
-            avg_likes = 0
-            avg_retweets = 0
-            avg_replies = 0
+            totals = {
+                "tweet_len": tweet_len,
+                "original_count": original_count,
+                "readability_score": readability_score,
+                "image_count": image_count,
+                "video_count": video_count,
+                "views_count": views_count,
+                "likes_count": likes_count,
+                "retweets_count": retweets_count,
+                "replies_count": replies_count,
+                "spammy_link_score": spammy_link_score,
+            }
+            result = IdentifiScore.summarize_v2(payload, totals, spam_sim_arr, spam_sim_tweets_arr)
 
-            if original_count > 0:
-                avg_views = round(views_count / original_count, 2)
-                avg_likes = round(likes_count / original_count, 2)
-                avg_retweets = round(retweets_count / original_count, 2)
-                avg_replies = round(replies_count / original_count, 2)
-            else:
-                logger.info(f'IDENTIFI_SCORE_V2 {payload.username} has 0 original tweet. average engagement metric set to 0')
-
-            # network score
-            follower_score = round(math.log(payload.public_metrics.followers_count + 1) * 50, 2)
-            view_score = round(math.log(avg_views + 1) * 50, 2)
-            network_score = round(follower_score + view_score, 2)
-
-            # engagement score
-            sum_engagement = round(avg_likes + avg_retweets + avg_replies, 2)
-            engagement_score = round(math.log(sum_engagement + 1) * 75, 2)
-
-            #feedback score
-            feedback_score = 0
-
-            if payload.voters:
-                feedback_weight_sum = 0
-                feedback_value = 0
-                for voter in payload.voters:
-                    weight = math.log(voter.followers + 10) * math.sqrt(voter.twitter_account_age_days / 30) * voter.quality_score
-                    feedback_weight_sum += weight
-                    value = 1 if voter.vote == "up" else -1
-                    feedback_value += value * weight 
-                    
-                if feedback_weight_sum > 0:
-                    feedback_score = feedback_value / feedback_weight_sum
-                else:
-                    feedback_score = 0
-
-            # quality score
-            originality_score = round((original_count / tweet_len) * 100, 2)
-            media_richness_score = IdentifiScore.get_media_richness_score(image_count, video_count)
-            readability_score = round(readability_score, 2)
-            content_score = round(readability_score + media_richness_score, 2)
-
-            if(len(spam_sim_arr) > 0 and original_count > 0):
-                spam_ratio = len(spam_sim_arr) / original_count
-                avg_sim = sum(spam_sim_arr) / len(spam_sim_arr)
-                base_penalty = -(max(0, avg_sim - IdentifiScore.SIMILARITY_SPAM_THRESHOLDS) / (1 - IdentifiScore.SIMILARITY_SPAM_THRESHOLDS)) * 100
-                count_multiplier = 1 + (spam_ratio * IdentifiScore.SPAM_PENALTY_MULTIPLIER) 
-                excess_sim = max(0, avg_sim - IdentifiScore.SIMILARITY_SPAM_THRESHOLDS)
-                exponential_factor = (excess_sim / (1 - IdentifiScore.SIMILARITY_SPAM_THRESHOLDS)) ** 2
-                spam_penalty = base_penalty * count_multiplier * (1 + exponential_factor)
-            else:
-                spam_penalty = 0
-                # print(f"{spam_penalty}")
+            finished_ms = (time.time() - t0) * 1000
+            logger.info(f"IDENTIFI_SCORE_V2 {payload.username} FINISHED in {finished_ms:.2f} ms\n")
 
-            # spam_penalty = max(spam_penalty, -(tweet_len / 2)) enable if want to be capped
+            return result
+        except Exception as e:
+            logger.exception(f"IDENTIFI_SCORE_V2_ERR {payload.username} {e}")
+            raise
+    
+    @staticmethod
+    def score_identifi_v2_incremental(payload: RequestIdentifiScoreV2):
+        """
+        Identifi v2 scoring that resumes from `payload.state`.
+
+        `payload.tweets` only needs the tweets added since the state was issued;
+        already-seen ids are skipped. Aggregates are running sums and spam
+        similarity uses IncrementalSpamIndex, so the work is proportional to the
+        delta. The response carries the updated opaque `state` for the next call.
+        Refused with InvalidStateError unless IDENTIFI_STATE_SECRET is set.
+        """
+        if not IdentifiStateCodec.enabled():
+            raise InvalidStateError("incremental scoring is disabled: IDENTIFI_STATE_SECRET is not set")
+
+        logger.info(f'IDENTIFI_SCORE_V2_INCREMENTAL {payload.username} START')
+        try:
+            t0 = time.time()
 
-            spammy_link_score *= 100
-            spam_penalty = round(spam_penalty, 2)
-            spammy_link_score = round(spammy_link_score, 2)
-            behaviour_score = originality_score + spam_penalty + spammy_link_score
-            quality_score = round(content_score + behaviour_score, 2)
+            if payload.state:
+                state = IdentifiStateCodec.decode(payload.state)
+                totals = state["totals"]
+                tweet_ids = state["ids"]
+                spam_index = IncrementalSpamIndex(state["index"], state["entries"])
+            else:
+                state = {}
+                totals = {field: 0 for field in TOTAL_FIELDS}
+                tweet_ids = []
+                spam_index = IncrementalSpamIndex()
 
-            # on chain
-            referral_count = 0
-            referral_score = 0
-            badges_score = 0
-            on_chain_score = 0
-            
-            # if payload.address:
-            #     referral_service = SomniaReferralService()
-            #     referral_count = await referral_service.get_referral_count_async(payload.address)
+            seen_tweet_ids = set(tweet_ids)
+            delta_tweets = []
+            delta_keys = []
+            new_entries = []
+            new_keys = []
 
-            if(referral_count > 0):
-                referral_score = math.log10(referral_count + 1) * 30
-                
-            badges_score = payload.total_badges_reward * 0.4
-            on_chain_score = round(referral_score + badges_score, 2)
+            for tweet in payload.tweets:
+                if tweet.id in seen_tweet_ids:
+                    continue
+                seen_tweet_ids.add(tweet.id)
+                tweet_ids.append(tweet.id)
+
+                raw_text = tweet.text
+                tweet.text = feature_cache.get_or_compute(
+                    feature_cache.key(tweet.id, raw_text),
+                    "clean",
+                    lambda: IdentifiScoreUtil.clean_tweet(raw_text),
+                )
+                delta_tweets.append(tweet)
+                delta_keys.append(feature_cache.key(tweet.id, tweet.text))
+
+            delta_texts = [tweet.text for tweet in delta_tweets]
+            if IDENTIFI_LANGUAGE_SCOPE == "user" and not state.get("lang"):
+                state["lang"] = IdentifiScore.estimate_language(delta_texts)
+            readability_scores = IdentifiScore.get_cached_readability_scores(
+                delta_keys, delta_texts, lang=state.get("lang")
+            )
+
+            for tweet, key, readability in zip(delta_tweets, delta_keys, readability_scores):
+                totals["tweet_len"] += 1
+                totals["readability_score"] += readability
+                totals["image_count"] += len(tweet.photos)
+                totals["video_count"] += len(tweet.videos)
 
-            # final
-            identifi_score = round(network_score + engagement_score + quality_score + on_chain_score, 2)
+                if tweet.isRetweet == False:
+                    totals["views_count"] += tweet.views if tweet.views is not None else 0
+                    totals["likes_count"] += tweet.likes if tweet.likes is not None else 0
+                    totals["retweets_count"] += tweet.retweets if tweet.retweets is not None else 0
+                    totals["replies_count"] += tweet.replies if tweet.replies is not None else 0
+                    totals["spammy_link_score"] += feature_cache.get_or_compute(
+                        key, "link_spam", lambda: IdentifiScore.get_link_spam_score(tweet.text)
+                    )
+                    totals["original_count"] += 1
+
+                if len(tweet.text) > 0:
+                    new_entries.append({
+                        "id": tweet.id,
+                        "tweet": tweet.text,
+                        "original": tweet.isRetweet == False,
+                    })
+                    new_keys.append(key)
+
+            if new_entries:
+                new_embeddings = feature_cache.encode(new_keys, [e["tweet"] for e in new_entries], embedder)
+                spam_index.add(new_entries, new_embeddings)
+
+            # rescoring from the maintained maxima is O(n) vector math, no similarity work
+            spam_sim_arr = []
+            spam_sim_tweets_arr = []
+            if spam_index.entries:
+                spam_scores = SpamSimilarityEngine.score(
+                    [e["tweet"] for e in spam_index.entries],
+                    spam_index.max_sketch,
+                    spam_index.max_embed,
+                )
+                for entry, sim_score in zip(spam_index.entries, spam_scores):
+                    if entry["original"] and sim_score >= IdentifiScore.SIMILARITY_SPAM_THRESHOLDS:
+                        spam_sim_arr.append(float(sim_score))
+                        spam_sim_tweets_arr.append({
+                            "tweet": entry["tweet"],
+                            "id": entry["id"]
+                        })
+
+            result = IdentifiScore.summarize_v2(payload, totals, spam_sim_arr, spam_sim_tweets_arr)
+            result["state"] = IdentifiStateCodec.encode({
+                "ids": tweet_ids,
+                "lang": state.get("lang"),
+                "totals": totals,
+                "entries": spam_index.entries,
+                "index": spam_index.to_state(),
+            })
 
             finished_ms = (time.time() - t0) * 1000
-            logger.info(f"IDENTIFI_SCORE_V2 {payload.username} FINISHED in {finished_ms:.2f} ms\n")
+            logger.info(
+                f"IDENTIFI_SCORE_V2_INCREMENTAL {payload.username} FINISHED in {finished_ms:.2f} ms "
+                f"({len(new_entries)} new of {len(spam_index.entries)} tweets)\n"
+            )
+            return result
+        except Exception as e:
+            logger.exception(f"IDENTIFI_SCORE_V2_INCREMENTAL_ERR {payload.username} {e}")
+            raise
 
-            return {
-                "network": {
-                    "followers_count": payload.public_metrics.followers_count,
-                    "follower_score": follower_score,
-                    "average_views": avg_views,
-                    "view_score": view_score,
-                    "overall": network_score
-                },
-                "engagement": {
-                    "average_likes": avg_likes,
-                    "average_retweets": avg_retweets,
-                    "average_replies": avg_replies,
-                    "sum_engagement": sum_engagement,
-                    "overall": engagement_score
-                },
-                "feedback": {
-                    "overall": feedback_score,
-                },
-                "quality": {
-                    "content_score": {
-                        "media_richness": media_richness_score,
-                        "readability": readability_score,
-                        "overall": content_score
-                    },
-                    "behaviour_score": {
-                        "spam_tweet_penalty": spam_penalty,
-                        "spam_keyword_penalty": spammy_link_score,
-                        "originality": originality_score,
-                        "overall": behaviour_score
-                    },
-                    "overall": quality_score
+    @staticmethod
+    def summarize_v2(payload: RequestIdentifiScoreV2, totals: dict, spam_sim_arr: list, spam_sim_tweets_arr: list):
+        """Build the identifi v2 response from per-tweet running sums and the detected spam tweets."""
+        tweet_len = totals["tweet_len"]
+        original_count = totals["original_count"]
+        readability_score = totals["readability_score"]
+        image_count = totals["image_count"]
+        video_count = totals["video_count"]
+        views_count = totals["views_count"]
+        likes_count = totals["likes_count"]
+        retweets_count = totals["retweets_count"]
+        replies_count = totals["replies_count"]
+        spammy_link_score = totals["spammy_link_score"]
+
+        avg_views = 0
+        avg_likes = 0
+        avg_retweets = 0
+        avg_replies = 0
+
+        if original_count > 0:
+            avg_views = round(views_count / original_count, 2)
+            avg_likes = round(likes_count / original_count, 2)
+            avg_retweets = round(retweets_count / original_count, 2)
+            avg_replies = round(replies_count / original_count, 2)
+        else:
+            logger.info(f'IDENTIFI_SCORE_V2 {payload.username} has 0 original tweet. average engagement metric set to 0')
+
+        # network score
+        follower_score = round(math.log(payload.public_metrics.followers_count + 1) * 50, 2)
+        view_score = round(math.log(avg_views + 1) * 50, 2)
+        network_score = round(follower_score + view_score, 2)
+
+        # engagement score
+        sum_engagement = round(avg_likes + avg_retweets + avg_replies, 2)
+        engagement_score = round(math.log(sum_engagement + 1) * 75, 2)
+
+        #feedback score
+        feedback_score = 0
+
+        if payload.voters:
+            feedback_weight_sum = 0
+            feedback_value = 0
+            for voter in payload.voters:
+                weight = math.log(voter.followers + 10) * math.sqrt(voter.twitter_account_age_days / 30) * voter.quality_score
+                feedback_weight_sum += weight
+                value = 1 if voter.vote == "up" else -1
+                feedback_value += value * weight 
+
+            if feedback_weight_sum > 0:
+                feedback_score = feedback_value / feedback_weight_sum
+            else:
+                feedback_score = 0
+
+        # quality score
+        originality_score = round((original_count / tweet_len) * 100, 2)
+        media_richness_score = IdentifiScore.get_media_richness_score(image_count, video_count)
+        readability_score = round(readability_score, 2)
+        content_score = round(readability_score + media_richness_score, 2)
+
+        if(len(spam_sim_arr) > 0 and original_count > 0):
+            spam_ratio = len(spam_sim_arr) / original_count
+            avg_sim = sum(spam_sim_arr) / len(spam_sim_arr)
+            base_penalty = -(max(0, avg_sim - IdentifiScore.SIMILARITY_SPAM_THRESHOLDS) / (1 - IdentifiScore.SIMILARITY_SPAM_THRESHOLDS)) * 100
+            count_multiplier = 1 + (spam_ratio * IdentifiScore.SPAM_PENALTY_MULTIPLIER) 
+            excess_sim = max(0, avg_sim - IdentifiScore.SIMILARITY_SPAM_THRESHOLDS)
+            exponential_factor = (excess_sim / (1 - IdentifiScore.SIMILARITY_SPAM_THRESHOLDS)) ** 2
+            spam_penalty = base_penalty * count_multiplier * (1 + exponential_factor)
+        else:
+            spam_penalty = 0
+            # print(f"{spam_penalty}")
+
+        # spam_penalty = max(spam_penalty, -(tweet_len / 2)) enable if want to be capped
+
+        spammy_link_score *= 100
+        spam_penalty = round(spam_penalty, 2)
+        spammy_link_score = round(spammy_link_score, 2)
+        behaviour_score = originality_score + spam_penalty + spammy_link_score
+        quality_score = round(content_score + behaviour_score, 2)
+
+        # on chain
+        referral_count = 0
+        referral_score = 0
+        badges_score = 0
+        on_chain_score = 0
+
+        # if payload.address:
+        #     referral_service = SomniaReferralService()
+        #     referral_count = await referral_service.get_referral_count_async(payload.address)
+
+        if(referral_count > 0):
+            referral_score = math.log10(referral_count + 1) * 30
+
+        badges_score = payload.total_badges_reward * 0.4
+        on_chain_score = round(referral_score + badges_score, 2)
+
+        # final
+        identifi_score = round(network_score + engagement_score + quality_score + on_chain_score, 2)
+
+
+        return {
+            "network": {
+                "followers_count": payload.public_metrics.followers_count,
+                "follower_score": follower_score,
+                "average_views": avg_views,
+                "view_score": view_score,
+                "overall": network_score
+            },
+            "engagement": {
+                "average_likes": avg_likes,
+                "average_retweets": avg_retweets,
+                "average_replies": avg_replies,
+                "sum_engagement": sum_engagement,
+                "overall": engagement_score
+            },
+            "feedback": {
+                "overall": feedback_score,
+            },
+            "quality": {
+                "content_score": {
+                    "media_richness": media_richness_score,
+                    "readability": readability_score,
+                    "overall": content_score
                 },
-                "onchain":{
-                    "referral": referral_count,
-                    "badges_minted_count": payload.badges_minted,
-                    "badges_reward_accumulated": payload.total_badges_reward,
-                    "badges_score": badges_score,
-                    "overall": on_chain_score
+                "behaviour_score": {
+                    "spam_tweet_penalty": spam_penalty,
+                    "spam_keyword_penalty": spammy_link_score,
+                    "originality": originality_score,
+                    "overall": behaviour_score
                 },
-                "identifi": identifi_score,
-                "proof": {
-                    "spam_tweets": spam_sim_tweets_arr
-                }
+                "overall": quality_score
+            },
+            "onchain":{
+                "referral": referral_count,
+                "badges_minted_count": payload.badges_minted,
+                "badges_reward_accumulated": payload.total_badges_reward,
+                "badges_score": badges_score,
+                "overall": on_chain_score
+            },
+            "identifi": identifi_score,
+            "proof": {
+                "spam_tweets": spam_sim_tweets_arr
             }
-        except Exception as e:
-            logger.exception(f"IDENTIFI_SCORE_V2_ERR {payload.username} {e}")
-            raise
-    
+        }
+
     # deprecated function
     @staticmethod
     async def calculate_identifi_log(payload: RequestIdentifiScore):
@@ -424,6 +695,9 @@ class IdentifiScore:
             referral_count = 0
 
             if payload.address:
+                # web3 is heavy and only this deprecated route needs it
+                from services.somnia_referral_service import SomniaReferralService
+
                 referral_service = SomniaReferralService()
                 referral_count = await referral_service.get_referral_count_async(payload.address)
 
@@ -485,4 +759,13 @@ class IdentifiScore:
             }
         except Exception as e:
             logger.exception("calculate_identifi_log_err: %s", e)
-            raise 
+            raise
+
+
+model_lifecycle.register(
+    "tfidf",
+    lambda: None,
+    warmup=lambda _: IdentifiScore.new_tfidf().fit_transform(
+        ["warm up the vectorizer", "another warm up tweet", "gm gm"]
+    ),
+)
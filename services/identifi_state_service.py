@@ -0,0 +1,256 @@
+import base64
+import hashlib
+import hmac
+import os
+import zlib
+
+import numpy as np
+import orjson
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+
+# tokens carry the running sums behind a user's score, so they must be signed:
+# without a secret incremental scoring is refused
+IDENTIFI_STATE_SECRET = os.getenv("IDENTIFI_STATE_SECRET", "")
+IDENTIFI_STATE_HASH_FEATURES = int(os.getenv("IDENTIFI_STATE_HASH_FEATURES", str(2 ** 18)))
+# decompressed size limit of a state token
+IDENTIFI_STATE_MAX_BYTES = int(os.getenv("IDENTIFI_STATE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+STATE_VERSION = 1
+
+# the arrays a state may carry: dtype and number of dimensions
+_ARRAY_SPECS = {
+    "sketch_data": ("float32", 1),
+    "sketch_indices": ("int32", 1),
+    "sketch_indptr": ("int64", 1),
+    "embeddings": ("float16", 2),
+    "max_sketch": ("float32", 1),
+    "max_embed": ("float32", 1),
+}
+_MAX_EMBEDDING_DIM = 4096
+
+# running sums carried between incremental identifi v2 calls
+TOTAL_FIELDS = (
+    "tweet_len",
+    "original_count",
+    "readability_score",
+    "image_count",
+    "video_count",
+    "views_count",
+    "likes_count",
+    "retweets_count",
+    "replies_count",
+    "spammy_link_score",
+)
+
+
+class InvalidStateError(ValueError):
+    """Raised when an incremental state token cannot be decoded or verified."""
+
+
+class IdentifiStateCodec:
+    """Opaque, HMAC-signed encoding of the incremental identifi state"""
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(IDENTIFI_STATE_SECRET)
+
+    @staticmethod
+    def _pack_array(arr: np.ndarray) -> dict:
+        return {
+            "dtype": str(arr.dtype),
+            "shape": list(arr.shape),
+            "data": base64.b64encode(np.ascontiguousarray(arr).tobytes()).decode("ascii"),
+        }
+
+    @staticmethod
+    def _unpack_array(name: str, packed: dict) -> np.ndarray:
+        if name not in _ARRAY_SPECS:
+            raise InvalidStateError(f"unexpected state array {name!r}")
+        dtype, ndim = _ARRAY_SPECS[name]
+        shape = packed.get("shape")
+        if (
+            packed.get("dtype") != dtype
+            or not isinstance(shape, list)
+            or len(shape) != ndim
+            or not all(isinstance(d, int) and d >= 0 for d in shape)
+        ):
+            raise InvalidStateError(f"state array {name!r} must be {ndim}-d {dtype}")
+
+        raw = base64.b64decode(packed["data"])
+        if len(raw) != int(np.prod(shape)) * np.dtype(dtype).itemsize:
+            raise InvalidStateError(f"state array {name!r} does not match its shape")
+        return np.frombuffer(raw, dtype=np.dtype(dtype)).reshape(shape).copy()
+
+    @staticmethod
+    def _check_index(doc: dict) -> None:
+        """The arrays must describe exactly the state's entries."""
+        index, n = doc["index"], len(doc["entries"])
+        if set(index) != set(_ARRAY_SPECS):
+            raise InvalidStateError("state index is incomplete")
+
+        indptr, indices = index["sketch_indptr"], index["sketch_indices"]
+        embeddings = index["embeddings"]
+        consistent = (
+            index["max_sketch"].shape == (n,)
+            and index["max_embed"].shape == (n,)
+            and indptr.shape == (n + 1,)
+            and indptr[0] == 0
+            and indptr[-1] == len(indices) == len(index["sketch_data"])
+            and np.all(np.diff(indptr) >= 0)
+            and (len(indices) == 0 or (indices.min() >= 0 and indices.max() < IDENTIFI_STATE_HASH_FEATURES))
+            and (embeddings.shape == (0, 0) if n == 0 else embeddings.shape[0] == n)
+            and embeddings.shape[1] <= _MAX_EMBEDDING_DIM
+        )
+        if not consistent:
+            raise InvalidStateError("state index does not match its entries")
+
+    @staticmethod
+    def _sign(body: bytes) -> bytes:
+        if not IDENTIFI_STATE_SECRET:
+            raise InvalidStateError("incremental scoring is disabled: IDENTIFI_STATE_SECRET is not set")
+        return hmac.new(IDENTIFI_STATE_SECRET.encode("utf-8"), body, hashlib.sha256).digest()
+
+    @staticmethod
+    def _decompress(body: bytes) -> bytes:
+        inflater = zlib.decompressobj()
+        data = inflater.decompress(body, IDENTIFI_STATE_MAX_BYTES)
+        if inflater.unconsumed_tail or not inflater.eof:
+            raise InvalidStateError(f"state payload exceeds {IDENTIFI_STATE_MAX_BYTES} bytes or is truncated")
+        return data
+
+    @staticmethod
+    def encode(state: dict) -> str:
+        doc = dict(state)
+        doc["v"] = STATE_VERSION
+        doc["index"] = {
+            name: IdentifiStateCodec._pack_array(arr)
+            for name, arr in state["index"].items()
+        }
+        body = zlib.compress(orjson.dumps(doc), 6)
+        return base64.urlsafe_b64encode(IdentifiStateCodec._sign(body) + body).decode("ascii")
+
+    @staticmethod
+    def decode(token: str) -> dict:
+        try:
+            blob = base64.urlsafe_b64decode(token.encode("ascii"))
+        except Exception as e:
+            raise InvalidStateError(f"state is not valid base64: {e}")
+
+        signature, body = blob[:32], blob[32:]
+        if not hmac.compare_digest(signature, IdentifiStateCodec._sign(body)):
+            raise InvalidStateError("state signature mismatch")
+
+        try:
+            doc = orjson.loads(IdentifiStateCodec._decompress(body))
+        except InvalidStateError:
+            raise
+        except Exception as e:
+            raise InvalidStateError(f"state payload is corrupt: {e}")
+
+        if not isinstance(doc, dict) or doc.get("v") != STATE_VERSION:
+            raise InvalidStateError(f"unsupported state version {doc.get('v') if isinstance(doc, dict) else None}")
+
+        try:
+            doc["index"] = {
+                name: IdentifiStateCodec._unpack_array(name, packed)
+                for name, packed in doc["index"].items()
+            }
+            IdentifiStateCodec._check_index(doc)
+            if set(doc["totals"]) != set(TOTAL_FIELDS) or len(doc["ids"]) != len(set(doc["ids"])):
+                raise InvalidStateError("state totals or ids are malformed")
+        except InvalidStateError:
+            raise
+        except Exception as e:
+            raise InvalidStateError(f"state payload is malformed: {e}")
+        return doc
+
+
+class IncrementalSpamIndex:
+    """
+    Spam-similarity state that can absorb new tweets in O(delta * n).
+
+    Exact scoring refits a TfidfVectorizer on the whole timeline, which moves
+    every vector whenever a tweet is added. The incremental index uses a
+    stateless l2-normalized hashed n-gram sketch instead, so stored vectors
+    never change and only the new rows need comparing. Scores are therefore
+    consistent across incremental calls but not bit-identical to the exact
+    TF-IDF path.
+    """
+
+    hasher = HashingVectorizer(
+        n_features=IDENTIFI_STATE_HASH_FEATURES,
+        ngram_range=(1, 2),
+        alternate_sign=False,
+        norm="l2",
+    )
+
+    def __init__(self, index: dict = None, entries: list = None):
+        # entries: per non-empty tweet {"id", "tweet", "original"}; arrays are row-aligned with it
+        self.entries = entries or []
+        if index:
+            self.sketch = sparse.csr_matrix(
+                (index["sketch_data"], index["sketch_indices"], index["sketch_indptr"]),
+                shape=(len(self.entries), IDENTIFI_STATE_HASH_FEATURES),
+            )
+            self.embeddings = index["embeddings"].astype(np.float32)
+            self.max_sketch = index["max_sketch"].astype(np.float64)
+            self.max_embed = index["max_embed"].astype(np.float64)
+        else:
+            self.sketch = None
+            self.embeddings = None
+            self.max_sketch = np.zeros(0)
+            self.max_embed = np.zeros(0)
+
+    def add(self, entries: list, embeddings: np.ndarray) -> None:
+        """Append new tweets and update every nearest-neighbour maximum touched by them."""
+        if not entries:
+            return
+
+        texts = [e["tweet"] for e in entries]
+        new_sketch = self.hasher.transform(texts).astype(np.float32).tocsr()
+        new_embs = np.asarray(embeddings, dtype=np.float32)
+        new_embs = new_embs / np.clip(np.linalg.norm(new_embs, axis=1, keepdims=True), 1e-12, None)
+
+        # new vs new, excluding self
+        sk_new = (new_sketch @ new_sketch.T).toarray()
+        em_new = new_embs @ new_embs.T
+        np.fill_diagonal(sk_new, -1.0)
+        np.fill_diagonal(em_new, -1.0)
+        new_max_sketch = sk_new.max(axis=1).astype(np.float64)
+        new_max_embed = em_new.max(axis=1).astype(np.float64)
+
+        if self.entries:
+            # new vs old, both directions from one product each
+            sk_cross = (new_sketch @ self.sketch.T).toarray()
+            em_cross = new_embs @ self.embeddings.T
+            new_max_sketch = np.maximum(new_max_sketch, sk_cross.max(axis=1))
+            new_max_embed = np.maximum(new_max_embed, em_cross.max(axis=1))
+            self.max_sketch = np.maximum(self.max_sketch, sk_cross.max(axis=0))
+            self.max_embed = np.maximum(self.max_embed, em_cross.max(axis=0))
+            self.sketch = sparse.vstack([self.sketch, new_sketch]).tocsr()
+            self.embeddings = np.vstack([self.embeddings, new_embs])
+        else:
+            self.sketch = new_sketch
+            self.embeddings = new_embs
+
+        self.max_sketch = np.concatenate([self.max_sketch, new_max_sketch])
+        self.max_embed = np.concatenate([self.max_embed, new_max_embed])
+        self.entries.extend(entries)
+
+    def to_state(self) -> dict:
+        if self.sketch is None:
+            sketch = sparse.csr_matrix((0, IDENTIFI_STATE_HASH_FEATURES), dtype=np.float32)
+            embeddings = np.zeros((0, 0), dtype=np.float16)
+        else:
+            sketch = self.sketch
+            embeddings = self.embeddings.astype(np.float16)
+
+        return {
+            "sketch_data": sketch.data.astype(np.float32),
+            "sketch_indices": sketch.indices.astype(np.int32),
+            "sketch_indptr": sketch.indptr.astype(np.int64),
+            "embeddings": embeddings,
+            "max_sketch": self.max_sketch.astype(np.float32),
+            "max_embed": self.max_embed.astype(np.float32),
+        }
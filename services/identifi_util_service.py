@@ -1,4 +1,4 @@
-from langdetect import detect
+from services.language_service import LanguageDetector
 import emoji
 import re
 from urllib.parse import urlparse
@@ -25,10 +25,7 @@ class IdentifiScoreUtil:
 
     @staticmethod
     def detect_language_safe(text):
-        try:
-            return detect(text)
-        except:
-            return "en"
+        return LanguageDetector.detect(text)
 
     @staticmethod
     def tokenize(text):
@@ -0,0 +1,154 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List
+
+from langdetect import DetectorFactory, detect
+from langdetect.detector_factory import init_factory
+
+LANGID_SEED = int(os.getenv("LANGID_SEED", "0"))
+LANGID_MEMO_SIZE = int(os.getenv("LANGID_MEMO_SIZE", "50000"))
+LANGID_FAST_MIN_HITS = float(os.getenv("LANGID_FAST_MIN_HITS", "2"))
+LANGID_FAST_MARGIN = float(os.getenv("LANGID_FAST_MARGIN", "2"))
+LANGID_USER_SAMPLE_CHARS = int(os.getenv("LANGID_USER_SAMPLE_CHARS", "4000"))
+
+# langdetect draws random trials; a fixed seed makes it deterministic
+DetectorFactory.seed = LANGID_SEED
+
+WORD_RE = re.compile(r"[a-z]+")
+
+DEFAULT_LANG = "en"
+
+
+class LanguageDetector:
+    """Deterministic language identification tuned for short tweets"""
+
+    # Function words that are near-unambiguous between the two languages we score.
+    ID_MARKERS = frozenset("""
+    yang untuk pada dengan tidak dari bahwa karena oleh sebagai dalam
+    itu ada kami mereka dia ini kamu saja bisa atau jadi kalau maka
+    aku gue gua lo lu gak ga nggak enggak banget sudah udah juga akan
+    sama lagi aja yg dgn tapi kita belum masih sangat hari sih dong
+    """.split())
+
+    EN_MARKERS = frozenset("""
+    the a an is are was were be to of and or in on for as by with this that it
+    you your i my me we our they their he she have has had not but just so
+    what will can all get do does did from at about been would could
+    """.split())
+
+    # Affix profile votes count half as much as a function word.
+    ID_SUFFIXES = ("nya", "kan", "lah", "kah")
+    ID_PREFIXES = ("meng", "meny", "mem", "ber", "ter", "per")
+    EN_SUFFIXES = ("ing", "tion", "ly", "ed", "ness")
+
+    _memo: "OrderedDict[str, str]" = OrderedDict()
+    _memo_lock = threading.Lock()
+    _factory_lock = threading.Lock()
+    _factory_ready = False
+
+    @staticmethod
+    def _votes(text: str):
+        id_votes = 0.0
+        en_votes = 0.0
+        for word in WORD_RE.findall(text.lower()):
+            if word in LanguageDetector.ID_MARKERS:
+                id_votes += 1
+            elif word in LanguageDetector.EN_MARKERS:
+                en_votes += 1
+            elif len(word) > 4:
+                if word.endswith(LanguageDetector.ID_SUFFIXES) or word.startswith(LanguageDetector.ID_PREFIXES):
+                    id_votes += 0.5
+                elif word.endswith(LanguageDetector.EN_SUFFIXES):
+                    en_votes += 0.5
+        return id_votes, en_votes
+
+    @staticmethod
+    def _fast_path(id_votes: float, en_votes: float):
+        """'id' / 'en' when the marker evidence is decisive, else None."""
+        top = max(id_votes, en_votes)
+        if top < LANGID_FAST_MIN_HITS:
+            return None
+        if id_votes >= LANGID_FAST_MARGIN * max(en_votes, 0.5):
+            return "id"
+        if en_votes >= LANGID_FAST_MARGIN * max(id_votes, 0.5):
+            return "en"
+        return None
+
+    @staticmethod
+    def _ensure_factory() -> None:
+        # langdetect publishes its global factory before the profiles finish
+        # loading, so concurrent first calls would detect against half a profile set
+        if LanguageDetector._factory_ready:
+            return
+        with LanguageDetector._factory_lock:
+            if not LanguageDetector._factory_ready:
+                init_factory()
+                LanguageDetector._factory_ready = True
+
+    @staticmethod
+    def _fallback(text: str) -> str:
+        LanguageDetector._ensure_factory()
+        try:
+            return detect(text)
+        except Exception:
+            return DEFAULT_LANG
+
+    @staticmethod
+    def detect(text: str) -> str:
+        """Language code for `text`. Memoized by text, deterministic across runs."""
+        if not text or not text.strip():
+            return DEFAULT_LANG
+
+        with LanguageDetector._memo_lock:
+            cached = LanguageDetector._memo.get(text)
+            if cached is not None:
+                LanguageDetector._memo.move_to_end(text)
+                return cached
+
+        lang = LanguageDetector._fast_path(*LanguageDetector._votes(text))
+        if lang is None:
+            lang = LanguageDetector._fallback(text)
+
+        if LANGID_MEMO_SIZE > 0:
+            with LanguageDetector._memo_lock:
+                LanguageDetector._memo[text] = lang
+                while len(LanguageDetector._memo) > LANGID_MEMO_SIZE:
+                    LanguageDetector._memo.popitem(last=False)
+        return lang
+
+    @staticmethod
+    def detect_batch(texts: List[str]) -> List[str]:
+        """Language per text; duplicate texts are only detected once."""
+        resolved = {}
+        for text in texts:
+            if text not in resolved:
+                resolved[text] = LanguageDetector.detect(text)
+        return [resolved[text] for text in texts]
+
+    @staticmethod
+    def estimate_user_language(texts: List[str]) -> str:
+        """
+        One language for a whole timeline.
+
+        Marker votes are pooled across all tweets, which is decisive far more
+        often than per-tweet voting on 5-word texts. When it is not, a single
+        seeded langdetect call runs on a bounded sample of the timeline.
+        """
+        id_votes = 0.0
+        en_votes = 0.0
+        for text in texts:
+            if text:
+                tweet_id_votes, tweet_en_votes = LanguageDetector._votes(text)
+                id_votes += tweet_id_votes
+                en_votes += tweet_en_votes
+
+        lang = LanguageDetector._fast_path(id_votes, en_votes)
+        if lang is not None:
+            return lang
+
+        sample = " ".join(t for t in texts if t)[:LANGID_USER_SAMPLE_CHARS]
+        if not sample.strip():
+            return DEFAULT_LANG
+        return LanguageDetector._fallback(sample)
@@ -0,0 +1,163 @@
+import re
+from typing import List, Optional
+
+import emoji
+import numpy as np
+
+from services.identifi_util_service import IdentifiScoreUtil
+
+TOKEN_RE = re.compile(r"\w+|#\w+|[^\w\s]", re.UNICODE)
+WORD_RE = re.compile(r"\w+")
+SENTENCE_RE = re.compile(r"[.!?]+")
+PUNCT_RE = re.compile(r"[,;:—]")
+
+VOWELS = frozenset("aeiou")
+
+MIN_SCORE = 0.3
+
+
+class ReadabilityEngine:
+    """Batch readability scoring for identifi content quality"""
+
+    # Indonesian stopwords (extend as needed)
+    ID_STOPWORDS = set("""
+    yang untuk pada dengan tidak dari bahwa karena oleh sebagai dalam
+    itu ada kami mereka dia ini kamu saja bisa atau jadi kalau maka
+    """.split())
+
+    # English stopwords
+    EN_STOPWORDS = set("""
+    the a an is are was were be to of and or in on for as by with this that it
+    """.split())
+
+    @staticmethod
+    def get_readability_scores(texts: List[str], langs: Optional[List[Optional[str]]] = None) -> List[float]:
+        """
+        Readability score for every text, in one pass.
+
+        Tokenization and counting run once per text with precompiled patterns;
+        per-word vowel ratios and the final weighting run as NumPy arrays.
+        Scores are identical to scoring each text on its own.
+
+        Args:
+            texts: Cleaned tweet texts
+            langs: Optional language code per text; detected when missing
+        """
+        n = len(texts)
+        scores = [MIN_SCORE] * n
+
+        # per-text counters, filled only for scorable rows
+        rows = []
+        sentences = []
+        token_counts = []
+        word_counts = []
+        word_len_sums = []
+        word_len_maxes = []
+        stopword_counts = []
+        hashtag_counts = []
+        emoji_counts = []
+        punct_counts = []
+        unique_counts = []
+        zero_stopword_eligible = []
+
+        # flat per-word arrays, segmented by word_offsets
+        word_lens = []
+        vowel_counts = []
+        word_offsets = [0]
+
+        for idx, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+
+            tokens = TOKEN_RE.findall(text)
+            words = [t for t in tokens if WORD_RE.match(t)]
+            if not words:
+                continue
+
+            lang = langs[idx] if langs is not None and langs[idx] else None
+            if lang is None:
+                lang = IdentifiScoreUtil.detect_language_safe(text)
+            stopwords = ReadabilityEngine.ID_STOPWORDS if lang.startswith("id") else ReadabilityEngine.EN_STOPWORDS
+
+            lens = [len(w) for w in words]
+            lowered = [w.lower() for w in words]
+
+            rows.append(idx)
+            sentences.append(max(1, len(SENTENCE_RE.findall(text))))
+            token_counts.append(len(tokens))
+            word_counts.append(len(words))
+            word_len_sums.append(sum(lens))
+            word_len_maxes.append(max(lens))
+            stopword_counts.append(sum(1 for w in lowered if w in stopwords))
+            hashtag_counts.append(sum(1 for t in tokens if t.startswith("#")))
+            emoji_counts.append(0 if text.isascii() else sum(1 for ch in text if ch in emoji.EMOJI_DATA))
+            punct_counts.append(len(PUNCT_RE.findall(text)))
+            unique_counts.append(len(set(words)))
+            zero_stopword_eligible.append(len(text) > 20)
+
+            word_lens.extend(lens)
+            vowel_counts.extend(sum(1 for c in w if c in VOWELS) for w in lowered)
+            word_offsets.append(len(word_lens))
+
+        if not rows:
+            return scores
+
+        # ---------- PER-WORD VOWEL PENALTY ----------
+        ratios = np.asarray(vowel_counts, dtype=np.float64) / np.asarray(word_lens, dtype=np.float64)
+        per_word = (1 - np.minimum(ratios * 2, 1.0)).tolist()
+        # sequential per-text sums keep float results identical to the scalar version
+        vowel_sums = [sum(per_word[word_offsets[i]:word_offsets[i + 1]]) for i in range(len(rows))]
+
+        word_count = np.asarray(word_counts, dtype=np.float64)
+        token_count = np.asarray(token_counts, dtype=np.float64)
+
+        # ---------- BASE METRICS ----------
+        avg_sentence_len = word_count / np.asarray(sentences, dtype=np.float64)
+        avg_word_len = np.asarray(word_len_sums, dtype=np.float64) / word_count
+        stopword_ratio = np.asarray(stopword_counts, dtype=np.float64) / word_count
+
+        # ---------- NOISE METRICS ----------
+        hashtag_density = np.asarray(hashtag_counts, dtype=np.float64) / token_count
+        emoji_density = np.asarray(emoji_counts, dtype=np.float64) / token_count
+        punct_complexity = np.asarray(punct_counts, dtype=np.float64) / token_count
+
+        # ---------- NATURALNESS METRICS ----------
+        low_diversity_penalty = 1 - np.asarray(unique_counts, dtype=np.float64) / word_count
+        long_word_penalty = np.minimum(np.asarray(word_len_maxes, dtype=np.float64) / 20, 1.0)
+        vowel_penalty = np.asarray(vowel_sums, dtype=np.float64) / word_count
+        zero_stopword_penalty = np.where(
+            (stopword_ratio == 0) & np.asarray(zero_stopword_eligible), 1.0, 0.0
+        )
+
+        f_sentence = 1 / (1 + np.minimum(avg_sentence_len, 30))
+        f_word = 1 / (1 + np.minimum(avg_word_len, 15))
+
+        # ---------- FINAL RAW SCORE ----------
+        raw = (
+            # Structure (45%)
+            0.25 * f_sentence +
+            0.20 * f_word +
+
+            # Naturalness (32%)
+            -0.15 * long_word_penalty +
+            -0.15 * vowel_penalty +
+            -0.07 * low_diversity_penalty +
+
+            # Noise (12%)
+            -0.10 * hashtag_density +
+            -0.03 * emoji_density +
+            -0.05 * punct_complexity +
+
+            # Stopwords (11%)
+            0.15 * stopword_ratio -
+            0.08 * zero_stopword_penalty
+        )
+
+        # Normalize raw score into 0–1, then map to readability band 0.3 → 0.9
+        raw_norm = np.maximum(0.0, np.minimum(1.0, raw + 0.5))
+        final = 0.3 + 0.6 * raw_norm
+
+        # python round (not np.round) to match the scalar version's decimal rounding
+        for idx, value in zip(rows, final.tolist()):
+            scores[idx] = round(value, 4)
+        return scores
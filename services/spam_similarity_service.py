@@ -0,0 +1,268 @@
+"""
+All-pairs spam similarity for identifi scoring.
+
+Exact mode computes the n x n TF-IDF and embedding similarity matrices in row
+blocks of SPAM_EXACT_BLOCK_CELLS cells, so memory stays bounded but time is
+quadratic. The sparse TF-IDF product is the slow side: from
+SPAM_APPROX_MIN_TWEETS tweets it switches to the approximate mode, which only
+scores candidate pairs exactly. The dense embedding product stays faster than
+its approximation at the sizes measured, so it only switches from
+SPAM_APPROX_EMBED_MIN_TWEETS (0 = never):
+
+- TF-IDF side: MinHash over each tweet's non-zero n-gram features, banded
+  LSH (SPAM_MINHASH_BANDS x SPAM_MINHASH_ROWS) groups likely near-duplicates.
+- Embedding side: random-hyperplane SimHash, SPAM_SIMHASH_TABLES tables of
+  SPAM_SIMHASH_BITS bits each.
+
+Tweets sharing a bucket are compared exactly; a tweet with no candidate gets
+a max similarity of 0.0 (a lower bound). Recall and the exact/approximate
+crossover are measured by benchmarks/spam_similarity_recall.py.
+"""
+
+import os
+
+import numpy as np
+
+SPAM_APPROX_MIN_TWEETS = int(os.getenv("SPAM_APPROX_MIN_TWEETS", "5000"))
+# 0 keeps the embedding side exact at any size
+SPAM_APPROX_EMBED_MIN_TWEETS = int(os.getenv("SPAM_APPROX_EMBED_MIN_TWEETS", "0"))
+SPAM_MINHASH_BANDS = int(os.getenv("SPAM_MINHASH_BANDS", "20"))
+SPAM_MINHASH_ROWS = int(os.getenv("SPAM_MINHASH_ROWS", "3"))
+SPAM_SIMHASH_TABLES = int(os.getenv("SPAM_SIMHASH_TABLES", "24"))
+SPAM_SIMHASH_BITS = int(os.getenv("SPAM_SIMHASH_BITS", "13"))
+SPAM_APPROX_SEED = int(os.getenv("SPAM_APPROX_SEED", "1234"))
+# buckets above this size are compared as chunked dense blocks instead of pair lists
+SPAM_APPROX_BLOCK = int(os.getenv("SPAM_APPROX_BLOCK", "1024"))
+# candidate pairs scored per vectorized step, bounds peak memory
+SPAM_APPROX_PAIR_CHUNK = 200_000
+# similarity cells per exact row block, bounds peak memory to (rows, n) instead of (n, n)
+SPAM_EXACT_BLOCK_CELLS = 1 << 24
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+class SpamSimilarityEngine:
+    """All-pairs similarity engine for identifi spam detection"""
+
+    @staticmethod
+    def _block_rows(n: int) -> int:
+        return max(1, SPAM_EXACT_BLOCK_CELLS // max(n, 1))
+
+    @staticmethod
+    def max_offdiag_tfidf(tfidf_matrix) -> np.ndarray:
+        """Max cosine similarity of every row against every other row.
+
+        TfidfVectorizer rows are already l2-normalized, so sparse products
+        give the cosine matrix, one block of rows at a time.
+        """
+        csr = tfidf_matrix.tocsr()
+        n = csr.shape[0]
+        if n < 2:
+            return np.full(n, -1.0)
+
+        best = np.empty(n)
+        step = SpamSimilarityEngine._block_rows(n)
+        for start in range(0, n, step):
+            sims = (csr[start:start + step] @ csr.T).toarray()
+            rows = np.arange(len(sims))
+            sims[rows, rows + start] = -1.0
+            best[start:start + step] = sims.max(axis=1)
+        return best
+
+    @staticmethod
+    def _normalize_embed(embed_matrix) -> np.ndarray:
+        embs = np.asarray(embed_matrix, dtype=np.float32)
+        # same normalization util.cos_sim applies, keeps parity for unnormalized input
+        norms = np.linalg.norm(embs, axis=1, keepdims=True)
+        return embs / np.clip(norms, 1e-12, None)
+
+    @staticmethod
+    def max_offdiag_embed(embed_matrix) -> np.ndarray:
+        """Max cosine similarity of every embedding against every other one, by row blocks."""
+        embs = SpamSimilarityEngine._normalize_embed(embed_matrix)
+        n = embs.shape[0]
+        if n < 2:
+            return np.full(n, -1.0)
+
+        best = np.empty(n)
+        step = SpamSimilarityEngine._block_rows(n)
+        for start in range(0, n, step):
+            sims = embs[start:start + step] @ embs.T
+            rows = np.arange(len(sims))
+            sims[rows, rows + start] = -1.0
+            best[start:start + step] = sims.max(axis=1)
+        return best
+
+    @staticmethod
+    def _bucket_groups(codes: np.ndarray, rows: np.ndarray) -> list:
+        """Groups (size >= 2) of `rows` whose code rows are identical."""
+        if len(rows) < 2:
+            return []
+        _, inverse = np.unique(codes, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind="stable")
+        sorted_ids = inverse[order]
+        cuts = np.flatnonzero(np.diff(sorted_ids)) + 1
+        return [rows[g] for g in np.split(order, cuts) if len(g) >= 2]
+
+    @staticmethod
+    def _update_group_max(matrix, members: np.ndarray, best: np.ndarray) -> None:
+        """Exact similarities inside one bucket, folded into `best`."""
+        block = matrix[members]
+        for start in range(0, len(members), SPAM_APPROX_BLOCK):
+            chunk = members[start:start + SPAM_APPROX_BLOCK]
+            sims = matrix[chunk] @ block.T
+            if hasattr(sims, "toarray"):
+                sims = sims.toarray()
+            sims = np.asarray(sims, dtype=np.float64)
+            sims[np.arange(len(chunk)), np.arange(start, start + len(chunk))] = -1.0
+            np.maximum.at(best, chunk, sims.max(axis=1))
+
+    @staticmethod
+    def _update_candidates_max(matrix, groups: list, best: np.ndarray) -> None:
+        """Exact similarity for every distinct candidate pair across all buckets, folded into `best`."""
+        n = matrix.shape[0]
+        pair_codes = []
+        for members in groups:
+            if len(members) > SPAM_APPROX_BLOCK:
+                SpamSimilarityEngine._update_group_max(matrix, members, best)
+                continue
+            i, j = np.triu_indices(len(members), k=1)
+            pair_codes.append(members[i].astype(np.int64) * n + members[j])
+
+        if not pair_codes:
+            return
+
+        # the same pair usually lands in several bands/tables; score it once
+        codes = np.unique(np.concatenate(pair_codes))
+        left_all, right_all = np.divmod(codes, n)
+
+        for start in range(0, len(codes), SPAM_APPROX_PAIR_CHUNK):
+            left = left_all[start:start + SPAM_APPROX_PAIR_CHUNK]
+            right = right_all[start:start + SPAM_APPROX_PAIR_CHUNK]
+            if hasattr(matrix, "multiply"):
+                sims = np.asarray(matrix[left].multiply(matrix[right]).sum(axis=1)).ravel()
+            else:
+                sims = np.einsum("ij,ij->i", matrix[left], matrix[right])
+            sims = sims.astype(np.float64)
+            np.maximum.at(best, left, sims)
+            np.maximum.at(best, right, sims)
+
+    @staticmethod
+    def minhash_signatures(tfidf_matrix, num_perm: int, seed: int = SPAM_APPROX_SEED) -> np.ndarray:
+        """(n, num_perm) MinHash signatures over each row's non-zero feature ids."""
+        csr = tfidf_matrix.tocsr()
+        n = csr.shape[0]
+        rng = np.random.default_rng(seed)
+        a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+        sig = np.full((n, num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+        non_empty = np.flatnonzero(np.diff(csr.indptr) > 0)
+        if len(non_empty) == 0:
+            return sig
+
+        features = csr.indices.astype(np.uint64)
+        starts = csr.indptr[non_empty]
+        for k in range(num_perm):
+            # uint64 arithmetic wraps; still a fixed pseudo-random permutation per (a, b)
+            hashed = (a[k] * features + b[k]) % np.uint64(_MERSENNE_PRIME)
+            sig[non_empty, k] = np.minimum.reduceat(hashed, starts)
+        return sig
+
+    @staticmethod
+    def approx_max_offdiag_tfidf(tfidf_matrix) -> np.ndarray:
+        """max_offdiag_tfidf over MinHash/LSH candidate pairs only."""
+        csr = tfidf_matrix.tocsr()
+        n = csr.shape[0]
+        if n < 2:
+            return np.full(n, -1.0)
+
+        best = np.zeros(n)
+        rows = np.flatnonzero(np.diff(csr.indptr) > 0)
+        if len(rows) < 2:
+            return best
+
+        sig = SpamSimilarityEngine.minhash_signatures(
+            csr[rows], SPAM_MINHASH_BANDS * SPAM_MINHASH_ROWS
+        )
+        groups = []
+        for band in range(SPAM_MINHASH_BANDS):
+            codes = sig[:, band * SPAM_MINHASH_ROWS:(band + 1) * SPAM_MINHASH_ROWS]
+            groups.extend(SpamSimilarityEngine._bucket_groups(codes, rows))
+
+        SpamSimilarityEngine._update_candidates_max(csr, groups, best)
+        return best
+
+    @staticmethod
+    def approx_max_offdiag_embed(embed_matrix) -> np.ndarray:
+        """max_offdiag_embed over SimHash candidate pairs only."""
+        embs = SpamSimilarityEngine._normalize_embed(embed_matrix)
+        n = embs.shape[0]
+        if n < 2:
+            return np.full(n, -1.0)
+
+        best = np.zeros(n)
+        rows = np.arange(n)
+        rng = np.random.default_rng(SPAM_APPROX_SEED)
+        planes = rng.standard_normal(
+            (SPAM_SIMHASH_TABLES, embs.shape[1], SPAM_SIMHASH_BITS)
+        ).astype(np.float32)
+        weights = (1 << np.arange(SPAM_SIMHASH_BITS)).astype(np.int64)
+
+        groups = []
+        for table in range(SPAM_SIMHASH_TABLES):
+            bits = (embs @ planes[table]) > 0
+            codes = (bits.astype(np.int64) @ weights).reshape(-1, 1)
+            groups.extend(SpamSimilarityEngine._bucket_groups(codes, rows))
+
+        SpamSimilarityEngine._update_candidates_max(embs, groups, best)
+        return best
+
+    @staticmethod
+    def score(tweets_list: list, sim_tfidf: np.ndarray, sim_embed: np.ndarray) -> np.ndarray:
+        """Vectorized sigmoid spam score from per-tweet max similarities."""
+        text_len = np.fromiter((len(t) for t in tweets_list), dtype=np.int64, count=len(tweets_list))
+
+        # penalties
+        freq_penalty = ((sim_tfidf + sim_embed) / 2 > 0.75).astype(np.float64)
+        short_penalty = np.where(text_len <= 4, 1.0, np.where(text_len <= 8, 0.5, 0.0))
+
+        z = (
+            1.2 * sim_embed +
+            0.8 * sim_tfidf +
+            0.3 * freq_penalty +
+            0.4 * short_penalty
+        )
+
+        return 1 / (1 + np.exp(-z))
+
+    @staticmethod
+    def get_spam_scores(tweets_list: list, tfidf_matrix, embed_matrix, approximate: bool = None) -> np.ndarray:
+        """
+        Spam score for every tweet in `tweets_list`, aligned by index.
+
+        Args:
+            approximate: Force the approximate path on/off for both sides; by
+                default the TF-IDF side uses it from SPAM_APPROX_MIN_TWEETS
+                tweets and the embedding side from SPAM_APPROX_EMBED_MIN_TWEETS
+        """
+        if not tweets_list:
+            return np.zeros(0)
+
+        n = len(tweets_list)
+        if approximate is None:
+            approx_tfidf = n >= SPAM_APPROX_MIN_TWEETS
+            approx_embed = 0 < SPAM_APPROX_EMBED_MIN_TWEETS <= n
+        else:
+            approx_tfidf = approx_embed = approximate
+
+        if approx_tfidf:
+            sim_tfidf = SpamSimilarityEngine.approx_max_offdiag_tfidf(tfidf_matrix)
+        else:
+            sim_tfidf = SpamSimilarityEngine.max_offdiag_tfidf(tfidf_matrix)
+        if approx_embed:
+            sim_embed = SpamSimilarityEngine.approx_max_offdiag_embed(embed_matrix)
+        else:
+            sim_embed = SpamSimilarityEngine.max_offdiag_embed(embed_matrix)
+        return SpamSimilarityEngine.score(tweets_list, sim_tfidf, sim_embed)
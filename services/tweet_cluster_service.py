@@ -0,0 +1,125 @@
+"""
+Threshold clustering of unmatched DNA tweets.
+
+Groups normalized tweet embeddings whose cosine similarity reaches a
+threshold and returns row indices per cluster, largest first:
+
+- leader (default): the greedy pass new-DNA discovery has always used. In
+  tweet order, the first unassigned tweet leads a cluster and takes every
+  later unassigned tweet within the threshold; the pass stops after
+  max_clusters leaders and only then orders those clusters by size. A
+  leader needs only its own row of the similarity matrix, so the pass costs
+  max_clusters matrix-vector products instead of n² pair comparisons.
+- components: connected components of the thresholded similarity graph
+  (scipy.sparse.csgraph), the largest max_clusters of them. The graph is
+  built from row blocks of the similarity matrix, so memory follows the
+  number of similar pairs, not n². Tweets can join through a chain of
+  neighbours without being within the threshold of each other.
+- complete: complete-linkage agglomerative clustering (scikit-learn) with
+  distance threshold 1 - threshold, the largest max_clusters: every pair in
+  a cluster is within the threshold. Holds the full n x n distance matrix,
+  fine for a few thousand tweets.
+
+    groups = TweetClusterEngine.cluster(embs, 0.75, 3, mode="components")
+    clusters = [[unmatched_tweets[i] for i in group] for group in groups]
+
+Members of a cluster keep tweet order; clusters of equal size keep the
+order of their first tweet.
+"""
+
+from typing import List
+
+import numpy as np
+
+from services.embedding_service import normalize_rows
+
+CLUSTER_MODES = ("leader", "components", "complete")
+
+# similarity rows computed per step when building the threshold graph, bounds the (rows, n) block
+_SIM_BLOCK = 1024
+
+
+class TweetClusterEngine:
+    """Threshold clustering over tweet embeddings"""
+
+    @staticmethod
+    def cluster(embs, threshold: float, max_clusters: int, mode: str = "leader") -> List[np.ndarray]:
+        """Row indices of at most `max_clusters` clusters, largest first."""
+        if mode not in CLUSTER_MODES:
+            raise ValueError(f"Unsupported DNA_CLUSTER_MODE: {mode}")
+        if max_clusters <= 0 or len(embs) == 0:
+            return []
+
+        vectors = normalize_rows(embs)
+        if mode == "leader":
+            return TweetClusterEngine.leader(vectors, threshold, max_clusters)
+        if mode == "components":
+            labels = TweetClusterEngine.component_labels(vectors, threshold)
+        else:
+            labels = TweetClusterEngine.complete_linkage_labels(vectors, threshold)
+        return TweetClusterEngine._largest(labels, max_clusters)
+
+    @staticmethod
+    def leader(vectors: np.ndarray, threshold: float, max_clusters: int) -> List[np.ndarray]:
+        """Greedy leader clustering, stopping after `max_clusters` leaders."""
+        unassigned = np.ones(len(vectors), dtype=bool)
+        groups = []
+        leader = 0
+        while len(groups) < max_clusters:
+            # every earlier tweet is already assigned, so the mask only admits later ones
+            members = unassigned & (vectors @ vectors[leader] >= threshold)
+            members[leader] = True
+            groups.append(np.flatnonzero(members))
+            unassigned &= ~members
+            if not unassigned.any():
+                break
+            leader = int(np.argmax(unassigned))
+
+        # stable: equal sizes keep leader order
+        return sorted(groups, key=len, reverse=True)
+
+    @staticmethod
+    def component_labels(vectors: np.ndarray, threshold: float) -> np.ndarray:
+        """Connected-component label per row of the graph linking pairs within `threshold`."""
+        from scipy import sparse
+        from scipy.sparse.csgraph import connected_components
+
+        n = len(vectors)
+        rows, cols = [], []
+        for start in range(0, n, _SIM_BLOCK):
+            block = vectors[start:start + _SIM_BLOCK] @ vectors[start:].T
+            # upper triangle only: the graph is undirected
+            r, c = np.nonzero(np.triu(block >= threshold, k=1))
+            rows.append((r + start).astype(np.int32))
+            cols.append((c + start).astype(np.int32))
+
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        graph = sparse.csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(n, n))
+        _, labels = connected_components(graph, directed=False)
+        return labels
+
+    @staticmethod
+    def complete_linkage_labels(vectors: np.ndarray, threshold: float) -> np.ndarray:
+        """Complete-linkage cluster label per row; merged clusters stay within `threshold` pairwise."""
+        if len(vectors) < 2:
+            return np.zeros(len(vectors), dtype=np.int64)
+
+        from sklearn.cluster import AgglomerativeClustering
+
+        # scikit-learn merges below the distance threshold; nudge it so similarity == threshold still merges
+        distance = np.nextafter(1.0 - threshold, np.inf)
+        # precomputed: empty tweets embed to zero rows, which metric="cosine" rejects
+        distances = np.clip(1.0 - vectors @ vectors.T, 0.0, None)
+        np.fill_diagonal(distances, 0.0)
+        model = AgglomerativeClustering(
+            n_clusters=None, metric="precomputed", linkage="complete", distance_threshold=distance
+        )
+        return model.fit_predict(distances)
+
+    @staticmethod
+    def _largest(labels: np.ndarray, max_clusters: int) -> List[np.ndarray]:
+        order = np.argsort(labels, kind="stable")
+        cuts = np.flatnonzero(np.diff(labels[order])) + 1
+        groups = np.split(order, cuts)
+        groups.sort(key=lambda group: (-len(group), group[0]))
+        return groups[:max_clusters]
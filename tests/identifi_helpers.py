@@ -0,0 +1,63 @@
+"""
+Shared stand-ins for the identifi tests: a deterministic MiniLM encoder and
+variants of the example v2 payload.
+"""
+
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import orjson
+
+ROOT = Path(__file__).resolve().parent.parent
+DIM = 32
+
+
+class HashedEncoder:
+    """Deterministic stand-in for the MiniLM embedder that records overlapping calls."""
+
+    def __init__(self, delay: float = 0.002):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _track(self, step: int) -> None:
+        with self._lock:
+            self.active += step
+            self.peak = max(self.peak, self.active)
+
+    def encode(self, sentences, normalize_embeddings=False, **kwargs):
+        self._track(1)
+        try:
+            time.sleep(self.delay)
+            embs = np.zeros((len(sentences), DIM), dtype=np.float32)
+            for row, text in enumerate(sentences):
+                for word in text.lower().split():
+                    embs[row] += np.random.default_rng(sum(map(ord, word))).standard_normal(DIM)
+            embs += 0.01
+            if normalize_embeddings:
+                embs /= np.linalg.norm(embs, axis=1, keepdims=True)
+            return embs
+        finally:
+            self._track(-1)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return DIM
+
+
+def payloads(count: int) -> list:
+    """Variants of the example payload: rotated, trimmed timelines under distinct usernames."""
+    doc = orjson.loads((ROOT / "assets/example/payload/identifi.json").read_bytes())
+    # the example predates postedAt/quotes on Tweets
+    tweets = [
+        {"postedAt": tweet["timeParsed"], "quotes": 0, **tweet}
+        for tweet in doc["tweets"]
+    ]
+    variants = []
+    for i in range(count):
+        shift = (7 * i) % len(tweets)
+        rotated = tweets[shift:] + tweets[:shift]
+        variants.append({**doc, "username": f"{doc['username']}_{i}", "tweets": rotated[: 40 + (i * 13) % 60]})
+    return variants
@@ -0,0 +1,76 @@
+"""
+Label ANN index: searches share the caller's label matrix, and a saved
+layout that is corrupt or does not fit the catalog is a miss.
+"""
+
+import numpy as np
+import pytest
+
+from utils.ann_index import ExactIndex, IVFIndex, build_index, load_index, save_index
+
+DIM = 16
+
+
+def labels(n: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_indexes_keep_no_copy_of_the_labels():
+    matrix = labels(2000)
+    exact = build_index(matrix, kind="exact")
+    ivf = IVFIndex.build(matrix, nlist=20, nprobe=20)
+
+    assert not any(isinstance(value, np.ndarray) and value.shape == matrix.shape for value in vars(ivf).values())
+    query = matrix[:5].mean(axis=0)
+    top_exact, sims_exact = exact.search(query, 10, matrix)
+    # probing every list is exact
+    top_ivf, sims_ivf = ivf.search(query, 10, matrix)
+    np.testing.assert_array_equal(top_ivf, top_exact)
+    np.testing.assert_allclose(sims_ivf, sims_exact, rtol=1e-6)
+
+
+def test_saved_layout_round_trip(tmp_path):
+    matrix = labels(500)
+    index = IVFIndex.build(matrix, nlist=10)
+    save_index(index, tmp_path / "ann.npz")
+
+    loaded = load_index(tmp_path / "ann.npz", matrix)
+    np.testing.assert_array_equal(loaded.ids, index.ids)
+    assert load_index(tmp_path / "ann.npz", labels(400)) is None
+    assert load_index(tmp_path / "missing.npz", matrix) is None
+
+
+@pytest.mark.parametrize("damage", ["truncate", "garbage", "order"])
+def test_corrupt_layout_is_a_miss(tmp_path, damage):
+    matrix = labels(500)
+    path = tmp_path / "ann.npz"
+    index = IVFIndex.build(matrix, nlist=10)
+    if damage == "order":
+        index.ids = index.ids.copy()
+        index.ids[0] = index.ids[1]
+    save_index(index, path)
+    if damage == "truncate":
+        path.write_bytes(path.read_bytes()[:200])
+    elif damage == "garbage":
+        path.write_bytes(b"PK\x03\x04" + b"\0" * 64)
+
+    assert load_index(path, matrix) is None
+
+
+def test_exact_index_below_min_labels():
+    assert isinstance(build_index(labels(100), kind="ivf", min_labels=1000), ExactIndex)
+
+
+def test_exact_by_default_even_with_a_saved_layout(tmp_path, monkeypatch):
+    from services import dna_service
+    from services.dna_service import DNAService
+
+    matrix = labels(500)
+    assert isinstance(build_index(matrix, min_labels=10), ExactIndex)
+
+    save_index(IVFIndex.build(matrix, nlist=10), tmp_path / "ann.npz")
+    monkeypatch.setattr(dna_service, "DNA_ANN_KIND", "exact")
+    assert isinstance(DNAService._build_shortlist_index(matrix, tmp_path / "ann.npz"), ExactIndex)
+    monkeypatch.setattr(dna_service, "DNA_ANN_KIND", "ivf")
+    assert isinstance(DNAService._build_shortlist_index(matrix, tmp_path / "ann.npz"), IVFIndex)
@@ -0,0 +1,181 @@
+"""
+Badge cache store: disk reads and writes stay off the event loop, and the
+content-addressed store is swept back under BADGE_CACHE_DIR_MAX_MB.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+from utils import badge_cache as badge_cache_module
+from utils.badge_cache import BadgeCache, _ContentStore
+
+
+def badge(seed: int, size: int = 1000) -> dict:
+    data = hashlib.sha256(str(seed).encode()).digest() * (size // 32)
+    digest = hashlib.sha256(data).hexdigest()
+    return {
+        "background_hex": "#000000",
+        "image_format": "png",
+        "sizes": ["256"],
+        "images": {"256": data},
+        "digests": {"256": digest},
+    }
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # a fresh cache over tmp_path instead of the process-wide singleton
+    monkeypatch.setattr(BadgeCache, "_instance", None)
+    monkeypatch.setattr(BadgeCache, "_initialized", False)
+    monkeypatch.setattr(badge_cache_module, "BADGE_CACHE_DIR", str(tmp_path))
+    return BadgeCache()
+
+
+def test_store_io_runs_off_the_event_loop(cache, monkeypatch):
+    threads = []
+    for name in ("get_manifest", "put_manifest"):
+        original = getattr(_ContentStore, name)
+        monkeypatch.setattr(_ContentStore, name, lambda self, *args, original=original, name=name: (
+            threads.append((name, threading.current_thread() is threading.main_thread())), original(self, *args)
+        )[1])
+
+    async def generate():
+        return badge(1)
+
+    async def scenario():
+        generated = await cache.get_or_generate("Defi Degen", generate)
+        cache.clear()
+        from_disk = await cache.get_or_generate("defi  degen", generate)
+        return generated, from_disk
+
+    (_, first), (loaded, second) = asyncio.run(scenario())
+    assert (first, second) == ("generated", "disk")
+    assert loaded["images"] == badge(1)["images"]
+    assert threads and not any(on_loop for _, on_loop in threads)
+
+
+def test_sweep_keeps_recent_badges_under_the_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(badge_cache_module, "_SWEEP_GRACE_SECONDS", 0)
+    store = _ContentStore(str(tmp_path), max_bytes=10_000)
+    now = time.time()
+    for i in range(20):
+        item = badge(i)
+        store.put_object(item["images"]["256"], item["digests"]["256"])
+        store.put_manifest(f"k{i}", {"objects": item["digests"]})
+        os.utime(store.refs / f"k{i}.json", (now - 100 + i, now - 100 + i))
+        store.maybe_sweep()
+
+    usage = sum(path.stat().st_size for path in store.objects.glob("*/*"))
+    assert usage <= 10_000
+    kept = sorted(int(path.stem[1:]) for path in store.refs.glob("*.json"))
+    assert kept == list(range(20 - len(kept), 20)) and len(kept) >= 8
+    # every kept manifest still resolves
+    for i in kept:
+        assert store.get_object(badge(i)["digests"]["256"]) is not None
+
+
+def test_sweep_keeps_objects_still_referenced(tmp_path, monkeypatch):
+    monkeypatch.setattr(badge_cache_module, "_SWEEP_GRACE_SECONDS", 0)
+    store = _ContentStore(str(tmp_path), max_bytes=2_500)
+    shared = badge(0)
+    store.put_object(shared["images"]["256"], shared["digests"]["256"])
+    for i, key in enumerate(("old", "new")):
+        store.put_manifest(key, {"objects": shared["digests"]})
+        os.utime(store.refs / f"{key}.json", (time.time() - 10 + i,) * 2)
+    for i in (1, 2):
+        item = badge(i)
+        store.put_object(item["images"]["256"], item["digests"]["256"])
+
+    # orphans go first; the shared object survives dropping only one of its manifests
+    store.maybe_sweep()
+    assert store.get_object(shared["digests"]["256"]) is not None
+    assert (store.refs / "new.json").exists()
+
+
+def test_cancelled_first_caller_leaves_generation_to_the_others(cache):
+    calls = []
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def generate():
+            calls.append(1)
+            await gate.wait()
+            return badge(2)
+
+        first = asyncio.ensure_future(cache.get_or_generate("shared", generate))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(cache.get_or_generate("shared", generate))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        gate.set()
+        return await second, first.cancelled()
+
+    (result, source), first_cancelled = asyncio.run(scenario())
+    assert first_cancelled and source == "joined"
+    assert result["digests"] == badge(2)["digests"]
+    assert len(calls) == 1
+
+
+def test_generation_is_cancelled_once_no_caller_is_left(cache):
+    async def scenario():
+        started, cancelled = asyncio.Event(), asyncio.Event()
+
+        async def generate():
+            started.set()
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiter = asyncio.ensure_future(cache.get_or_generate("abandoned", generate))
+        await started.wait()
+        waiter.cancel()
+        await asyncio.wait_for(cancelled.wait(), 5)
+        assert not cache._inflight
+
+        async def again():
+            return badge(3)
+
+        return await cache.get_or_generate("abandoned", again)
+
+    _, source = asyncio.run(scenario())
+    assert source == "generated"
+
+
+def test_closed_batch_stream_does_not_fail_other_requests(cache, monkeypatch):
+    from services import dna_service
+    from services.dna_service import DNAService
+
+    monkeypatch.setattr(dna_service, "badge_cache", cache)
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def render(payload, limiter=None, client=None):
+            await gate.wait()
+            return badge(len(payload.title))
+
+        monkeypatch.setattr(DNAService, "_render_dna_image", staticmethod(render))
+        # the first request starts the generation, then its client disconnects mid-stream
+        closing = DNAService.generate_dna_images_batch(["Shared title", "Other"], 4)
+        pending = asyncio.ensure_future(closing.__anext__())
+        await asyncio.sleep(0.01)
+        single = asyncio.ensure_future(DNAService.generate_dna_images_batch(["Shared title"], 4).__anext__())
+        await asyncio.sleep(0.01)
+        pending.cancel()
+        await asyncio.sleep(0.01)
+        await closing.aclose()
+
+        gate.set()
+        return await single
+
+    result = asyncio.run(scenario())
+    assert "error" not in result and result["source"] == "joined"
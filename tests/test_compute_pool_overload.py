@@ -0,0 +1,83 @@
+"""
+A full compute pool is load shedding: the pool rejects the job with
+ComputePoolFullError and controllers answer 503 with Retry-After instead
+of a 500 INTERNAL_ERROR.
+"""
+
+import asyncio
+import threading
+import types
+
+import orjson
+import pytest
+
+from controllers.identifi_controller import IdentifiController
+from services.identifi_service import IdentifiScore
+from utils.compute_pool import ComputePool, ComputePoolFullError
+
+
+class _App:
+    """Just enough of Robyn to register routes."""
+
+    def post(self, *args, **kwargs):
+        return lambda handler: handler
+
+    get = post
+
+
+def test_pool_rejects_beyond_max_pending(monkeypatch):
+    pool = ComputePool()
+    monkeypatch.setattr(pool, "kind", "thread")
+    monkeypatch.setattr(pool, "max_pending", 1)
+    release = threading.Event()
+
+    async def scenario():
+        first = asyncio.ensure_future(pool.run("test.block", release.wait, 5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(ComputePoolFullError) as excinfo:
+            await pool.run("test.rejected", lambda: None)
+        release.set()
+        await first
+        return excinfo.value
+
+    error = asyncio.run(scenario())
+    assert error.retry_after >= 1
+    assert pool.stats()["pending"] == 0
+
+
+def test_controller_maps_pool_full_to_503(monkeypatch):
+    async def full(payload):
+        raise ComputePoolFullError("compute pool full (64 pending)", retry_after=3)
+
+    monkeypatch.setattr(IdentifiScore, "calculate_identifi_v2", staticmethod(full))
+    # validation must pass to reach the pool
+    monkeypatch.setattr(
+        "controllers.identifi_controller.RequestIdentifiScoreV2", lambda **kwargs: types.SimpleNamespace(**kwargs)
+    )
+
+    controller = IdentifiController(_App())
+    response = asyncio.run(controller.get_identifi_score_v2(None, orjson.dumps({"username": "u"})))
+
+    assert response.status_code == 503
+    assert response.headers.get("Retry-After") == "3"
+    assert orjson.loads(response.description)["error_code"] == "OVERLOADED"
+
+
+def test_local_jobs_never_reach_the_process_pool(monkeypatch):
+    monkeypatch.setattr(ComputePool, "_instance", None)
+    monkeypatch.setattr(ComputePool, "_initialized", False)
+    pool = ComputePool()
+    monkeypatch.setattr(pool, "kind", "process")
+    # a lock cannot be pickled; a process pool job would fail on it
+    shared = threading.Lock()
+
+    async def scenario():
+        return await pool.run_local("test.local", lambda lock: (lock, threading.current_thread()), shared)
+
+    try:
+        lock, thread = asyncio.run(scenario())
+        assert pool._executor is None
+    finally:
+        pool.shutdown()
+    assert lock is shared and thread is not threading.main_thread()
+    assert pool.stats()["stages"]["test.local"]["calls"] == 1
@@ -0,0 +1,169 @@
+"""
+DNA catalog store: bounded registry on disk, bounded catalogs, and label
+embeddings held as label index rows instead of one matrix per catalog.
+"""
+
+import asyncio
+import os
+import time
+
+import numpy as np
+import orjson
+import pytest
+
+from controllers.dna_controller import DNAController
+from services import dna_embedding_service, dna_service
+from services.dna_embedding_service import DNAEmbeddingContext
+from services.dna_service import DNAService
+from utils import dna_catalog as dna_catalog_module
+from utils import label_index as label_index_module
+from utils.compute_pool import compute_pool
+from utils.dna_catalog import DNACatalogStore
+from utils.label_index import LabelEmbeddingIndex
+
+DIM = 8
+
+
+class _App:
+    """Just enough of Robyn to register routes."""
+
+    def post(self, *args, **kwargs):
+        return lambda handler: handler
+
+    get = post
+
+
+class TitleEncoder:
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, titles, normalize_embeddings=False, **kwargs):
+        self.calls += 1
+        vectors = np.stack([
+            np.random.default_rng(sum(map(ord, title))).standard_normal(DIM) for title in titles
+        ]).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(dna_catalog_module, "DNA_CATALOG_DIR", str(tmp_path))
+    monkeypatch.setattr(dna_catalog_module, "DNA_CATALOG_DIR_MAX_FILES", 3)
+    monkeypatch.setattr(DNACatalogStore, "_instance", None)
+    monkeypatch.setattr(DNACatalogStore, "_initialized", False)
+    return DNACatalogStore()
+
+
+@pytest.fixture
+def index(monkeypatch):
+    monkeypatch.setattr(label_index_module, "LABEL_INDEX_DIR", "")
+    monkeypatch.setattr(label_index_module, "LABEL_INDEX_MAX_ROWS", 12)
+    monkeypatch.setattr(LabelEmbeddingIndex, "_instance", None)
+    monkeypatch.setattr(LabelEmbeddingIndex, "_initialized", False)
+    fresh = LabelEmbeddingIndex()
+    monkeypatch.setattr(dna_service, "label_index", fresh)
+    monkeypatch.setattr(compute_pool, "kind", "inline")
+    return fresh
+
+
+def catalog_lists(n: int, tag: str = ""):
+    return [f"uid{tag}{i}" for i in range(n)], [f"title {tag}{i}" for i in range(n)]
+
+
+def test_directory_keeps_the_most_recently_used_catalogs(store, tmp_path):
+    versions = []
+    for i in range(3):
+        catalog, _ = store.register(*catalog_lists(2, tag=str(i)))
+        (tmp_path / f"{catalog.version}.ann.npz").write_bytes(b"index")
+        os.utime(tmp_path / f"{catalog.version}.json", (time.time() - 100 + i, time.time() - 100 + i))
+        versions.append(catalog.version)
+    # the oldest one is read again by another process
+    os.utime(tmp_path / f"{versions[0]}.json")
+
+    store.register(*catalog_lists(2, tag="new"))
+
+    names = {path.name for path in tmp_path.iterdir()}
+    assert f"{versions[1]}.json" not in names and f"{versions[1]}.ann.npz" not in names
+    assert {f"{versions[0]}.json", f"{versions[2]}.json", f"{versions[0]}.ann.npz"} <= names
+    assert len([name for name in names if name.endswith(".json")]) == 3
+
+
+def test_catalog_size_is_bounded(store, monkeypatch):
+    monkeypatch.setattr(dna_catalog_module, "DNA_CATALOG_MAX_LABELS", 5)
+    with pytest.raises(ValueError, match="at most 5"):
+        store.register(*catalog_lists(6))
+
+    monkeypatch.setattr("controllers.dna_controller.DNA_CATALOG_MAX_BYTES", 64)
+    body = orjson.dumps(dict(zip(("unique_id", "title"), catalog_lists(5))))
+    response = asyncio.run(DNAController(_App()).register_dna_catalog(type("R", (), {"body": body}), None))
+    assert response.status_code == 400
+
+
+def test_catalogs_share_label_index_rows(store, index, monkeypatch):
+    encoder = TitleEncoder()
+    monkeypatch.setattr(dna_service, "embedder", encoder)
+    first, _ = store.register(*catalog_lists(6))
+    second, _ = store.register(*catalog_lists(4))
+
+    async def scenario():
+        a = await DNAService._catalog_label_embeddings(first)
+        b = await DNAService._catalog_label_embeddings(first)
+        c = await DNAService._catalog_label_embeddings(second)
+        return a, b, c
+
+    a, b, c = asyncio.run(scenario())
+    # concurrent users of a catalog share one matrix; the catalog itself keeps only rows
+    assert a is b and not a.flags.writeable
+    np.testing.assert_array_equal(c, a[:4])
+    assert len(first.peek("label_rows")) == 6 and first.peek("label_embeddings") is None
+    # the second catalog's titles were already in the index
+    assert encoder.calls == 1 and index.stats()["namespaces"][dna_service.EMBEDDING_NAMESPACE]["rows"] == 6
+
+
+def test_rows_are_resolved_again_after_an_index_reset(store, index, monkeypatch):
+    monkeypatch.setattr(dna_service, "embedder", TitleEncoder())
+    catalog, _ = store.register(*catalog_lists(6))
+    expected = asyncio.run(DNAService._catalog_label_embeddings(catalog)).copy()
+    stale = catalog.peek("label_rows")
+
+    # another catalog overflows the 12-row index, which starts over
+    other, _ = store.register(*catalog_lists(10, tag="x"))
+    asyncio.run(DNAService._catalog_label_embeddings(other))
+
+    np.testing.assert_array_equal(asyncio.run(DNAService._catalog_label_embeddings(catalog)), expected)
+    assert catalog.peek("label_rows") is not stale
+
+
+def test_derived_build_survives_a_cancelled_first_caller(store):
+    catalog, _ = store.register(*catalog_lists(2))
+    builds = []
+
+    async def build():
+        builds.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def scenario():
+        first = asyncio.ensure_future(catalog.derived_async("thing", build))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(catalog.derived_async("thing", build))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == "value"
+    assert builds == [1] and catalog.peek("thing") == "value"
+
+
+def test_context_shares_the_label_matrix(store, index, monkeypatch):
+    encoder = TitleEncoder()
+    monkeypatch.setattr(dna_service, "embedder", encoder)
+    monkeypatch.setattr(dna_embedding_service, "embedder", encoder)
+    catalog, _ = store.register(*catalog_lists(6))
+    label_embeddings = asyncio.run(DNAService._catalog_label_embeddings(catalog))
+
+    ctx = DNAEmbeddingContext([], list(catalog.titles), label_embeddings)
+    assert ctx.label_matrix is label_embeddings
+    # catalog titles reuse their label rows, other texts go through the module's embedder
+    np.testing.assert_array_equal(ctx.text_matrix(["title 2", "new title"]),
+                                  np.stack([label_embeddings[2], encoder.encode(["new title"])[0]]))
@@ -0,0 +1,127 @@
+"""
+Badge responses: ?mode=binary returns raw bytes with the background hex and
+an ETag, and the asset endpoint answers conditional GETs with 304.
+"""
+
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+from controllers.dna_controller import ASSET_CACHE_CONTROL, DNAController
+from services.dna_service import DNAService
+from utils.badge_cache import badge_cache
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"main"
+THUMB = b"RIFF\0\0\0\0WEBP" + b"thumb"
+DIGESTS = {"1024": hashlib.sha256(PNG).hexdigest(), "256": hashlib.sha256(THUMB).hexdigest()}
+BADGE = {
+    "background_hex": "#14a096",
+    "image_format": "png",
+    "sizes": ["1024", "256"],
+    "images": {"1024": PNG, "256": THUMB},
+    "digests": DIGESTS,
+}
+
+
+class _App:
+    """Just enough of Robyn to register routes."""
+
+    def post(self, *args, **kwargs):
+        return lambda handler: handler
+
+    get = post
+
+
+def request(query=None, headers=None, handle=None, body=b'{"title": "Data Privacy"}'):
+    return SimpleNamespace(
+        query_params=dict(query or {}),
+        headers={name.lower(): value for name, value in (headers or {}).items()},
+        path_params={"handle": handle},
+        body=body,
+    )
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    async def generate(payload, client=None):
+        return BADGE
+
+    async def get_asset(handle):
+        return {digest: BADGE["images"][size] for size, digest in DIGESTS.items()}.get(handle)
+
+    monkeypatch.setattr(DNAService, "generate_dna_image", staticmethod(generate))
+    monkeypatch.setattr(badge_cache, "get_asset_async", get_asset)
+    return DNAController(_App())
+
+
+def test_binary_mode_headers(controller):
+    response = asyncio.run(controller.generate_dna_image(request({"mode": "binary"}), None))
+
+    assert response.status_code == 200
+    assert response.description == PNG
+    assert response.headers.get("Content-Type") == "image/png"
+    assert response.headers.get("X-Background-Hex") == "#14a096"
+    assert response.headers.get("ETag") == f'"{DIGESTS["1024"]}"'
+    assert response.headers.get("X-Image-Handle") == DIGESTS["1024"]
+
+    thumb = asyncio.run(controller.generate_dna_image(request({"mode": "binary", "size": "256"}), None))
+    assert thumb.description == THUMB and thumb.headers.get("Content-Type") == "image/webp"
+
+
+def test_binary_mode_rejects_a_bad_size_and_mode(controller):
+    response = asyncio.run(controller.generate_dna_image(request({"mode": "binary", "size": "64"}), None))
+    assert response.status_code == 400
+    assert orjson.loads(response.description)["error_code"] == "BAD_REQUEST"
+
+    assert asyncio.run(controller.generate_dna_image(request({"mode": "xml"}), None)).status_code == 400
+
+
+def test_asset_is_served_with_an_immutable_etag(controller):
+    response = asyncio.run(controller.get_dna_image_asset(request(handle=DIGESTS["1024"])))
+
+    assert response.status_code == 200 and response.description == PNG
+    assert response.headers.get("ETag") == f'"{DIGESTS["1024"]}"'
+    assert response.headers.get("Cache-Control") == ASSET_CACHE_CONTROL
+
+
+@pytest.mark.parametrize("if_none_match", [
+    '"{digest}"',
+    '"other", "{digest}"',
+    '"other",  "{digest}" ',
+    "*",
+])
+def test_asset_matching_if_none_match_is_304(controller, if_none_match):
+    handle = DIGESTS["256"]
+    response = asyncio.run(controller.get_dna_image_asset(
+        request(handle=handle, headers={"If-None-Match": if_none_match.format(digest=handle)})
+    ))
+
+    assert response.status_code == 304
+    assert response.headers.get("ETag") == f'"{handle}"'
+    assert not response.description
+
+
+def test_asset_other_etag_is_200(controller):
+    handle = DIGESTS["256"]
+    response = asyncio.run(controller.get_dna_image_asset(
+        request(handle=handle, headers={"If-None-Match": f'"{DIGESTS["1024"]}"'})
+    ))
+    assert response.status_code == 200 and response.description == THUMB
+
+
+def test_binary_mode_honours_if_none_match(controller):
+    response = asyncio.run(controller.generate_dna_image(
+        request({"mode": "binary"}, headers={"If-None-Match": f'"{DIGESTS["1024"]}"'}), None
+    ))
+    assert response.status_code == 304
+    assert response.headers.get("X-Background-Hex") == "#14a096"
+
+
+def test_unknown_asset_is_404(controller):
+    response = asyncio.run(controller.get_dna_image_asset(request(handle="0" * 64)))
+
+    assert response.status_code == 404
+    assert orjson.loads(response.description)["error_code"] == "NOT_FOUND"
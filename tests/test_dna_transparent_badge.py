@@ -0,0 +1,104 @@
+"""
+Transparent badge path: an RGBA image from the images API keeps its own
+alpha and skips rembg; an opaque one falls back to batched rembg. Runs
+offline against a stubbed images client.
+"""
+
+import asyncio
+import base64
+from collections import Counter
+from io import BytesIO
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from models.requests.dna_request import RequestDigitalDNAImage
+from services import dna_service
+from services.dna_service import DNAService
+from utils.rembg_pool import rembg_pool
+
+FALLBACK = {"background_hex": "#000000", "image_format": "png", "sizes": [], "images": {}, "digests": {}}
+
+
+def png_b64(transparent_border: bool) -> str:
+    pixels = np.zeros((64, 64, 4), dtype=np.uint8)
+    pixels[..., :3] = (40, 160, 220)
+    pixels[..., 3] = 0 if transparent_border else 255
+    pixels[16:48, 16:48, 3] = 255
+    buffer = BytesIO()
+    Image.fromarray(pixels, "RGBA").save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+class StubClient:
+    """Just enough of AsyncOpenAI: a chat rewrite and an images.generate returning `image_b64`."""
+
+    def __init__(self, image_b64: str):
+        self.image_b64 = image_b64
+        self.image_kwargs = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._rewrite))
+        self.images = SimpleNamespace(generate=self._generate)
+
+    async def _rewrite(self, **kwargs):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="glowing prism"))])
+
+    async def _generate(self, **kwargs):
+        self.image_kwargs.append(kwargs)
+        return SimpleNamespace(data=[SimpleNamespace(b64_json=self.image_b64)])
+
+
+@pytest.fixture
+def batched(monkeypatch):
+    calls = []
+
+    async def run(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    async def run_batched(fn_batch, item):
+        calls.append(item)
+        return FALLBACK
+
+    monkeypatch.setattr(rembg_pool, "run", run)
+    monkeypatch.setattr(rembg_pool, "run_batched", run_batched)
+    monkeypatch.setattr(
+        dna_service, "_IMAGE_BACKGROUND_STATS", Counter({"rembg": 0, "transparent": 0, "transparent_fallback": 0})
+    )
+    return calls
+
+
+def render(client: StubClient) -> dict:
+    return asyncio.run(DNAService._render_dna_image(RequestDigitalDNAImage(title="Data Privacy"), client=client))
+
+
+def test_transparent_image_skips_rembg(monkeypatch, batched):
+    monkeypatch.setattr(dna_service, "DNA_IMAGE_BACKGROUND", "transparent")
+    client = StubClient(png_b64(transparent_border=True))
+
+    badge = render(client)
+
+    assert batched == []
+    assert DNAService.image_background_stats()["transparent"] == 1
+    assert badge["background_hex"] == "#28a0dc"
+    assert client.image_kwargs[0]["background"] == "transparent"
+    assert client.image_kwargs[0]["output_format"] == "png"
+
+
+def test_opaque_image_falls_back_to_batched_rembg(monkeypatch, batched):
+    monkeypatch.setattr(dna_service, "DNA_IMAGE_BACKGROUND", "transparent")
+    image_b64 = png_b64(transparent_border=False)
+
+    assert render(StubClient(image_b64)) is FALLBACK
+    assert batched == [image_b64]
+    assert DNAService.image_background_stats()["transparent_fallback"] == 1
+
+
+def test_rembg_mode_asks_for_the_default_background(monkeypatch, batched):
+    monkeypatch.setattr(dna_service, "DNA_IMAGE_BACKGROUND", "rembg")
+    client = StubClient(png_b64(transparent_border=True))
+
+    assert render(client) is FALLBACK
+    assert len(batched) == 1
+    assert "background" not in client.image_kwargs[0] and "output_format" not in client.image_kwargs[0]
+    assert DNAService.image_background_stats()["rembg"] == 1
@@ -0,0 +1,94 @@
+"""
+EmbeddingBatcher dispatcher liveness: a forked child gets a working
+dispatcher, a dispatcher that dies fails its callers instead of leaving
+them waiting, and cancelled callers do not take it down.
+"""
+
+import multiprocessing
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from services.embedding_service import EmbeddingBatcher
+
+ROOT = Path(__file__).resolve().parent.parent
+DIM = 4
+
+
+class FakeModel:
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+
+    def encode(self, sentences, **kwargs):
+        self.release.wait(5)
+        return np.array([[len(text)] * DIM for text in sentences], dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return DIM
+
+
+FORKED = """
+import multiprocessing
+import sys
+
+sys.path[:0] = [{root!r}, {tests!r}]
+from services.embedding_service import EmbeddingBatcher
+from test_embedding_batcher import FakeModel
+
+
+def encode_in_child(batcher):
+    vectors = batcher.submit(["forked"]).result(timeout=5)
+    raise SystemExit(0 if vectors[0][0] == 6 else 1)
+
+
+batcher = EmbeddingBatcher(FakeModel(), max_wait_ms=0)
+batcher.encode(["parent"])
+child = multiprocessing.get_context("fork").Process(target=encode_in_child, args=(batcher,))
+child.start()
+child.join(10)
+assert child.exitcode == 0, child.exitcode
+assert batcher.encode(["parent again"])[0][0] == 12
+"""
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_forked_child_starts_its_own_dispatcher():
+    # fork from a fresh interpreter: forking the test process itself can leave
+    # thread pools of libraries loaded by other tests hung at exit
+    script = FORKED.format(root=str(ROOT), tests=str(ROOT / "tests"))
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+
+
+def test_dead_dispatcher_fails_callers_and_restarts(monkeypatch):
+    batcher = EmbeddingBatcher(FakeModel(), max_wait_ms=0)
+
+    def crash(group, normalize):
+        raise KeyError("boom")
+
+    monkeypatch.setattr(batcher, "_encode_group", crash)
+    with pytest.raises(RuntimeError, match="dispatcher stopped"):
+        batcher.submit(["lost"]).result(timeout=5)
+
+    monkeypatch.undo()
+    assert batcher.submit(["found"]).result(timeout=5)[0][0] == 5
+
+
+def test_cancelled_request_does_not_stop_dispatcher():
+    model = FakeModel()
+    batcher = EmbeddingBatcher(model, max_wait_ms=0)
+    model.release.clear()
+
+    busy = batcher.submit(["busy"])
+    cancelled = batcher.submit(["cancelled"])
+    assert cancelled.cancel()
+    model.release.set()
+
+    assert busy.result(timeout=5)[0][0] == 4
+    assert batcher.submit(["still up"]).result(timeout=5)[0][0] == 8
@@ -0,0 +1,121 @@
+"""
+Feature cache disk tier: bounded entries, reload across restarts, shape
+validation and flushes that write outside the cache lock.
+"""
+
+import threading
+
+import numpy as np
+
+from utils.feature_cache import _DiskTier
+
+DIM = 8
+
+
+def embedding(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal(DIM).astype(np.float16)
+
+
+def fill(tier: _DiskTier, count: int, start: int = 0) -> None:
+    for i in range(start, start + count):
+        tier.put(f"t{i}", {"readability": float(i), "embedding": embedding(i)})
+        if i % 3 == 0:
+            # scalar-only entries are bounded too
+            tier.put(f"s{i}", {"lang": "en"})
+
+
+def test_entries_and_rows_are_bounded(tmp_path):
+    tier = _DiskTier(str(tmp_path), rows=50)
+    fill(tier, 500)
+
+    assert len(tier.entries) == 50
+    rows = [entry["row"] for entry in tier.entries.values() if "row" in entry]
+    assert len(rows) == len(set(rows)) and max(rows) < 50
+    # the most recent entries survive, with their own embeddings
+    np.testing.assert_array_equal(tier.get("t499")["embedding"], embedding(499))
+    assert tier.get("t0") is None
+
+
+def test_reload_after_flush(tmp_path):
+    lock = threading.Lock()
+    tier = _DiskTier(str(tmp_path), rows=64)
+    fill(tier, 40)
+    tier.flush(lock)
+    fill(tier, 60, start=40)
+    tier.flush(lock)
+
+    reloaded = _DiskTier(str(tmp_path), rows=64)
+    assert list(reloaded.entries) == list(tier.entries)
+    for key in ("t99", "t70"):
+        np.testing.assert_array_equal(reloaded.get(key)["embedding"], tier.get(key)["embedding"])
+    assert reloaded.get("t99")["readability"] == 99.0
+
+    # new rows after a reload never reuse a live row
+    fill(reloaded, 30, start=100)
+    rows = [entry["row"] for entry in reloaded.entries.values() if "row" in entry]
+    assert len(rows) == len(set(rows))
+
+
+def test_torn_log_tail_is_ignored(tmp_path):
+    tier = _DiskTier(str(tmp_path), rows=64)
+    fill(tier, 10)
+    tier.flush(threading.Lock())
+    with open(tier.index_path, "ab") as log:
+        log.write(b'["t99", {"readab')
+
+    reloaded = _DiskTier(str(tmp_path), rows=64)
+    assert reloaded.get("t9")["readability"] == 9.0
+    assert reloaded.get("t99") is None
+
+
+def test_row_count_change_starts_empty(tmp_path):
+    tier = _DiskTier(str(tmp_path), rows=64)
+    fill(tier, 10)
+    tier.flush(threading.Lock())
+
+    resized = _DiskTier(str(tmp_path), rows=128)
+    assert len(resized.entries) == 0
+    resized.put("x", {"embedding": embedding(1)})
+    assert resized.matrix.shape == (128, DIM)
+
+
+def test_rejected_index_is_rewritten_on_the_first_flush(tmp_path):
+    lock = threading.Lock()
+    tier = _DiskTier(str(tmp_path), rows=64)
+    fill(tier, 10)
+    tier.flush(lock)
+    # embeddings file that no longer matches the index
+    tier.matrix_path.write_bytes(b"\0" * 16)
+
+    rejected = _DiskTier(str(tmp_path), rows=64)
+    assert len(rejected.entries) == 0
+    rejected.put("s1", {"lang": "en"})
+    rejected.flush(lock)
+
+    assert _DiskTier(str(tmp_path), rows=64).get("s1") == {"lang": "en"}
+    resized = _DiskTier(str(tmp_path), rows=128)
+    resized.put("s2", {"lang": "id"})
+    resized.flush(lock)
+    assert _DiskTier(str(tmp_path), rows=128).get("s2") == {"lang": "id"}
+
+
+def test_scalar_entries_without_an_index_get_a_header(tmp_path):
+    lock = threading.Lock()
+    tier = _DiskTier(str(tmp_path), rows=64)
+    tier.put("s1", {"lang": "en"})
+    tier.flush(lock)
+
+    assert _DiskTier(str(tmp_path), rows=64).get("s1") == {"lang": "en"}
+
+
+def test_flush_writes_outside_the_cache_lock(tmp_path, monkeypatch):
+    lock = threading.Lock()
+    tier = _DiskTier(str(tmp_path), rows=64)
+    fill(tier, 20)
+
+    held = []
+    rewrite = _DiskTier._rewrite
+    monkeypatch.setattr(_DiskTier, "_rewrite", lambda self, *args: (held.append(lock.locked()), rewrite(self, *args)))
+    tier.flush(lock)
+
+    assert held == [False]
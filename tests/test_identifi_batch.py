@@ -0,0 +1,67 @@
+"""
+Identifi v2 batch scoring in chunks: each chunk encodes its own users at
+once, results keep payload order and match scoring one chunk at a time.
+"""
+
+import asyncio
+
+import orjson
+import pytest
+
+from models.requests.identifi_request import RequestIdentifiScoreV2
+from services import identifi_service
+from services.identifi_service import IdentifiScore
+from utils.compute_pool import compute_pool
+from utils.feature_cache import feature_cache
+
+from tests.identifi_helpers import HashedEncoder, payloads
+
+
+class CountingEncoder(HashedEncoder):
+    def __init__(self):
+        super().__init__(delay=0)
+        self.calls = []
+
+    def encode(self, sentences, **kwargs):
+        self.calls.append(len(sentences))
+        return super().encode(sentences, **kwargs)
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    fake = CountingEncoder()
+    monkeypatch.setattr(identifi_service, "embedder", fake)
+    feature_cache.clear()
+    yield fake
+    feature_cache.clear()
+
+
+def requests(docs: list) -> list:
+    return [RequestIdentifiScoreV2(**doc) for doc in docs]
+
+
+def test_chunks_follow_the_tweet_budget(monkeypatch):
+    monkeypatch.setattr(identifi_service, "IDENTIFI_BATCH_CHUNK_TWEETS", 100)
+    batch = requests(payloads(8)) + [ValueError("invalid payload")]
+    chunks = IdentifiScore.batch_chunks(batch)
+
+    assert [p for chunk in chunks for p in chunk] == batch
+    for chunk in chunks:
+        tweets = [len(p.tweets) for p in chunk if not isinstance(p, Exception)]
+        assert len(chunk) == 1 or sum(tweets) <= 100
+
+
+def test_chunked_batch_matches_single_chunk(encoder, monkeypatch):
+    docs = payloads(8)
+    whole = IdentifiScore.score_identifi_v2_batch(requests(docs))
+    assert len(encoder.calls) == 1
+
+    feature_cache.clear()
+    encoder.calls.clear()
+    monkeypatch.setattr(identifi_service, "IDENTIFI_BATCH_CHUNK_TWEETS", 150)
+    monkeypatch.setattr(compute_pool, "kind", "inline")
+    chunked = asyncio.run(IdentifiScore.calculate_identifi_v2_batch(requests(docs)))
+
+    assert 1 < len(encoder.calls) < len(docs)
+    assert max(encoder.calls) <= max(150, max(len(doc["tweets"]) for doc in docs))
+    assert orjson.dumps(chunked, option=orjson.OPT_SORT_KEYS) == orjson.dumps(whole, option=orjson.OPT_SORT_KEYS)
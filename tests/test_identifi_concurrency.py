@@ -0,0 +1,89 @@
+"""
+Identifi v2 under concurrency: many scorings on shared threads give the
+same results as scoring one payload at a time, and the torch backend only
+serializes tokenization, not the forward pass.
+"""
+
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import orjson
+import pytest
+
+from models.requests.identifi_request import RequestIdentifiScoreV2
+from services import identifi_service
+from services.embedding_service import TorchEmbeddingBackend
+from services.identifi_service import IdentifiScore
+from utils.feature_cache import feature_cache
+
+from tests.identifi_helpers import DIM, HashedEncoder, payloads
+
+
+def score(doc: dict) -> bytes:
+    # scoring cleans tweet texts in place, so every call validates its own copy
+    return orjson.dumps(IdentifiScore.score_identifi_v2(RequestIdentifiScoreV2(**doc)), option=orjson.OPT_SORT_KEYS)
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    fake = HashedEncoder()
+    monkeypatch.setattr(identifi_service, "embedder", fake)
+    feature_cache.clear()
+    yield fake
+    feature_cache.clear()
+
+
+def test_concurrent_scoring_matches_serial(encoder):
+    docs = payloads(48)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        concurrent = list(pool.map(score, docs * 3))
+    assert encoder.peak > 1, "scorings never overlapped inside encode"
+
+    feature_cache.clear()
+    serial = [score(doc) for doc in docs]
+    assert concurrent == serial * 3
+
+
+class _FakeSentenceTransformer:
+    """Records how many tokenize and forward calls overlap."""
+
+    def __init__(self, model_name, device=None):
+        self.lock = threading.Lock()
+        self.active = {"tokenize": 0, "forward": 0}
+        self.peak = {"tokenize": 0, "forward": 0}
+
+    def _enter(self, stage: str, step: int) -> None:
+        with self.lock:
+            self.active[stage] += step
+            self.peak[stage] = max(self.peak[stage], self.active[stage])
+
+    def tokenize(self, texts):
+        self._enter("tokenize", 1)
+        time.sleep(0.002)
+        self._enter("tokenize", -1)
+        return texts
+
+    def encode(self, sentences, **kwargs):
+        features = self.tokenize(sentences)
+        self._enter("forward", 1)
+        time.sleep(0.01)
+        self._enter("forward", -1)
+        return np.zeros((len(features), DIM), dtype=np.float32)
+
+
+def test_torch_backend_serializes_tokenization_only(monkeypatch):
+    module = types.ModuleType("sentence_transformers")
+    module.SentenceTransformer = _FakeSentenceTransformer
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+
+    backend = TorchEmbeddingBackend("fake")
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: backend.encode([f"tweet {i}"]), range(64)))
+
+    assert backend.model.peak["tokenize"] == 1
+    assert backend.model.peak["forward"] > 1
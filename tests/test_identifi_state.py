@@ -0,0 +1,110 @@
+"""
+Incremental identifi state tokens: signed round trips, refusal without a
+secret, bounded decompression and whitelisted array dtypes and shapes.
+"""
+
+import base64
+import zlib
+
+import numpy as np
+import orjson
+import pytest
+
+from services import identifi_state_service
+from services.identifi_state_service import (
+    IdentifiStateCodec,
+    IncrementalSpamIndex,
+    InvalidStateError,
+    TOTAL_FIELDS,
+)
+
+
+@pytest.fixture
+def secret(monkeypatch):
+    monkeypatch.setattr(identifi_state_service, "IDENTIFI_STATE_SECRET", "test-secret")
+
+
+def state(count: int = 3) -> dict:
+    index = IncrementalSpamIndex()
+    entries = [{"id": str(i), "tweet": f"gm wagmi {i}", "original": True} for i in range(count)]
+    index.add(entries, np.random.default_rng(0).standard_normal((count, 8)))
+    return {
+        "ids": [str(i) for i in range(count)],
+        "lang": "en",
+        "totals": {field: i for i, field in enumerate(TOTAL_FIELDS)},
+        "entries": index.entries,
+        "index": index.to_state(),
+    }
+
+
+def signed(doc: dict) -> str:
+    """Sign a raw document, bypassing encode() so tests can craft bad payloads."""
+    body = zlib.compress(orjson.dumps(doc))
+    return base64.urlsafe_b64encode(IdentifiStateCodec._sign(body) + body).decode("ascii")
+
+
+def raw(token: str) -> dict:
+    body = base64.urlsafe_b64decode(token)[32:]
+    return orjson.loads(zlib.decompress(body))
+
+
+def test_round_trip(secret):
+    doc = state()
+    decoded = IdentifiStateCodec.decode(IdentifiStateCodec.encode(doc))
+
+    assert decoded["ids"] == doc["ids"] and decoded["totals"] == doc["totals"]
+    for name, array in doc["index"].items():
+        np.testing.assert_array_equal(decoded["index"][name], array)
+        assert decoded["index"][name].dtype == array.dtype
+
+
+def test_refused_without_secret(secret, monkeypatch):
+    token = IdentifiStateCodec.encode(state())
+    monkeypatch.setattr(identifi_state_service, "IDENTIFI_STATE_SECRET", "")
+
+    assert not IdentifiStateCodec.enabled()
+    with pytest.raises(InvalidStateError, match="disabled"):
+        IdentifiStateCodec.decode(token)
+    with pytest.raises(InvalidStateError, match="disabled"):
+        IdentifiStateCodec.encode(state())
+
+
+def test_unsigned_or_tampered_tokens_are_rejected(secret):
+    body = zlib.compress(orjson.dumps(raw(IdentifiStateCodec.encode(state()))))
+    with pytest.raises(InvalidStateError, match="signature"):
+        IdentifiStateCodec.decode(base64.urlsafe_b64encode(body).decode("ascii"))
+    with pytest.raises(InvalidStateError, match="signature"):
+        IdentifiStateCodec.decode(base64.urlsafe_b64encode(b"\0" * 32 + body).decode("ascii"))
+
+
+def test_decompression_is_bounded(secret, monkeypatch):
+    monkeypatch.setattr(identifi_state_service, "IDENTIFI_STATE_MAX_BYTES", 1 << 16)
+    bomb = zlib.compress(b" " * (1 << 20))
+    token = base64.urlsafe_b64encode(IdentifiStateCodec._sign(bomb) + bomb).decode("ascii")
+
+    with pytest.raises(InvalidStateError, match="exceeds"):
+        IdentifiStateCodec.decode(token)
+
+
+@pytest.mark.parametrize("name, change", [
+    ("embeddings", {"dtype": "float64"}),
+    ("sketch_indices", {"dtype": "object"}),
+    ("max_sketch", {"shape": [1 << 40]}),
+    ("embeddings", {"shape": [3]}),
+    ("sketch_indptr", {"shape": [2]}),
+])
+def test_array_dtype_and_shape_are_whitelisted(secret, name, change):
+    doc = raw(IdentifiStateCodec.encode(state()))
+    doc["index"][name].update(change)
+
+    with pytest.raises(InvalidStateError):
+        IdentifiStateCodec.decode(signed(doc))
+
+
+def test_sketch_indices_must_stay_in_range(secret):
+    doc = raw(IdentifiStateCodec.encode(state()))
+    indices = np.full(len(state()["index"]["sketch_indices"]), -1, dtype=np.int32)
+    doc["index"]["sketch_indices"]["data"] = base64.b64encode(indices.tobytes()).decode("ascii")
+
+    with pytest.raises(InvalidStateError, match="entries"):
+        IdentifiStateCodec.decode(signed(doc))
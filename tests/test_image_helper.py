@@ -0,0 +1,80 @@
+"""
+Badge post-processing: alpha-weighted background color, multi-size
+PNG/WebP encoding and masks upsampled from the matte size.
+"""
+
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.image_helper import (
+    ImageStages,
+    apply_mask,
+    downscale_for_matte,
+    encode_sizes,
+    get_average_hex_color,
+    sniff_format,
+)
+
+MAGIC = {"png": b"\x89PNG\r\n\x1a\n", "webp": b"RIFF"}
+
+
+def badge(width: int = 120, height: int = 80) -> Image.Image:
+    """An opaque teal disc on a transparent, bright magenta background."""
+    pixels = np.zeros((height, width, 4), dtype=np.uint8)
+    pixels[..., :3] = (255, 0, 255)
+    yy, xx = np.mgrid[:height, :width]
+    disc = (yy - height / 2) ** 2 + (xx - width / 2) ** 2 < (min(width, height) / 3) ** 2
+    pixels[disc] = (20, 160, 150, 255)
+    return Image.fromarray(pixels, "RGBA")
+
+
+def test_transparent_pixels_do_not_shift_the_color():
+    assert get_average_hex_color(badge()) == "#14a096"
+    # half-transparent pixels count half
+    pixels = np.zeros((1, 2, 4), dtype=np.uint8)
+    pixels[0, 0] = (200, 0, 0, 255)
+    pixels[0, 1] = (0, 0, 200, 85)
+    assert get_average_hex_color(Image.fromarray(pixels, "RGBA")) == "#960032"
+
+
+def test_fully_transparent_image_falls_back_to_the_plain_mean():
+    pixels = np.zeros((2, 2, 4), dtype=np.uint8)
+    pixels[..., :3] = (10, 20, 30)
+    assert get_average_hex_color(Image.fromarray(pixels, "RGBA")) == "#0a141e"
+
+
+@pytest.mark.parametrize("image_format", ["png", "webp"])
+def test_encode_sizes_per_longest_side(image_format):
+    stages = ImageStages()
+    outputs = encode_sizes(badge(), [120, 64, 16], image_format, stages)
+
+    assert list(outputs) == [120, 64, 16]
+    for size, data in outputs.items():
+        assert data.startswith(MAGIC[image_format]) and sniff_format(data) == image_format
+        decoded = Image.open(BytesIO(data))
+        assert max(decoded.size) == size and decoded.mode == "RGBA"
+    assert Image.open(BytesIO(outputs[64])).size == (64, 43)
+    assert stages.report()["encode_16"]["bytes"] == len(outputs[16])
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError, match="DNA_IMAGE_FORMAT"):
+        encode_sizes(badge(), [16], "jpeg")
+
+
+def test_apply_mask_upsamples_a_smaller_mask():
+    image = Image.new("RGB", (200, 100), (30, 60, 90))
+    full, small = downscale_for_matte(image, 50)
+    assert small.size == (50, 25)
+    # left half foreground at the matte size
+    mask = np.zeros((25, 50), dtype=np.uint8)
+    mask[:, :25] = 255
+
+    cutout = np.asarray(apply_mask(full, Image.fromarray(mask, "L")))
+
+    assert cutout.shape == (100, 200, 4)
+    assert (cutout[:, :90] == (30, 60, 90, 255)).all()
+    assert (cutout[:, 110:] == 0).all()
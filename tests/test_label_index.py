@@ -0,0 +1,130 @@
+"""
+Label embedding index: bounded rows, a key log several writers append to,
+torn tails and flushes that write outside the index lock.
+"""
+
+import threading
+
+import numpy as np
+import pytest
+
+from utils import label_index as label_index_module
+from utils.label_index import LabelEmbeddingIndex, _LabelMatrix
+
+DIM = 8
+
+
+class TitleEncoder:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, titles, normalize_embeddings=False, **kwargs):
+        self.encoded.extend(titles)
+        return np.stack([vector(title) for title in titles])
+
+
+def vector(title: str) -> np.ndarray:
+    v = np.random.default_rng(sum(map(ord, title))).standard_normal(DIM).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+def keys_and_vectors(start: int, count: int):
+    titles = [f"title {i}" for i in range(start, start + count)]
+    return [LabelEmbeddingIndex.key(title) for title in titles], np.stack([vector(t) for t in titles])
+
+
+@pytest.fixture
+def index(monkeypatch, tmp_path):
+    monkeypatch.setattr(label_index_module, "LABEL_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(label_index_module, "LABEL_INDEX_MAX_ROWS", 50)
+    monkeypatch.setattr(LabelEmbeddingIndex, "_instance", None)
+    monkeypatch.setattr(LabelEmbeddingIndex, "_initialized", False)
+    return LabelEmbeddingIndex()
+
+
+def test_rows_are_bounded(index):
+    encoder = TitleEncoder()
+    for start in range(0, 200, 20):
+        titles = [f"title {i}" for i in range(start, start + 20)]
+        np.testing.assert_allclose(index.encode(titles, encoder), np.stack([vector(t) for t in titles]))
+
+    matrix = index._matrices["default"]
+    assert matrix.size <= 50 and len(matrix.matrix) <= 50
+    assert matrix.generation > 0
+    # a catalog larger than the index is encoded without it
+    assert index.encode([f"big {i}" for i in range(60)], encoder).shape == (60, DIM)
+    assert matrix.size <= 50
+
+
+def test_known_titles_are_not_encoded_again(index):
+    encoder = TitleEncoder()
+    index.encode(["a", "b"], encoder)
+    index.encode(["b", "c", "a"], encoder)
+
+    assert encoder.encoded == ["a", "b", "c"]
+    assert index.stats()["hits"] == 2
+
+
+def test_writers_share_the_key_log(tmp_path):
+    lock = threading.Lock()
+    first = _LabelMatrix("float32", str(tmp_path), max_rows=100)
+    second = _LabelMatrix("float32", str(tmp_path), max_rows=100)
+
+    first.add(*keys_and_vectors(0, 10))
+    first.flush(lock)
+    second.add(*keys_and_vectors(5, 10))
+    second.flush(lock)
+    first.add(*keys_and_vectors(20, 5))
+    first.flush(lock)
+
+    reloaded = _LabelMatrix("float32", str(tmp_path), max_rows=100)
+    keys, vectors = keys_and_vectors(0, 25)
+    stored = [i for i, key in enumerate(keys) if key in reloaded.rows]
+    # 15-19 were never added; overlapping rows were written once
+    assert stored == list(range(15)) + list(range(20, 25))
+    assert reloaded.size == 20
+    np.testing.assert_array_equal(reloaded.matrix[[reloaded.rows[keys[i]] for i in stored]], vectors[stored])
+
+
+def test_disk_rows_are_bounded(tmp_path):
+    lock = threading.Lock()
+    matrix = _LabelMatrix("float32", str(tmp_path), max_rows=30)
+    for start in range(0, 200, 20):
+        matrix.add(*keys_and_vectors(start, 20))
+        matrix.flush(lock)
+
+    assert matrix.data_path.stat().st_size <= 30 * DIM * 4
+    reloaded = _LabelMatrix("float32", str(tmp_path), max_rows=30)
+    keys, vectors = keys_and_vectors(180, 20)
+    np.testing.assert_array_equal(reloaded.matrix[[reloaded.rows[key] for key in keys]], vectors)
+
+
+def test_torn_log_tail_is_ignored(tmp_path):
+    lock = threading.Lock()
+    matrix = _LabelMatrix("float32", str(tmp_path), max_rows=100)
+    matrix.add(*keys_and_vectors(0, 10))
+    matrix.flush(lock)
+    with open(matrix.log_path, "ab") as log:
+        log.write(b'["deadbeef", "cafe')
+    with open(matrix.data_path, "ab") as data:
+        data.write(b"\0" * DIM * 4 * 2)
+
+    other = _LabelMatrix("float32", str(tmp_path), max_rows=100)
+    assert other.size == 10
+    other.add(*keys_and_vectors(10, 5))
+    other.flush(lock)
+
+    reloaded = _LabelMatrix("float32", str(tmp_path), max_rows=100)
+    keys, vectors = keys_and_vectors(0, 15)
+    np.testing.assert_array_equal(reloaded.matrix[[reloaded.rows[key] for key in keys]], vectors)
+
+
+def test_flush_writes_outside_the_index_lock(index, monkeypatch):
+    held = []
+    sync = _LabelMatrix._sync_log
+    monkeypatch.setattr(
+        _LabelMatrix, "_sync_log", lambda self, dim: (held.append(index._lock.locked()), sync(self, dim))
+    )
+    index.encode(["a", "b"], TitleEncoder())
+
+    assert held == [False]
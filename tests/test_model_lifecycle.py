@@ -0,0 +1,74 @@
+"""
+Readiness: /ready only reports ready once the required models are READY,
+including in lazy mode unless MODEL_READY_REQUIRES=started.
+"""
+
+import threading
+import time
+
+import pytest
+
+from utils.model_lifecycle import FAILED, READY, ModelLifecycle
+
+
+@pytest.fixture
+def lifecycle(monkeypatch):
+    # a fresh registry instead of the process-wide singleton
+    monkeypatch.setattr(ModelLifecycle, "_instance", None)
+    monkeypatch.setattr(ModelLifecycle, "_initialized", False)
+    return ModelLifecycle()
+
+
+def wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_lazy_mode_is_not_ready_until_loaded(lifecycle):
+    release = threading.Event()
+    lifecycle.mode = "lazy"
+    lifecycle.register("embedder", lambda: release.wait(5) and "model")
+    lifecycle.start()
+
+    # the probe itself starts loading, nothing else would
+    assert not lifecycle.is_ready()
+    assert not lifecycle.status()["ready"]
+    release.set()
+    assert wait_for(lifecycle.is_ready)
+    assert lifecycle.status()["models"]["embedder"]["state"] == READY
+
+
+def test_lazy_mode_started_policy_only_fails_on_errors(lifecycle):
+    lifecycle.mode = "lazy"
+    lifecycle.ready_requires = "started"
+    lifecycle.register("embedder", lambda: "model")
+    lifecycle.register("broken", lambda: 1 / 0)
+    lifecycle.require(["embedder"])
+
+    assert lifecycle.is_ready()
+    assert lifecycle.status()["models"]["embedder"]["state"] != READY
+
+    lifecycle.require(["embedder", "broken"])
+    with pytest.raises(ZeroDivisionError):
+        lifecycle.get("broken")
+    assert lifecycle.status()["models"]["broken"]["state"] == FAILED
+    assert not lifecycle.is_ready()
+
+
+def test_background_mode_waits_for_required_models_only(lifecycle):
+    lifecycle.mode = "background"
+    lifecycle.register("embedder", lambda: "model")
+    lifecycle.register("rembg", lambda: time.sleep(60))
+    lifecycle.require(["embedder"])
+    lifecycle.start()
+
+    assert wait_for(lifecycle.is_ready)
+    assert lifecycle.status()["models"]["rembg"]["state"] != READY
+
+
+def test_unknown_ready_policy_is_rejected(lifecycle):
+    lifecycle.ready_requires = "warm"
+    with pytest.raises(ValueError, match="MODEL_READY_REQUIRES"):
+        lifecycle.start()
@@ -0,0 +1,128 @@
+"""
+Model sidecar failure handling: calls are never re-sent after a timeout,
+shared-memory buffers do not outlive a failed call, stale connections to a
+restarted sidecar reconnect, and the spawning process respawns the sidecar.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils import model_sidecar as sidecar
+from utils.model_sidecar import ModelSidecarClient, ModelSidecarError, _SidecarHandler, _SidecarServer
+
+
+class FakeModels:
+    def __init__(self):
+        self.calls = []
+
+    def call(self, header, payload):
+        self.calls.append(header["op"])
+        if header["op"] == "slow":
+            time.sleep(0.5)
+        # above MODEL_SIDECAR_INLINE_BYTES: returned through shared memory
+        return np.ones((64, 64), dtype=np.float32), {}
+
+
+def serve(path, models):
+    server = _SidecarServer(path, _SidecarHandler)
+    server.models = models
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(sidecar, "MODEL_SIDECAR_SHM_DIR", str(tmp_path))
+    monkeypatch.setattr(sidecar, "MODEL_SIDECAR_INLINE_BYTES", 1024)
+    monkeypatch.setattr(sidecar, "MODEL_SIDECAR_TIMEOUT", 0.2)
+    instance = ModelSidecarClient()
+    monkeypatch.setattr(instance, "socket_path", str(tmp_path / "models.sock"))
+    instance._drop()
+    yield instance
+    instance._drop()
+
+
+def buffers(tmp_path):
+    return [name for name in os.listdir(tmp_path) if name.startswith("ai-rep-")]
+
+
+def test_timeout_is_not_retried(client, tmp_path):
+    models = FakeModels()
+    server = serve(client.socket_path, models)
+    try:
+        with pytest.raises(ModelSidecarError, match="timed out"):
+            client.call({"op": "slow"})
+        time.sleep(0.6)
+        assert models.calls == ["slow"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_buffer_is_unlinked_when_reading_fails(client, tmp_path, monkeypatch):
+    server = serve(client.socket_path, FakeModels())
+    try:
+        monkeypatch.setattr(sidecar, "_read_shm", lambda *args: (_ for _ in ()).throw(MemoryError("no room")))
+        with pytest.raises(MemoryError):
+            client.call({"op": "encode"})
+        assert buffers(tmp_path) == []
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_stale_connection_reconnects_after_restart(client):
+    server = serve(client.socket_path, FakeModels())
+    assert client.call({"op": "encode"})[0].shape == (64, 64)
+    server.shutdown()
+    server.server_close()
+    # daemon handler threads keep the accepted connection open until the peer goes away
+    os.unlink(client.socket_path)
+
+    restarted = serve(client.socket_path, FakeModels())
+    try:
+        client._local.sock.shutdown(2)  # what the old sidecar's exit does to the connection
+        assert client.call({"op": "encode"})[0].shape == (64, 64)
+    finally:
+        restarted.shutdown()
+        restarted.server_close()
+
+
+def test_sweep_removes_only_old_buffers(client, tmp_path):
+    old = sidecar._write_shm(np.zeros(4))
+    os.utime(tmp_path / old, (time.time() - 60, time.time() - 60))
+    fresh = sidecar._write_shm(np.zeros(4))
+
+    assert sidecar._sweep_shm(30) == 1
+    assert buffers(tmp_path) == [fresh]
+
+
+def test_supervisor_respawns_exited_sidecar(client, monkeypatch):
+    spawned = []
+
+    def start():
+        spawned.append(subprocess.Popen([sys.executable, "-c", "pass"]))
+        return spawned[-1]
+
+    monkeypatch.setattr(sidecar, "MODEL_SIDECAR_RESPAWN_DELAY", 0.01)
+    monkeypatch.setattr(client, "_start_process", start)
+    monkeypatch.setattr(client, "_owner_pid", os.getpid())
+    client._stopping.clear()
+    client._process = start()
+    supervisor = threading.Thread(target=client._supervise, daemon=True)
+    supervisor.start()
+
+    deadline = time.monotonic() + 10
+    while len(spawned) < 3 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    client.shutdown()
+    supervisor.join(5)
+
+    assert len(spawned) >= 3
+    assert not supervisor.is_alive()
@@ -0,0 +1,49 @@
+"""
+ReadabilityEngine against scores pinned from the scalar
+IdentifiScore.get_readability_score it replaced, one text at a time and
+as one batch, with detected and explicit languages.
+"""
+
+import pytest
+
+from services.readability_service import ReadabilityEngine
+
+# (text, detected language, lang="en", lang="id"), from the scalar function
+GOLDEN = [
+    ("", 0.3, 0.3, 0.3),
+    ("   ", 0.3, 0.3, 0.3),
+    ("?!... ,,, —", 0.3, 0.3, 0.3),
+    ("🔥🔥🔥 🚀🚀", 0.3, 0.3, 0.3),
+    ("The quick brown fox jumps over the lazy dog. It was a sunny day!", 0.6261, 0.6261, 0.546),
+    ("gm gm gm gm gm gm gm gm", 0.4729, 0.4729, 0.4729),
+    ("Supercalifragilisticexpialidocious antidisestablishmentarianism", 0.5072, 0.5072, 0.5072),
+    ("Check out #DeFi #NFT #Web3 #airdrop #crypto now", 0.5272, 0.5272, 0.5272),
+    ("Bitcoin is pumping 🚀🔥💎🙌 to the moon!!! Who is with me? 🌕", 0.64, 0.64, 0.547),
+    ("Saya tidak bisa datang karena hujan, jadi kami tetap di rumah saja.", 0.6407, 0.5477, 0.6407),
+    ("Ini adalah proyek yang sangat bagus untuk komunitas kita; ayo ikut!", 0.6005, 0.528, 0.6005),
+    ("Lagi ngopi with the team, this is gokil banget sih 😂", 0.621, 0.621, 0.537),
+    ("zxcvb qwrtp mnbvc lkjhg", 0.4895, 0.4895, 0.4895),
+    ("Reply: yes; no: maybe — who knows, really.", 0.5247, 0.5247, 0.5247),
+    ("İstanbul ÇAĞRI straße ÉCOLE naïve café", 0.5306, 0.5306, 0.5306),
+    ("a", 0.8205, 0.8205, 0.7305),
+    ("1234 5678 #2024", 0.546, 0.546, 0.546),
+]
+
+TEXTS = [text for text, *_ in GOLDEN]
+
+
+@pytest.mark.parametrize("text, detected, en, id_", GOLDEN)
+def test_single_text_matches_the_scalar_score(text, detected, en, id_):
+    assert ReadabilityEngine.get_readability_scores([text]) == [detected]
+    assert ReadabilityEngine.get_readability_scores([text], ["en"]) == [en]
+    assert ReadabilityEngine.get_readability_scores([text], ["id"]) == [id_]
+
+
+def test_batch_matches_the_scalar_scores():
+    assert ReadabilityEngine.get_readability_scores(TEXTS) == [row[1] for row in GOLDEN]
+    assert ReadabilityEngine.get_readability_scores(TEXTS, ["en"] * len(TEXTS)) == [row[2] for row in GOLDEN]
+    # regional codes pick the same stopwords; a missing language is detected
+    langs = ["id-ID" if i % 2 else None for i in range(len(TEXTS))]
+    assert ReadabilityEngine.get_readability_scores(TEXTS, langs) == [
+        row[3] if i % 2 else row[1] for i, row in enumerate(GOLDEN)
+    ]
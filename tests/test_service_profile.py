@@ -0,0 +1,92 @@
+"""
+The dna_image profile serves only the badge routes and never loads the
+genai SDK behind /api/dna/generate; JSON libs load on first use.
+"""
+
+import builtins
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from utils.libs_loader import LibsLoader
+from utils.service_profile import parse_profile, register_profile
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class RecordingApp:
+    """Just enough of Robyn to list registered routes."""
+
+    def __init__(self):
+        self.routes = []
+
+    def _route(self, method):
+        def register(path, *args, **kwargs):
+            self.routes.append((method, path))
+            return lambda handler: handler
+        return register
+
+    def __getattr__(self, method):
+        return self._route(method)
+
+
+def test_dna_image_registers_image_routes_only():
+    app = RecordingApp()
+    register_profile(app, "dna_image")
+
+    paths = [path for _, path in app.routes]
+    assert paths and all(path.startswith("/api/dna/image") for path in paths)
+
+
+def test_dna_and_dna_image_do_not_register_twice():
+    assert parse_profile("dna_image,dna") == ["dna"]
+
+    app = RecordingApp()
+    register_profile(app, "dna,dna_image")
+    assert len(app.routes) == len(set(app.routes))
+    assert ("post", "/api/dna/generate") in app.routes
+
+
+def test_dna_controller_import_skips_genai():
+    code = "import sys, controllers.dna_controller; print('google.genai' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "False"
+
+
+def test_libs_load_once_for_concurrent_first_lookups(monkeypatch, tmp_path):
+    for name in ("persona_a", "persona_b"):
+        (tmp_path / f"{name}.json").write_text('{"name": "%s"}' % name)
+    monkeypatch.setattr(LibsLoader, "_instance", None)
+    monkeypatch.setattr(LibsLoader, "_initialized", False)
+    loader = LibsLoader()
+    loader.libs_dir = tmp_path
+
+    real_open = builtins.open
+
+    def slow_open(path, *args, **kwargs):
+        if str(path).startswith(str(tmp_path)):
+            time.sleep(0.02)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", slow_open)
+    results, errors = [], []
+
+    def lookup():
+        try:
+            results.append(loader.get("persona_b")["name"])
+        except KeyError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == [] and results == ["persona_b"] * 8
+
+    (tmp_path / "persona_c.json").write_text('{"name": "persona_c"}')
+    loader.reload()
+    assert sorted(loader.list_loaded()) == ["persona_a", "persona_b", "persona_c"]
@@ -0,0 +1,128 @@
+"""
+Parity of SpamSimilarityEngine with the per-tweet loop identifi v2 used
+before the all-pairs pass: transform one tweet, compare it against every
+row, drop its own similarity, take the max.
+"""
+
+import math
+import random
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from services import spam_similarity_service
+from services.spam_similarity_service import SpamSimilarityEngine
+
+WORDS = "gm wagmi airdrop claim mint nft pump token launch alpha thread ser frens bridge stake".split()
+
+
+def timeline(n: int, seed: int = 3) -> list:
+    """Random tweets with near-duplicate runs and very short ones, the cases spam scoring cares about."""
+    rng = random.Random(seed)
+    tweets = []
+    while len(tweets) < n:
+        tweet = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+        tweets.append(tweet)
+        for _ in range(rng.randint(0, 2)):
+            tweets.append(tweet + " " + rng.choice(WORDS))
+        if rng.random() < 0.1:
+            tweets.append(rng.choice(WORDS)[:4])
+    return tweets[:n]
+
+
+def fake_embeddings(tweets: list, dim: int = 32) -> np.ndarray:
+    """Unnormalized word-hash embeddings: duplicates land close, like a sentence encoder."""
+    embs = np.zeros((len(tweets), dim), dtype=np.float32)
+    for row, tweet in enumerate(tweets):
+        for word in tweet.split():
+            embs[row] += np.random.default_rng(sum(map(ord, word))).standard_normal(dim)
+    return embs + 0.01
+
+
+def pairwise_spam_score(tweet: str, index: int, tfidf, tfidf_matrix, embed_matrix) -> float:
+    """The old IdentifiScore.get_spam_score, with util.cos_sim spelled out in NumPy."""
+    sims_tfidf = cosine_similarity(tfidf.transform([tweet]), tfidf_matrix)[0]
+    sims_tfidf[index] = -1
+    sim_tfidf = sims_tfidf.max()
+
+    embs = embed_matrix / np.linalg.norm(embed_matrix, axis=1, keepdims=True)
+    sims_embed = embs @ embs[index]
+    sims_embed[index] = -1
+    sim_embed = sims_embed.max()
+
+    freq_penalty = float((sim_tfidf + sim_embed) / 2 > 0.75)
+    text_len = len(tweet)
+    short_penalty = 1 if text_len <= 4 else 0.5 if text_len <= 8 else 0
+    z = 1.2 * sim_embed + 0.8 * sim_tfidf + 0.3 * freq_penalty + 0.4 * short_penalty
+    return float(1 / (1 + math.exp(-z)))
+
+
+def features(tweets: list):
+    tfidf = TfidfVectorizer(min_df=1, max_features=2000, ngram_range=(1, 2))
+    return tfidf, tfidf.fit_transform(tweets), fake_embeddings(tweets)
+
+
+@pytest.mark.parametrize("n", [2, 3, 40, 300])
+def test_exact_scores_match_pairwise_loop(n):
+    tweets = timeline(n)
+    tfidf, tfidf_matrix, embed_matrix = features(tweets)
+
+    expected = [pairwise_spam_score(t, i, tfidf, tfidf_matrix, embed_matrix) for i, t in enumerate(tweets)]
+    scores = SpamSimilarityEngine.get_spam_scores(tweets, tfidf_matrix, embed_matrix, approximate=False)
+
+    np.testing.assert_allclose(scores, expected, rtol=0, atol=1e-6)
+
+
+def test_single_and_empty_timelines():
+    assert SpamSimilarityEngine.get_spam_scores([], None, None).shape == (0,)
+
+    tfidf, tfidf_matrix, embed_matrix = features(["gm"])
+    score = SpamSimilarityEngine.get_spam_scores(["gm"], tfidf_matrix, embed_matrix, approximate=False)
+    # the old loop maxed over [-1] only
+    assert score[0] == pytest.approx(1 / (1 + math.exp(-(-1.2 - 0.8 + 0.4))))
+
+
+def test_approximate_scores_never_exceed_exact():
+    tweets = timeline(400)
+    _, tfidf_matrix, embed_matrix = features(tweets)
+
+    exact = SpamSimilarityEngine.get_spam_scores(tweets, tfidf_matrix, embed_matrix, approximate=False)
+    approx = SpamSimilarityEngine.get_spam_scores(tweets, tfidf_matrix, embed_matrix, approximate=True)
+
+    # approximate max similarities are lower bounds; exact near-duplicates are still found
+    assert np.all(approx <= exact + 1e-6)
+    duplicated = [i for i, t in enumerate(tweets) if tweets.count(t) > 1]
+    np.testing.assert_allclose(approx[duplicated], exact[duplicated], atol=1e-6)
+
+
+def test_exact_row_blocks_match_one_block(monkeypatch):
+    tweets = timeline(300)
+    _, tfidf_matrix, embed_matrix = features(tweets)
+    whole = SpamSimilarityEngine.get_spam_scores(tweets, tfidf_matrix, embed_matrix, approximate=False)
+
+    # 7 rows per block: uneven blocks, the diagonal lands on a different column in each
+    monkeypatch.setattr(spam_similarity_service, "SPAM_EXACT_BLOCK_CELLS", 7 * 300)
+    blocked = SpamSimilarityEngine.get_spam_scores(tweets, tfidf_matrix, embed_matrix, approximate=False)
+
+    np.testing.assert_allclose(blocked, whole, rtol=0, atol=1e-6)
+
+
+def test_default_approximates_the_tfidf_side_only(monkeypatch):
+    tweets = timeline(400)
+    _, tfidf_matrix, embed_matrix = features(tweets)
+    calls = []
+    for name in ("approx_max_offdiag_tfidf", "approx_max_offdiag_embed"):
+        original = getattr(SpamSimilarityEngine, name)
+        monkeypatch.setattr(SpamSimilarityEngine, name, staticmethod(
+            lambda matrix, name=name, original=original: (calls.append(name), original(matrix))[1]
+        ))
+
+    monkeypatch.setattr(spam_similarity_service, "SPAM_APPROX_MIN_TWEETS", 400)
+    SpamSimilarityEngine.get_spam_scores(tweets, tfidf_matrix, embed_matrix)
+    assert calls == ["approx_max_offdiag_tfidf"]
+
+    monkeypatch.setattr(spam_similarity_service, "SPAM_APPROX_EMBED_MIN_TWEETS", 400)
+    SpamSimilarityEngine.get_spam_scores(tweets, tfidf_matrix, embed_matrix)
+    assert calls[1:] == ["approx_max_offdiag_tfidf", "approx_max_offdiag_embed"]
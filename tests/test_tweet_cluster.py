@@ -0,0 +1,129 @@
+"""
+TweetClusterEngine: leader mode against the nested cos_sim loop
+_cluster_unmatched_tweets used before the engine, and fixed cases for the
+components and complete modes.
+"""
+
+import numpy as np
+import pytest
+
+from services import tweet_cluster_service
+from services.embedding_service import cos_sim
+from services.tweet_cluster_service import CLUSTER_MODES, TweetClusterEngine
+
+DIM = 16
+
+
+def nested_leader_clusters(embs, threshold: float, max_clusters: int) -> list:
+    """The old DNAService._cluster_unmatched_tweets loop, over row indices instead of tweets."""
+    assigned = set()
+    clusters = []
+
+    for i in range(len(embs)):
+        if i in assigned:
+            continue
+
+        cluster = [i]
+        assigned.add(i)
+
+        for j in range(i + 1, len(embs)):
+            if j in assigned:
+                continue
+            sim = float(cos_sim(embs[i : i + 1], embs[j : j + 1]).item())
+            if sim >= threshold:
+                cluster.append(j)
+                assigned.add(j)
+
+        clusters.append(cluster)
+        if len(clusters) >= max_clusters:
+            break
+
+    clusters.sort(key=len, reverse=True)
+    return clusters[:max_clusters]
+
+
+def topic_embeddings(n: int, seed: int) -> np.ndarray:
+    """Noisy copies of a few topic vectors plus zero rows, the way empty tweets embed."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((rng.integers(1, 6), DIM))
+    embs = topics[rng.integers(0, len(topics), n)] + rng.uniform(0.1, 1.0) * rng.standard_normal((n, DIM))
+    embs[rng.random(n) < 0.05] = 0.0
+    return embs.astype(np.float32)
+
+
+def as_lists(groups) -> list:
+    return [[int(i) for i in group] for group in groups]
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_leader_matches_the_nested_loop(seed):
+    rng = np.random.default_rng(1000 + seed)
+    n = int(rng.integers(1, 80))
+    threshold = float(rng.uniform(0.3, 0.9))
+    max_clusters = int(rng.integers(1, 6))
+    embs = topic_embeddings(n, seed)
+
+    assert as_lists(TweetClusterEngine.cluster(embs, threshold, max_clusters)) == \
+        nested_leader_clusters(embs, threshold, max_clusters)
+
+
+@pytest.mark.parametrize("mode", CLUSTER_MODES)
+def test_single_tweet_and_empty_input(mode):
+    assert as_lists(TweetClusterEngine.cluster(np.ones((1, DIM)), 0.75, 3, mode=mode)) == [[0]]
+    assert TweetClusterEngine.cluster(np.zeros((0, DIM)), 0.75, 3, mode=mode) == []
+    assert TweetClusterEngine.cluster(np.ones((2, DIM)), 0.75, 0, mode=mode) == []
+
+
+@pytest.mark.parametrize("mode", CLUSTER_MODES)
+def test_zero_rows_stay_singletons(mode):
+    embs = np.zeros((4, DIM), dtype=np.float32)
+    embs[1, 0] = embs[3, 0] = 1.0
+
+    assert as_lists(TweetClusterEngine.cluster(embs, 0.75, 5, mode=mode)) == [[1, 3], [0], [2]]
+
+
+@pytest.mark.parametrize("mode", CLUSTER_MODES)
+def test_similarity_at_the_threshold_joins(mode):
+    # unit rows with a float32 dot product of exactly 0.6
+    embs = np.array([[1.0, 0.0], [0.6, 0.8]], dtype=np.float32)
+    threshold = float(embs[0] @ embs[1])
+
+    above = float(np.nextafter(np.float32(threshold), np.float32(1.0)))
+
+    assert as_lists(TweetClusterEngine.cluster(embs, threshold, 3, mode=mode)) == [[0, 1]]
+    assert len(TweetClusterEngine.cluster(embs, above, 3, mode=mode)) == 2
+
+
+def axis_rows(axes: list) -> np.ndarray:
+    embs = np.zeros((len(axes), DIM), dtype=np.float32)
+    embs[np.arange(len(axes)), axes] = 1.0
+    return embs
+
+
+@pytest.mark.parametrize("mode", ["components", "complete"])
+def test_largest_first_then_tweet_order(mode):
+    # sizes 1, 3, 2, 2 in order of first tweet
+    embs = axis_rows([0, 1, 2, 1, 3, 2, 1, 3])
+
+    assert as_lists(TweetClusterEngine.cluster(embs, 0.75, 3, mode=mode)) == [[1, 3, 6], [2, 5], [4, 7]]
+
+
+def test_components_join_through_a_chain_complete_does_not():
+    # 0-1 and 1-2 are within the threshold, 0-2 is not
+    angles = np.radians([0.0, 35.0, 75.0])
+    embs = np.stack([np.cos(angles), np.sin(angles)], axis=1).astype(np.float32)
+
+    assert as_lists(TweetClusterEngine.cluster(embs, 0.7, 3, mode="components")) == [[0, 1, 2]]
+    assert as_lists(TweetClusterEngine.cluster(embs, 0.7, 3, mode="complete")) == [[0, 1], [2]]
+
+
+def test_components_cross_similarity_blocks(monkeypatch):
+    monkeypatch.setattr(tweet_cluster_service, "_SIM_BLOCK", 3)
+    embs = axis_rows([0, 1, 2, 3, 4, 5, 6, 0])
+
+    assert as_lists(TweetClusterEngine.cluster(embs, 0.75, 1, mode="components")) == [[0, 7]]
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError, match="DNA_CLUSTER_MODE"):
+        TweetClusterEngine.cluster(np.ones((2, DIM)), 0.75, 3, mode="kmeans")
@@ -0,0 +1,215 @@
+"""
+Label ANN Index - top-k cosine search over DNA label embeddings
+
+Classification-mode shortlists rank the whole catalog against one query
+vector. Two interchangeable index kinds answer `search(query, k, labels)`:
+
+- exact (default): one matrix-vector product over the pre-normalized
+  labels plus argpartition; also used for catalogs below DNA_ANN_MIN_LABELS.
+- ivf (opt-in): inverted file. Spherical k-means (scikit-learn MiniBatchKMeans on a
+  sample) splits the labels into DNA_ANN_NLIST lists; a query scores the
+  centroids, then only the labels of the DNA_ANN_NPROBE nearest lists.
+
+    index = build_index(label_embeddings)
+    top_indices, sims = index.search(query_vec, top_k, label_embeddings)    # best first
+
+Neither kind keeps a copy of the labels: search() takes the normalized
+matrix the index was built for, the one the request already holds. An IVF
+index saves its centroids and list layout with save_index(); load_index()
+restores it for the same catalog, and a missing, corrupt or mismatched file
+is a miss that the caller rebuilds. Recall@k against exact search is
+measured by benchmarks/label_ann_recall.py; so far only with model-free
+stand-in embeddings, where recall@20 is 0.89-0.93 at the default nprobe.
+IVF changes shortlists against exact search, so it stays opt-in until
+that table is re-measured with the MiniLM embeddings the service uses.
+
+Configuration (env):
+    DNA_ANN_KIND        exact | ivf (default: exact)
+    DNA_ANN_MIN_LABELS  catalogs smaller than this use exact search (default: 20000)
+    DNA_ANN_NLIST       inverted lists, 0 = 2 * sqrt(labels) (default: 0)
+    DNA_ANN_NPROBE      lists scanned per query (default: 24)
+"""
+
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from services.embedding_service import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+DNA_ANN_KIND = os.getenv("DNA_ANN_KIND", "exact").lower()
+DNA_ANN_MIN_LABELS = int(os.getenv("DNA_ANN_MIN_LABELS", "20000"))
+DNA_ANN_NLIST = int(os.getenv("DNA_ANN_NLIST", "0"))
+DNA_ANN_NPROBE = int(os.getenv("DNA_ANN_NPROBE", "24"))
+
+# k-means trains on at most this many labels per list
+_TRAIN_PER_LIST = 64
+# label rows assigned to lists per step, bounds the (rows, nlist) similarity block
+_ASSIGN_CHUNK = 8192
+
+
+def _top_k(sims: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k largest `sims`, largest first."""
+    k = min(k, len(sims))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(sims):
+        part = np.argpartition(-sims, k - 1)[:k]
+    else:
+        part = np.arange(len(sims))
+    return part[np.argsort(-sims[part], kind="stable")]
+
+
+class ExactIndex:
+    """Brute-force cosine search."""
+
+    kind = "exact"
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def search(self, query, k: int, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        sims = vectors @ normalize_rows(query)[0]
+        top = _top_k(sims, k)
+        return top, sims[top]
+
+    def stats(self) -> dict:
+        return {"kind": self.kind, "labels": len(self)}
+
+
+class IVFIndex:
+    """Inverted-file cosine search; `ids` lists the label rows of each list contiguously."""
+
+    kind = "ivf"
+
+    def __init__(self, size: int, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray, nprobe: int):
+        self.size = size
+        self.ids = order
+        self.centroids = centroids
+        self.offsets = offsets
+        self.nprobe = max(1, min(nprobe, len(centroids)))
+        self.build_ms = 0.0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @classmethod
+    def build(cls, matrix, nlist: int = DNA_ANN_NLIST, nprobe: int = DNA_ANN_NPROBE, seed: int = 0) -> "IVFIndex":
+        from sklearn.cluster import MiniBatchKMeans
+
+        started = time.perf_counter()
+        vectors = normalize_rows(matrix)
+        n = len(vectors)
+        nlist = max(1, min(nlist or int(round(2 * np.sqrt(n))), n))
+
+        rng = np.random.default_rng(seed)
+        train = vectors
+        if n > nlist * _TRAIN_PER_LIST:
+            train = vectors[rng.choice(n, nlist * _TRAIN_PER_LIST, replace=False)]
+        kmeans = MiniBatchKMeans(
+            n_clusters=nlist, batch_size=4096, n_init=1, max_no_improvement=20, random_state=seed
+        ).fit(train)
+        # spherical: assign by cosine to the normalized centers
+        centroids = normalize_rows(kmeans.cluster_centers_)
+
+        assignment = np.empty(n, dtype=np.int64)
+        for start in range(0, n, _ASSIGN_CHUNK):
+            assignment[start:start + _ASSIGN_CHUNK] = np.argmax(vectors[start:start + _ASSIGN_CHUNK] @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))])
+
+        index = cls(n, centroids, order, offsets, nprobe)
+        index.build_ms = (time.perf_counter() - started) * 1000
+        return index
+
+    def search(self, query, k: int, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        q = normalize_rows(query)[0]
+        probe_order = np.argsort(-(self.centroids @ q))
+
+        blocks, sims, candidates = [], [], 0
+        for probed, lst in enumerate(probe_order):
+            # keep probing past nprobe until there are k candidates
+            if probed >= self.nprobe and candidates >= k:
+                break
+            members = self.ids[self.offsets[lst]:self.offsets[lst + 1]]
+            if not len(members):
+                continue
+            blocks.append(members)
+            sims.append(vectors[members] @ q)
+            candidates += len(members)
+
+        if not blocks:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids, sims = np.concatenate(blocks), np.concatenate(sims)
+        top = _top_k(sims, k)
+        return ids[top], sims[top]
+
+    def stats(self) -> dict:
+        sizes = np.diff(self.offsets)
+        return {
+            "kind": self.kind,
+            "labels": len(self),
+            "nlist": len(self.centroids),
+            "nprobe": self.nprobe,
+            "max_list": int(sizes.max()),
+            "build_ms": round(self.build_ms, 1),
+        }
+
+
+def build_index(matrix, kind: str = DNA_ANN_KIND, min_labels: int = DNA_ANN_MIN_LABELS):
+    """IVF index for large catalogs, exact search below `min_labels` or with kind=exact."""
+    if kind not in ("ivf", "exact"):
+        raise ValueError(f"Unsupported DNA_ANN_KIND: {kind}")
+    if kind == "exact" or len(matrix) < min_labels:
+        return ExactIndex(len(matrix))
+    return IVFIndex.build(matrix)
+
+
+def save_index(index, path: Path) -> None:
+    """Persist an IVF layout to `path` (.npz); exact indexes have nothing to save."""
+    if not isinstance(index, IVFIndex):
+        return
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            centroids=index.centroids,
+            order=index.ids,
+            offsets=index.offsets,
+            shape=np.asarray([len(index), index.centroids.shape[1]]),
+        )
+    tmp_path.replace(path)
+
+
+def load_index(path: Path, matrix, nprobe: int = DNA_ANN_NPROBE) -> Optional[IVFIndex]:
+    """IVF index saved at `path` for `matrix`, or None when missing, unreadable or built for other embeddings."""
+    try:
+        with np.load(path) as saved:
+            shape = tuple(saved["shape"])
+            centroids, order, offsets = saved["centroids"], saved["order"], saved["offsets"]
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # truncated or corrupt file: rebuild and overwrite it
+        logger.warning("ann index %s unreadable, rebuilding: %s", path, e)
+        return None
+
+    n, dim = np.shape(matrix)
+    nlist = len(centroids)
+    if (
+        shape != (n, dim)
+        or centroids.ndim != 2 or nlist < 1 or centroids.shape[1] != dim
+        or offsets.dtype.kind not in "iu" or order.dtype.kind not in "iu"
+        or offsets.shape != (nlist + 1,) or offsets[0] != 0 or offsets[-1] != n or np.any(np.diff(offsets) < 0)
+        or order.shape != (n,) or not np.array_equal(np.sort(order), np.arange(n))
+    ):
+        return None
+    return IVFIndex(n, centroids, order, offsets, nprobe)
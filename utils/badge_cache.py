@@ -0,0 +1,498 @@
+"""
+Badge Cache - content-addressed cache of generated DNA badge images
+
+DNA titles repeat across users, and every badge costs a gpt-4o-mini rewrite,
+a gpt-image generation and a rembg pass. Badges are cached under a key of
+the normalized title, BADGE_STYLE_VERSION, the background mode and the
+output encoding:
+
+    badge, source = await badge_cache.get_or_generate(title, lambda: render(title))
+
+A badge keeps the encoded bytes, not base64:
+
+    {"background_hex": "#7368b6", "image_format": "png", "sizes": ["1024", "256"],
+     "images": {"1024": b"...", "256": b"..."}, "digests": {"1024": "<sha256>", ...}}
+
+badge_json() builds the legacy base64 response from it, badge_handles() the
+handle response; a handle is the sha256 of the image bytes, served by the
+asset endpoint with that digest as a strong ETag.
+
+Lookups go through an in-memory LRU, then a local content-addressed store:
+
+    BADGE_CACHE_DIR/objects/ab/cdef...   encoded image bytes, named by sha256
+    BADGE_CACHE_DIR/refs/<key>.json      manifest: title, hex, format, digest per size
+
+Identical bytes are stored once however many keys point at them. Handles
+resolve against this store, so they work from every worker process on the
+host; without BADGE_CACHE_DIR they only resolve while the badge is in this
+process's LRU. Store reads and writes run in worker threads, never on the
+event loop. Once the objects exceed BADGE_CACHE_DIR_MAX_MB, a sweep drops
+the least recently used manifests (a disk hit refreshes a manifest's mtime)
+and the objects no manifest references any more, down to 90% of the limit.
+Concurrent misses for the same key share one generation (single-flight per
+process, see utils/single_flight.py): a cancelled caller leaves it running
+for the others, and it is only cancelled once no caller is left.
+A failed generation is not cached and the next request retries.
+
+Configuration (env):
+    BADGE_CACHE_SIZE      in-memory badges (default: 256, 0 disables the cache)
+    BADGE_CACHE_DIR       content-addressed store (default: ~/.cache/ai-reputation-service/badges,
+                          empty for memory only)
+    BADGE_CACHE_DIR_MAX_MB  size limit of the stored objects (default: 1024, 0 for no limit)
+    BADGE_STYLE_VERSION   bump when the badge prompts, models or style change (default: 1)
+"""
+
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import orjson
+
+from utils.image_helper import DNA_IMAGE_BACKGROUND, DNA_IMAGE_FORMAT, DNA_IMAGE_SIZES
+from utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+BADGE_CACHE_SIZE = int(os.getenv("BADGE_CACHE_SIZE", "256"))
+BADGE_CACHE_DIR = os.getenv(
+    "BADGE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "ai-reputation-service", "badges"),
+)
+BADGE_CACHE_DIR_MAX_MB = int(os.getenv("BADGE_CACHE_DIR_MAX_MB", "1024"))
+BADGE_STYLE_VERSION = os.getenv("BADGE_STYLE_VERSION", "1")
+
+# a sweep frees down to this share of the limit, so it does not run on every put
+_SWEEP_LOW_WATER = 0.9
+# objects younger than this may belong to a manifest another process is about to write
+_SWEEP_GRACE_SECONDS = 300
+
+_WHITESPACE = re.compile(r"\s+")
+_HANDLE = re.compile(r"^[0-9a-f]{64}$")
+
+ASSET_URL = "/api/dna/image/asset/{handle}"
+
+
+def badge_json(badge: Dict[str, Any]) -> Dict[str, Any]:
+    """Legacy /api/dna/image data: base64 main image, base64 thumbnails."""
+    main_size, *thumbnail_sizes = badge["sizes"]
+    image = {
+        "image_b64": base64.b64encode(badge["images"][main_size]).decode("utf-8"),
+        "background_hex": badge["background_hex"],
+        "image_format": badge["image_format"],
+    }
+    if thumbnail_sizes:
+        image["thumbnails"] = {
+            size: base64.b64encode(badge["images"][size]).decode("utf-8") for size in thumbnail_sizes
+        }
+    return image
+
+
+def badge_handles(badge: Dict[str, Any]) -> Dict[str, Any]:
+    """Handle response: digest and fetch URL per size instead of the bytes."""
+    assets = {
+        size: {
+            "handle": badge["digests"][size],
+            "url": ASSET_URL.format(handle=badge["digests"][size]),
+            "bytes": len(badge["images"][size]),
+        }
+        for size in badge["sizes"]
+    }
+    main_size, *thumbnail_sizes = badge["sizes"]
+    result = {
+        **assets[main_size],
+        "background_hex": badge["background_hex"],
+        "image_format": badge["image_format"],
+    }
+    if thumbnail_sizes:
+        result["thumbnails"] = {size: assets[size] for size in thumbnail_sizes}
+    return result
+
+
+class _ContentStore:
+    """sha256-addressed image objects plus one JSON manifest per cache key."""
+
+    def __init__(self, directory: str, max_bytes: int = 0):
+        self.dir = Path(directory)
+        self.objects = self.dir / "objects"
+        self.refs = self.dir / "refs"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.refs.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        # bytes of stored objects, measured on the first write and re-measured by every sweep
+        self._usage: Optional[int] = None
+        self._usage_lock = threading.Lock()
+        self.swept = 0
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest[2:]
+
+    def put_object(self, data: bytes, digest: Optional[str] = None) -> str:
+        digest = digest or hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            self._write_atomic(path, data)
+            with self._usage_lock:
+                if self._usage is not None:
+                    self._usage += len(data)
+        return digest
+
+    def get_object(self, digest: str) -> Optional[bytes]:
+        try:
+            return self.object_path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def get_manifest(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self.refs / f"{key}.json"
+        try:
+            manifest = orjson.loads(path.read_bytes())
+            # recency for the sweep
+            os.utime(path)
+            return manifest
+        except FileNotFoundError:
+            return None
+
+    def put_manifest(self, key: str, manifest: Dict[str, Any]) -> None:
+        self._write_atomic(self.refs / f"{key}.json", orjson.dumps(manifest))
+
+    def _object_sizes(self) -> Dict[str, Tuple[int, float]]:
+        sizes = {}
+        for path in self.objects.glob("*/*"):
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            sizes[path.parent.name + path.name] = (stat.st_size, stat.st_mtime)
+        return sizes
+
+    def maybe_sweep(self) -> int:
+        """Sweep if the objects exceed max_bytes; returns the bytes freed."""
+        if self.max_bytes <= 0:
+            return 0
+        with self._usage_lock:
+            if self._usage is None:
+                self._usage = sum(size for size, _ in self._object_sizes().values())
+            if self._usage <= self.max_bytes:
+                return 0
+        return self.sweep()
+
+    def sweep(self) -> int:
+        """Drop least recently used manifests and unreferenced objects down to the low-water mark."""
+        target = int(self.max_bytes * _SWEEP_LOW_WATER)
+        sizes = self._object_sizes()
+        usage = sum(size for size, _ in sizes.values())
+
+        manifests = []
+        refcount: Dict[str, int] = {}
+        for path in self.refs.glob("*.json"):
+            try:
+                mtime = path.stat().st_mtime
+                digests = set(orjson.loads(path.read_bytes())["objects"].values())
+            except (FileNotFoundError, ValueError, KeyError):
+                continue
+            manifests.append((mtime, path, digests))
+            for digest in digests:
+                refcount[digest] = refcount.get(digest, 0) + 1
+
+        freed = 0
+        cutoff = time.time() - _SWEEP_GRACE_SECONDS
+
+        def drop(digest: str) -> None:
+            nonlocal freed, usage
+            size, mtime = sizes.pop(digest, (0, 0.0))
+            if mtime > cutoff:
+                return
+            try:
+                self.object_path(digest).unlink()
+            except FileNotFoundError:
+                return
+            freed += size
+            usage -= size
+
+        # orphans first: objects of lost or already dropped manifests
+        for digest in [d for d in sizes if d not in refcount]:
+            drop(digest)
+
+        manifests.sort(key=lambda item: item[0])
+        for _, path, digests in manifests:
+            if usage <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            for digest in digests:
+                refcount[digest] -= 1
+                if refcount[digest] == 0:
+                    drop(digest)
+
+        with self._usage_lock:
+            self._usage = usage
+        self.swept += freed
+        if freed:
+            logger.info("badge cache sweep freed %.1f MB, %.1f MB left", freed / 2 ** 20, usage / 2 ** 20)
+        return freed
+
+
+class BadgeCache:
+    """
+    LRU of badge responses in front of the content-addressed store.
+
+    Usage:
+        badge, source = await badge_cache.get_or_generate(title, generate)
+        # source: memory | disk | generated | joined (waited on another request's generation)
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if BadgeCache._initialized:
+            return
+
+        self.max_size = BADGE_CACHE_SIZE
+        self.style_version = BADGE_STYLE_VERSION
+        self._data: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = SingleFlight()
+        self._store: Optional[_ContentStore] = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.joined = 0
+        self.failures = 0
+        self.generate_ms = 0.0
+
+        if BADGE_CACHE_DIR and self.max_size > 0:
+            try:
+                self._store = _ContentStore(BADGE_CACHE_DIR, BADGE_CACHE_DIR_MAX_MB * 2 ** 20)
+            except OSError as e:
+                logger.warning("badge cache dir %s unusable, memory only: %s", BADGE_CACHE_DIR, e)
+
+        BadgeCache._initialized = True
+
+    @staticmethod
+    def normalize_title(title: str) -> str:
+        """Case, width and whitespace insensitive form of a DNA title."""
+        return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", title)).strip().casefold()
+
+    def key(self, title: str) -> str:
+        """Cache key of the badge for `title` under the current style and output encoding."""
+        material = "\x00".join([
+            self.normalize_title(title),
+            self.style_version,
+            DNA_IMAGE_BACKGROUND,
+            DNA_IMAGE_FORMAT,
+            ",".join(str(size) for size in DNA_IMAGE_SIZES),
+        ])
+        return hashlib.blake2b(material.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _remember(self, key: str, badge: Dict[str, Any]) -> None:
+        with self._lock:
+            self._data[key] = badge
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def get(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """(badge, "memory" | "disk") or (None, None). Blocking; see get_async on the event loop."""
+        if self.max_size <= 0:
+            return None, None
+        badge = self._get_memory(key)
+        if badge is not None:
+            return badge, "memory"
+        badge = self._get_disk(key)
+        if badge is not None:
+            return badge, "disk"
+        return None, None
+
+    async def get_async(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """get() with the store lookup in a worker thread."""
+        if self.max_size <= 0:
+            return None, None
+        badge = self._get_memory(key)
+        if badge is not None:
+            return badge, "memory"
+        if self._store is None:
+            return None, None
+        badge = await asyncio.to_thread(self._get_disk, key)
+        if badge is not None:
+            return badge, "disk"
+        return None, None
+
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            badge = self._data.get(key)
+            if badge is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+            return badge
+
+    def _get_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        badge = self._load(key)
+        if badge is not None:
+            self._remember(key, badge)
+            with self._lock:
+                self.disk_hits += 1
+        return badge
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        if self._store is None:
+            return None
+        manifest = self._store.get_manifest(key)
+        if manifest is None:
+            return None
+
+        images = {}
+        for size, digest in manifest["objects"].items():
+            data = self._store.get_object(digest)
+            if data is None:
+                # object lost (manual cleanup); treat the whole badge as a miss
+                return None
+            images[size] = data
+
+        return {
+            "background_hex": manifest["background_hex"],
+            "image_format": manifest["image_format"],
+            "sizes": manifest["sizes"],
+            "images": images,
+            "digests": manifest["objects"],
+        }
+
+    def put(self, key: str, title: str, badge: Dict[str, Any]) -> None:
+        """Remember `badge` and write it to the store. Blocking; see put_async on the event loop."""
+        if self.max_size <= 0:
+            return
+
+        self._remember(key, badge)
+        if self._store is not None:
+            self._persist(key, title, badge)
+
+    async def put_async(self, key: str, title: str, badge: Dict[str, Any]) -> None:
+        """put() with the store write in a worker thread."""
+        if self.max_size <= 0:
+            return
+
+        self._remember(key, badge)
+        if self._store is not None:
+            await asyncio.to_thread(self._persist, key, title, badge)
+
+    def _persist(self, key: str, title: str, badge: Dict[str, Any]) -> None:
+        try:
+            for size in badge["sizes"]:
+                self._store.put_object(badge["images"][size], badge["digests"][size])
+            self._store.put_manifest(key, {
+                "title": title,
+                "style_version": self.style_version,
+                "background_hex": badge["background_hex"],
+                "image_format": badge["image_format"],
+                "sizes": badge["sizes"],
+                "objects": badge["digests"],
+                "created_at": int(time.time()),
+            })
+            self._store.maybe_sweep()
+        except OSError as e:
+            # the badge is still served and kept in memory
+            logger.warning("badge cache write failed for %r: %s", title, e)
+
+    def get_asset(self, handle: str) -> Optional[bytes]:
+        """Image bytes for a handle (sha256 digest), or None. Blocking; see get_asset_async."""
+        if not _HANDLE.match(handle):
+            return None
+        if self._store is not None:
+            data = self._store.get_object(handle)
+            if data is not None:
+                return data
+
+        with self._lock:
+            for badge in self._data.values():
+                for size, digest in badge["digests"].items():
+                    if digest == handle:
+                        return badge["images"][size]
+        return None
+
+    async def get_asset_async(self, handle: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self.get_asset, handle)
+
+    async def get_or_generate(
+        self,
+        title: str,
+        generate: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Tuple[Dict[str, Any], str]:
+        """Cached badge for `title`, or the result of one shared `generate()` call."""
+        key = self.key(title)
+        badge, source = await self.get_async(key)
+        if badge is not None:
+            return badge, source
+
+        badge, joined = await self._inflight.run(key, lambda: self._generate(key, title, generate))
+        if joined:
+            self.joined += 1
+        return badge, "joined" if joined else "generated"
+
+    async def _generate(
+        self,
+        key: str,
+        title: str,
+        generate: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        self.misses += 1
+        started = time.perf_counter()
+        try:
+            badge = await generate()
+            self.generate_ms += (time.perf_counter() - started) * 1000
+            await self.put_async(key, title, badge)
+            return badge
+        except BaseException:
+            self.failures += 1
+            raise
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        generated = self.misses - self.failures
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "style_version": self.style_version,
+                "disk": str(self._store.dir) if self._store is not None else None,
+                "disk_max_mb": BADGE_CACHE_DIR_MAX_MB if self._store is not None else None,
+                "disk_swept_mb": round(self._store.swept / 2 ** 20, 1) if self._store is not None else None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "joined": self.joined,
+                "failures": self.failures,
+                "avg_generate_ms": round(self.generate_ms / generated, 1) if generated > 0 else None,
+            }
+
+
+# Singleton instance - import and use this
+badge_cache = BadgeCache()
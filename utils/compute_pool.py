@@ -0,0 +1,230 @@
+"""
+Compute Offload Pool - run CPU-bound model work off the event loop
+
+Sentence-transformer encodes and sklearn fits are synchronous and would
+otherwise block every other request on the worker's event loop (including
+/health). Handlers submit that work here per stage (rembg has its own
+worker, see utils.rembg_pool):
+
+    vectors = await compute_pool.run("dna.label_embeddings", DNAService._encode_label_titles, titles)
+    shortlist = await compute_pool.run_local("dna.shortlist", DNAService._build_shortlist, ctx, 30)
+
+run_local is for jobs over large or stateful arguments that should not be
+pickled (the DNA embedding context, catalog label matrices): they run on
+threads of this process whatever the pool kind, under the same
+COMPUTE_POOL_MAX_PENDING bound and stats. Robyn workers load their own
+models at startup (model_lifecycle.start), so these jobs need nothing the
+process pool would have added.
+
+Configuration (env):
+    COMPUTE_POOL_KIND         thread | process | inline (default: thread)
+    COMPUTE_POOL_WORKERS      worker count (default: cpu count)
+    COMPUTE_POOL_MAX_PENDING  max submitted-but-unfinished jobs before rejecting (default: 64)
+    COMPUTE_POOL_RETRY_AFTER  seconds clients are told to wait after a rejection (default: 2)
+    COMPUTE_POOL_MP_START     multiprocessing start method for process kind (default: platform default)
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from utils.service_profile import SERVICE_PROFILE, preload
+
+logger = logging.getLogger(__name__)
+
+COMPUTE_POOL_KIND = os.getenv("COMPUTE_POOL_KIND", "thread").lower()
+COMPUTE_POOL_WORKERS = int(os.getenv("COMPUTE_POOL_WORKERS", str(os.cpu_count() or 2)))
+COMPUTE_POOL_MAX_PENDING = int(os.getenv("COMPUTE_POOL_MAX_PENDING", "64"))
+COMPUTE_POOL_MP_START = os.getenv("COMPUTE_POOL_MP_START", "")
+COMPUTE_POOL_RETRY_AFTER = int(os.getenv("COMPUTE_POOL_RETRY_AFTER", "2"))
+
+
+class ComputePoolFullError(RuntimeError):
+    """Raised when the pool already holds COMPUTE_POOL_MAX_PENDING jobs; controllers answer 503."""
+
+    def __init__(self, message: str, retry_after: int = COMPUTE_POOL_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _preload_models(profile: str) -> None:
+    # only the services this pod's SERVICE_PROFILE serves; they register their models on import
+    from utils.model_lifecycle import model_lifecycle
+
+    preload(profile)
+    # load and warm them before taking jobs
+    model_lifecycle.load_all()
+
+
+def _noop(_: int) -> int:
+    return os.getpid()
+
+
+class ComputePool:
+    """
+    Bounded executor for CPU-bound stages.
+
+    Thread kind shares the already-loaded models with the handlers; process
+    kind gives each worker its own interpreter with the models preloaded by
+    the pool initializer, which sidesteps the GIL on the regular build.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if ComputePool._initialized:
+            return
+
+        self.kind = COMPUTE_POOL_KIND
+        self.workers = max(1, COMPUTE_POOL_WORKERS)
+        self.max_pending = max(1, COMPUTE_POOL_MAX_PENDING)
+
+        self._executor: Optional[Executor] = None
+        # run_local jobs when the main executor is a process pool
+        self._local_executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+        ComputePool._initialized = True
+
+    def start(self) -> None:
+        """Create the executor. Process workers are spun up and preloaded eagerly."""
+        with self._lock:
+            if self._executor is not None or self.kind == "inline":
+                return
+
+            if self.kind == "process":
+                mp_context = multiprocessing.get_context(COMPUTE_POOL_MP_START or None)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=mp_context,
+                    initializer=_preload_models,
+                    initargs=(SERVICE_PROFILE,),
+                )
+            elif self.kind == "thread":
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="compute",
+                )
+            else:
+                raise ValueError(f"Unsupported COMPUTE_POOL_KIND: {self.kind}")
+
+        if self.kind == "process":
+            # force every worker through the initializer before traffic arrives
+            pids = set(self._executor.map(_noop, range(self.workers)))
+            logger.info("compute pool ready: %s process workers %s", len(pids), sorted(pids))
+        else:
+            logger.info("compute pool ready: %s %s workers", self.workers, self.kind)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executors = (self._executor, self._local_executor)
+            self._executor = self._local_executor = None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=wait)
+
+    def _local(self) -> Executor:
+        """Thread executor in this process: the main one for thread kind, a separate one for process kind."""
+        if self.kind == "thread":
+            if self._executor is None:
+                self.start()
+            return self._executor
+        with self._lock:
+            if self._local_executor is None:
+                self._local_executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="compute-local",
+                )
+            return self._local_executor
+
+    def _acquire(self, stage: str) -> None:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ComputePoolFullError(
+                    f"compute pool full ({self._pending} pending), rejected stage '{stage}'"
+                )
+            self._pending += 1
+
+    def _release(self, stage: str, elapsed_ms: float) -> None:
+        with self._lock:
+            self._pending -= 1
+            stat = self._stats.setdefault(stage, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stat["calls"] += 1
+            stat["total_ms"] += elapsed_ms
+            stat["max_ms"] = max(stat["max_ms"], elapsed_ms)
+
+    async def run(self, stage: str, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run `fn(*args, **kwargs)` on the pool and await its result.
+
+        Args:
+            stage: Label used for stats and logs (e.g. 'identifi.score')
+            fn: Picklable callable when the pool kind is 'process'
+
+        Raises:
+            ComputePoolFullError: If the pool is at COMPUTE_POOL_MAX_PENDING
+        """
+        return await self._run(stage, False, fn, *args, **kwargs)
+
+    async def run_local(self, stage: str, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Like run(), but always on a thread of this process: arguments are
+        shared, never pickled, and what `fn` caches on them stays visible
+        to later stages.
+
+        Raises:
+            ComputePoolFullError: If the pool is at COMPUTE_POOL_MAX_PENDING
+        """
+        return await self._run(stage, True, fn, *args, **kwargs)
+
+    async def _run(self, stage: str, local: bool, fn: Callable, *args, **kwargs) -> Any:
+        self._acquire(stage)
+        t0 = time.perf_counter()
+        try:
+            if self.kind == "inline":
+                return fn(*args, **kwargs)
+
+            if local:
+                executor = self._local()
+            else:
+                if self._executor is None:
+                    self.start()
+                executor = self._executor
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                executor, functools.partial(fn, *args, **kwargs)
+            )
+        finally:
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            self._release(stage, elapsed_ms)
+            logger.debug("compute stage %s finished in %.2f ms", stage, elapsed_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-stage call counts and latencies plus current queue depth."""
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "stages": {stage: dict(stat) for stage, stat in self._stats.items()},
+            }
+
+
+# Singleton instance - import and use this
+compute_pool = ComputePool()
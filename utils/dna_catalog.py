@@ -0,0 +1,339 @@
+"""
+DNA Catalog Store - server-side DNA label catalogs addressed by content hash
+
+/api/dna/generate needs the whole label catalog (unique_id and title lists,
+often hundreds of KB). A client registers the catalog once and then sends
+only its version:
+
+    catalog, created = dna_catalog.register(unique_ids, titles)   # POST /api/dna/catalog
+    catalog = dna_catalog.get(payload.catalog_version)             # /api/dna/generate
+
+The version is a hash of both lists in order, so registering the same
+catalog twice returns the same version and any edit yields a new one.
+Structures derived from a catalog (title maps, label index rows, shortlist
+index) are built once per version and process and shared by all requests:
+
+    title_to_uid = catalog.derived("title_to_uid", lambda: build(catalog.titles, catalog.unique_ids))
+
+Requests that still send the lists inline get the same sharing while the
+catalog stays in this process's LRU; they are never written to disk.
+
+Registered catalogs are stored as DNA_CATALOG_DIR/<version>.json, so every
+worker process on the host (and pods sharing the volume) can resolve a
+version; an unknown version is an UnknownCatalogError and the client
+registers again. Derived structures worth persisting (the shortlist ANN
+index) are saved next to it as DNA_CATALOG_DIR/<version>.<name>, see
+artifact_path(). Registering beyond DNA_CATALOG_DIR_MAX_FILES removes the
+least recently used catalogs and their artifacts from the directory.
+
+Configuration (env):
+    DNA_CATALOG_DIR            registered catalogs (default: ~/.cache/ai-reputation-service/catalogs,
+                               empty for memory only)
+    DNA_CATALOG_CACHE_SIZE     catalogs kept loaded per process (default: 32)
+    DNA_CATALOG_DIR_MAX_FILES  registered catalogs kept in DNA_CATALOG_DIR (default: 256)
+    DNA_CATALOG_MAX_LABELS     labels per registered catalog (default: 100000)
+    DNA_CATALOG_MAX_BYTES      POST /api/dna/catalog body size (default: 32MB)
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+from utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DNA_CATALOG_DIR = os.getenv(
+    "DNA_CATALOG_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "ai-reputation-service", "catalogs"),
+)
+DNA_CATALOG_CACHE_SIZE = max(1, int(os.getenv("DNA_CATALOG_CACHE_SIZE", "32")))
+DNA_CATALOG_DIR_MAX_FILES = max(1, int(os.getenv("DNA_CATALOG_DIR_MAX_FILES", "256")))
+DNA_CATALOG_MAX_LABELS = int(os.getenv("DNA_CATALOG_MAX_LABELS", "100000"))
+DNA_CATALOG_MAX_BYTES = int(os.getenv("DNA_CATALOG_MAX_BYTES", str(32 * 1024 * 1024)))
+
+_VERSION = re.compile(r"^[0-9a-f]{32}$")
+# a catalog file's mtime is its last use; refreshed at most this often
+_TOUCH_SECONDS = 3600
+
+
+class UnknownCatalogError(ValueError):
+    """Raised when a catalog_version is malformed or not registered."""
+
+
+class DNACatalog:
+    """One catalog version: the label lists plus structures derived from them."""
+
+    def __init__(self, version: str, unique_ids: List[str], titles: List[str], registered: bool, created_at: int):
+        self.version = version
+        self.unique_ids = unique_ids
+        self.titles = titles
+        self.registered = registered
+        self.created_at = created_at
+        self.touched_at = time.time()
+        self._derived: Dict[str, Any] = {}
+        self._inflight = SingleFlight()
+        self._lock = threading.Lock()
+
+    def derived(self, name: str, build: Callable[[], Any]) -> Any:
+        """`build()` once per catalog; concurrent first callers may both build, the first result is kept."""
+        with self._lock:
+            if name in self._derived:
+                return self._derived[name]
+        value = build()
+        with self._lock:
+            return self._derived.setdefault(name, value)
+
+    async def derived_async(self, name: str, build: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async variant of derived() for structures built on the compute pool;
+        concurrent first callers on one event loop share a single build.
+        """
+        with self._lock:
+            if name in self._derived:
+                return self._derived[name]
+
+        async def build_and_keep() -> Any:
+            value = await build()
+            with self._lock:
+                return self._derived.setdefault(name, value)
+
+        value, _ = await self._inflight.run(name, build_and_keep)
+        return value
+
+    def discard(self, name: str, value: Any) -> None:
+        """Drop a derived structure that went stale, unless it was rebuilt meanwhile."""
+        with self._lock:
+            if self._derived.get(name) is value:
+                del self._derived[name]
+
+    def peek(self, name: str) -> Optional[Any]:
+        """A derived structure if already built, without building it."""
+        with self._lock:
+            return self._derived.get(name)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            derived = sorted(self._derived)
+        return {
+            "catalog_version": self.version,
+            "registered": self.registered,
+            "created_at": self.created_at,
+            "labels": len(set(self.unique_ids)),
+            "titles": len(self.titles),
+            "duplicate_titles": len(self.titles) - len(set(self.titles)),
+            "derived": derived,
+        }
+
+
+class DNACatalogStore:
+    """
+    LRU of loaded catalogs in front of the on-disk registry.
+
+    Usage:
+        catalog, created = dna_catalog.register(unique_ids, titles)
+        catalog = dna_catalog.get(version)
+        catalog = dna_catalog.inline(unique_ids, titles)
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if DNACatalogStore._initialized:
+            return
+
+        self.max_size = DNA_CATALOG_CACHE_SIZE
+        self.max_files = DNA_CATALOG_DIR_MAX_FILES
+        self._data: "OrderedDict[str, DNACatalog]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dir: Optional[Path] = None
+
+        self.hits = 0
+        self.disk_loads = 0
+        self.inline_builds = 0
+        self.files_removed = 0
+
+        if DNA_CATALOG_DIR:
+            try:
+                self._dir = Path(DNA_CATALOG_DIR)
+                self._dir.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                logger.warning("dna catalog dir %s unusable, memory only: %s", DNA_CATALOG_DIR, e)
+                self._dir = None
+
+        DNACatalogStore._initialized = True
+
+    @staticmethod
+    def version_of(unique_ids: List[str], titles: List[str]) -> str:
+        material = orjson.dumps({"unique_id": unique_ids, "title": titles})
+        return hashlib.blake2b(material, digest_size=16).hexdigest()
+
+    @staticmethod
+    def _validate(unique_ids: List[str], titles: List[str]) -> None:
+        if not unique_ids:
+            raise ValueError("catalog must contain at least one label")
+        if len(unique_ids) > DNA_CATALOG_MAX_LABELS:
+            raise ValueError(f"catalog must contain at most {DNA_CATALOG_MAX_LABELS} labels ({len(unique_ids)})")
+        if len(unique_ids) != len(titles):
+            raise ValueError(f"unique_id and title must have the same length ({len(unique_ids)} != {len(titles)})")
+
+    def _remember(self, catalog: DNACatalog) -> DNACatalog:
+        with self._lock:
+            current = self._data.get(catalog.version)
+            # keep the instance other requests already derived structures on
+            if current is not None and (current.registered or not catalog.registered):
+                catalog = current
+            self._data[catalog.version] = catalog
+            self._data.move_to_end(catalog.version)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return catalog
+
+    def _cached(self, version: str) -> Optional[DNACatalog]:
+        with self._lock:
+            catalog = self._data.get(version)
+            if catalog is not None:
+                self._data.move_to_end(version)
+                self.hits += 1
+            return catalog
+
+    def _path(self, version: str) -> Path:
+        return self._dir / f"{version}.json"
+
+    def _touch(self, catalog: DNACatalog) -> None:
+        """Mark a registered catalog's file as used, so the directory sweep keeps it."""
+        now = time.time()
+        if self._dir is None or now - catalog.touched_at < _TOUCH_SECONDS:
+            return
+        catalog.touched_at = now
+        try:
+            os.utime(self._path(catalog.version))
+        except OSError:
+            # removed by another process's sweep; the next get() from there re-registers
+            pass
+
+    def _sweep(self) -> None:
+        """Remove the least recently used catalog files and their artifacts beyond max_files."""
+        catalogs = []
+        for path in self._dir.glob("*.json"):
+            if not _VERSION.match(path.stem):
+                continue
+            try:
+                catalogs.append((path.stat().st_mtime, path.stem))
+            except FileNotFoundError:
+                continue
+        catalogs.sort()
+
+        for _, version in catalogs[:max(0, len(catalogs) - self.max_files)]:
+            for path in self._dir.glob(f"{version}.*"):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            with self._lock:
+                self.files_removed += 1
+            logger.info("dna catalog %s removed from %s", version, self._dir)
+
+    def artifact_path(self, catalog: DNACatalog, name: str) -> Optional[Path]:
+        """File for a structure derived from a registered catalog; None when it can only live in memory."""
+        if self._dir is None or not catalog.registered:
+            return None
+        return self._dir / f"{catalog.version}.{name}"
+
+    def register(self, unique_ids: List[str], titles: List[str]) -> Tuple[DNACatalog, bool]:
+        """(catalog, created): created is False when the version was already registered."""
+        self._validate(unique_ids, titles)
+        version = self.version_of(unique_ids, titles)
+        cached = self._cached(version)
+        if cached is not None and cached.registered:
+            self._touch(cached)
+            return cached, False
+
+        if self._dir is not None and self._path(version).exists():
+            return self.get(version), False
+
+        catalog = DNACatalog(version, list(unique_ids), list(titles), registered=True, created_at=int(time.time()))
+        if self._dir is not None:
+            try:
+                path = self._path(version)
+                tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp_path.write_bytes(orjson.dumps({
+                    "catalog_version": version,
+                    "unique_id": catalog.unique_ids,
+                    "title": catalog.titles,
+                    "created_at": catalog.created_at,
+                }))
+                tmp_path.replace(path)
+                self._sweep()
+            except OSError as e:
+                # still usable from this process
+                logger.warning("dna catalog write failed for %s: %s", version, e)
+        return self._remember(catalog), True
+
+    def get(self, version: str) -> DNACatalog:
+        """Registered catalog by version; raises UnknownCatalogError."""
+        if not isinstance(version, str) or not _VERSION.match(version):
+            raise UnknownCatalogError(f"malformed catalog_version: {version!r}")
+
+        catalog = self._cached(version)
+        if catalog is not None and catalog.registered:
+            self._touch(catalog)
+            return catalog
+
+        if self._dir is not None:
+            try:
+                path = self._path(version)
+                doc = orjson.loads(path.read_bytes())
+                os.utime(path)
+            except FileNotFoundError:
+                doc = None
+            if doc is not None:
+                with self._lock:
+                    self.disk_loads += 1
+                return self._remember(DNACatalog(
+                    version, doc["unique_id"], doc["title"], registered=True, created_at=doc["created_at"]
+                ))
+        raise UnknownCatalogError(f"unknown catalog_version: {version}")
+
+    def inline(self, unique_ids: List[str], titles: List[str]) -> DNACatalog:
+        """Catalog for lists sent with the request, shared while it stays loaded."""
+        version = self.version_of(unique_ids, titles)
+        catalog = self._cached(version)
+        if catalog is not None:
+            return catalog
+        with self._lock:
+            self.inline_builds += 1
+        return self._remember(DNACatalog(
+            version, list(unique_ids), list(titles), registered=False, created_at=int(time.time())
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "loaded": len(self._data),
+                "max_size": self.max_size,
+                "disk": str(self._dir) if self._dir is not None else None,
+                "max_files": self.max_files,
+                "files_removed": self.files_removed,
+                "hits": self.hits,
+                "disk_loads": self.disk_loads,
+                "inline_builds": self.inline_builds,
+            }
+
+
+# Singleton instance - import and use this
+dna_catalog = DNACatalogStore()
@@ -0,0 +1,391 @@
+"""
+Per-Tweet Feature Cache - reuse tweet features across requests
+
+Users are rescored repeatedly and their timelines overlap almost entirely
+between calls, so cleaned text, language, readability, link-spam and MiniLM
+embeddings are cached per tweet. Entries are keyed by tweet id plus a hash of
+the exact text the features were derived from, so an edited tweet (or the
+same tweet seen through a different cleaning step) never reuses stale data.
+
+Embeddings are stored as float16. An optional memory-mapped disk tier keeps
+entries across restarts.
+
+Configuration (env):
+    FEATURE_CACHE_SIZE       max in-memory entries (default: 100000, 0 disables)
+    FEATURE_CACHE_DIR        directory for the disk tier (default: unset, memory only)
+    FEATURE_CACHE_DISK_ROWS  entries (and embedding rows) kept on disk, least recently
+                             used evicted first (default: 500000)
+
+The disk tier assumes one writer per directory; give each process its own
+directory when COMPUTE_POOL_KIND=process.
+"""
+
+import atexit
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import orjson
+
+logger = logging.getLogger(__name__)
+
+FEATURE_CACHE_SIZE = int(os.getenv("FEATURE_CACHE_SIZE", "100000"))
+FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "")
+FEATURE_CACHE_DISK_ROWS = int(os.getenv("FEATURE_CACHE_DISK_ROWS", "500000"))
+
+# flush the disk index after this many changed entries
+_FLUSH_EVERY = 1000
+# rewrite the index log once it holds this many times more records than live entries
+_COMPACT_RATIO = 3
+
+
+class _DiskTier:
+    """
+    Memory-mapped float16 embedding rows plus an append-only index log.
+
+    At most `rows` entries are kept; the least recently used one is evicted
+    and its embedding row reused. index.jsonl starts with a header carrying
+    the matrix shape, followed by one [key, entry] record per change
+    ([key, null] for an eviction); the latest record per key wins.
+    """
+
+    def __init__(self, directory: str, rows: int):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.rows = max(1, rows)
+        self.index_path = self.dir / "index.jsonl"
+        self.matrix_path = self.dir / "embeddings.f16"
+
+        self.dim: Optional[int] = None
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.free_rows: List[int] = []
+        self.next_row = 0
+        self.matrix: Optional[np.memmap] = None
+
+        # changes not yet written; swapped out under the cache lock, written outside it
+        self._pending: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._log_records = 0
+        self._logged_dim: Optional[int] = None
+        # no usable header on disk (missing, rejected or unreadable index): the first flush rewrites it
+        self._log_valid = False
+        self._write_lock = threading.Lock()
+
+        try:
+            self._load()
+        except Exception as e:
+            logger.warning("feature cache index unreadable, starting empty: %s", e)
+            self.dim, self.matrix, self._logged_dim, self._log_records = None, None, None, 0
+            self.entries.clear()
+        self._reset_rows()
+
+    def _load(self) -> None:
+        if not self.index_path.exists():
+            return
+        lines = self.index_path.read_bytes().splitlines()
+        if not lines:
+            return
+        header = orjson.loads(lines[0])
+        if header["rows"] != self.rows:
+            logger.warning(
+                "feature cache %s was built with %s rows, FEATURE_CACHE_DISK_ROWS is %s; starting empty",
+                self.dir, header["rows"], self.rows,
+            )
+            return
+
+        dim = header["dim"]
+        if dim is not None:
+            expected = self.rows * dim * np.dtype(np.float16).itemsize
+            if not self.matrix_path.exists() or self.matrix_path.stat().st_size != expected:
+                logger.warning("feature cache %s embeddings do not match the index, starting empty", self.dir)
+                return
+
+        for line in lines[1:]:
+            try:
+                key, entry = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # torn tail from a process that died mid-append
+                break
+            self.entries.pop(key, None)
+            if entry is not None:
+                self.entries[key] = entry
+        while len(self.entries) > self.rows:
+            self.entries.popitem(last=False)
+
+        if dim is not None:
+            self.dim = dim
+            self.matrix = np.memmap(self.matrix_path, dtype=np.float16, mode="r+", shape=(self.rows, dim))
+        self._logged_dim = dim
+        self._log_records = len(lines) - 1
+        self._log_valid = True
+
+    def _reset_rows(self) -> None:
+        used = {entry["row"] for entry in self.entries.values() if entry.get("row") is not None}
+        self.next_row = max(used) + 1 if used else 0
+        self.free_rows = [row for row in range(self.next_row) if row not in used]
+
+    def _ensure_matrix(self, dim: int) -> None:
+        if self.matrix is None:
+            self.dim = dim
+            self.matrix = np.memmap(self.matrix_path, dtype=np.float16, mode="w+", shape=(self.rows, dim))
+
+    def _allocate_row(self) -> int:
+        if self.free_rows:
+            return self.free_rows.pop()
+        self.next_row += 1
+        return self.next_row - 1
+
+    def _evict(self) -> None:
+        key, entry = self.entries.popitem(last=False)
+        if entry.get("row") is not None:
+            self.free_rows.append(entry["row"])
+        self._pending[key] = None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+
+        fields = {k: v for k, v in entry.items() if k != "row"}
+        row = entry.get("row")
+        if row is not None and self.matrix is not None:
+            fields["embedding"] = np.array(self.matrix[row])
+        return fields
+
+    def put(self, key: str, fields: Dict[str, Any]) -> None:
+        # copy on write: a flush may be serializing the previous dict outside the lock
+        entry = dict(self.entries.get(key, {}))
+        for name, value in fields.items():
+            if name != "embedding":
+                entry[name] = value
+
+        if key not in self.entries and len(self.entries) >= self.rows:
+            self._evict()
+
+        embedding = fields.get("embedding")
+        if embedding is not None and entry.get("row") is None:
+            self._ensure_matrix(embedding.shape[-1])
+            entry["row"] = self._allocate_row()
+            self.matrix[entry["row"]] = embedding
+
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        self._pending[key] = entry
+
+    def due(self) -> bool:
+        return len(self._pending) >= _FLUSH_EVERY
+
+    def flush(self, cache_lock: threading.Lock, wait: bool = True) -> None:
+        """
+        Write pending changes. Only the hand-off runs under `cache_lock`;
+        serialization and disk I/O happen outside it. With wait=False a
+        flush already in progress is left to finish the job.
+        """
+        if not self._write_lock.acquire(blocking=wait):
+            return
+        try:
+            with cache_lock:
+                pending, self._pending = self._pending, {}
+                compact = (
+                    not self._log_valid
+                    or self.dim != self._logged_dim
+                    or self._log_records + len(pending) > _COMPACT_RATIO * max(len(self.entries), _FLUSH_EVERY)
+                )
+                # entry dicts are never mutated in place, so a shallow copy is a consistent snapshot
+                snapshot = list(self.entries.items()) if compact else None
+                dim = self.dim
+            if not pending and not compact:
+                return
+
+            if self.matrix is not None:
+                self.matrix.flush()
+            if compact:
+                self._rewrite(dim, snapshot)
+            else:
+                with open(self.index_path, "ab") as log:
+                    log.write(b"".join(orjson.dumps([key, entry]) + b"\n" for key, entry in pending.items()))
+                self._log_records += len(pending)
+        finally:
+            self._write_lock.release()
+
+    def _rewrite(self, dim: Optional[int], snapshot: list) -> None:
+        tmp_path = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as index:
+            index.write(orjson.dumps({"rows": self.rows, "dim": dim}) + b"\n")
+            index.write(b"".join(orjson.dumps([key, entry]) + b"\n" for key, entry in snapshot))
+        tmp_path.replace(self.index_path)
+        self._logged_dim = dim
+        self._log_records = len(snapshot)
+        self._log_valid = True
+
+
+class FeatureCache:
+    """
+    Bounded LRU of per-tweet features shared by IdentifiScore and DNAService.
+
+    Usage:
+        key = feature_cache.key(tweet.id, text)
+        score = feature_cache.get_or_compute(key, "readability", lambda: ...)
+        embs = feature_cache.encode(keys, texts, embedder)
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if FeatureCache._initialized:
+            return
+
+        self.max_size = FEATURE_CACHE_SIZE
+        self._data: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk: Optional[_DiskTier] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+
+        if FEATURE_CACHE_DIR and self.max_size > 0:
+            self._disk = _DiskTier(FEATURE_CACHE_DIR, FEATURE_CACHE_DISK_ROWS)
+            atexit.register(self.flush)
+
+        FeatureCache._initialized = True
+
+    @staticmethod
+    def key(tweet_id: str, text: str) -> str:
+        """Cache key for the features of `text` as it appears in tweet `tweet_id`."""
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+        return f"{tweet_id}:{digest}"
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        # caller holds the lock
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data.move_to_end(key)
+            return entry
+
+        if self._disk is not None:
+            entry = self._disk.get(key)
+            if entry is not None:
+                self.disk_hits += 1
+                self._store(key, entry)
+                return entry
+        return None
+
+    def _store(self, key: str, entry: Dict[str, Any]) -> None:
+        # caller holds the lock
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str, field: str) -> Any:
+        """Cached value of `field` for `key`, or None. Counts a hit or a miss."""
+        if self.max_size <= 0:
+            return None
+
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None and field in entry:
+                self.hits += 1
+                return entry[field]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, **fields) -> None:
+        """Merge `fields` into the entry for `key`."""
+        if self.max_size <= 0:
+            return
+
+        if "embedding" in fields and fields["embedding"] is not None:
+            fields["embedding"] = np.asarray(fields["embedding"], dtype=np.float16)
+
+        flush_due = False
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                entry = {}
+            entry.update(fields)
+            self._store(key, entry)
+            if self._disk is not None:
+                self._disk.put(key, fields)
+                flush_due = self._disk.due()
+
+        if flush_due:
+            # another request may already be writing; it picks these changes up next time
+            self._disk.flush(self._lock, wait=False)
+
+    def get_or_compute(self, key: str, field: str, compute: Callable[[], Any]) -> Any:
+        value = self.get(key, field)
+        if value is None:
+            value = compute()
+            self.put(key, **{field: value})
+        return value
+
+    def encode(self, keys: List[str], texts: List[str], encoder, **kwargs) -> np.ndarray:
+        """
+        Normalized embeddings for `texts`, encoding only the cache misses in one call.
+
+        Args:
+            keys: Cache keys aligned with `texts`
+            texts: Texts to embed
+            encoder: Object with a SentenceTransformer-style `encode`
+
+        Returns:
+            float32 matrix of shape (len(texts), dim)
+        """
+        cached = [self.get(key, "embedding") for key in keys]
+        missing = [idx for idx, emb in enumerate(cached) if emb is None]
+
+        if missing:
+            fresh = encoder.encode(
+                [texts[idx] for idx in missing],
+                normalize_embeddings=True,
+                show_progress_bar=False,
+                **kwargs,
+            )
+            for idx, emb in zip(missing, fresh):
+                cached[idx] = np.asarray(emb, dtype=np.float16)
+                self.put(keys[idx], embedding=cached[idx])
+
+        if not cached:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(cached).astype(np.float32)
+
+    def flush(self) -> None:
+        """Write the disk tier index and embeddings to disk."""
+        if self._disk is None:
+            return
+        self._disk.flush(self._lock)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_hits": self.disk_hits,
+                "disk_entries": len(self._disk.entries) if self._disk is not None else 0,
+            }
+
+
+# Singleton instance - import and use this
+feature_cache = FeatureCache()
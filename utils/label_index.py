@@ -0,0 +1,449 @@
+"""
+Label Embedding Index - reuse DNA catalog title embeddings across requests
+
+Every /api/dna/generate call carries the full catalog of titles. The index
+keeps one normalized embedding per distinct title (keyed by a hash of the
+exact text) in a contiguous matrix; a request's label matrix is a gather of
+cached rows, and only titles never seen before are encoded:
+
+    label_embeddings = label_index.encode(label_titles, embedder, namespace="all-MiniLM-L6-v2:torch")
+
+Long-lived holders (DNA catalogs) keep only row numbers and gather the
+matrix when a request needs it; requests running at the same time share
+one gathered matrix, freed once the last of them is done:
+
+    label_rows, missing = label_index.lookup(titles, namespace)   # missing: key -> title to encode
+    label_index.add(namespace, list(missing), vectors)
+    label_embeddings = label_index.gather(label_rows)             # None once the rows were dropped
+
+`namespace` names the embedding model/backend; vectors from different
+models never mix. A namespace holds at most LABEL_INDEX_MAX_ROWS rows; the
+title that would overflow it drops all rows and starts a new generation,
+so row numbers stay valid until the next reset.
+
+With LABEL_INDEX_DIR set, each namespace persists as
+
+    <dir>/<namespace>/labels.f32          raw rows (labels.f16 for float16), read back with np.memmap
+    <dir>/<namespace>/labels.f32.keys     append-only log: a header line (dim, dtype, generation),
+                                          then one JSON list of row keys per flush
+
+New rows are appended outside the index lock, under an exclusive file
+lock, so several worker processes (and pods sharing a volume) can write
+the same directory; each writer reads only the log lines added since its
+last flush. The files follow the same row limit. A process loads the rows
+on first use, so new pods start warm.
+
+Configuration (env):
+    LABEL_INDEX_DIR       directory for the persistent tier (default: unset, memory only)
+    LABEL_INDEX_DTYPE     float32 | float16 row storage (default: float32)
+    LABEL_INDEX_MAX_ROWS  rows kept per namespace, in memory and on disk (default: 200000)
+"""
+
+import atexit
+import fcntl
+import hashlib
+import logging
+import os
+import re
+import threading
+import weakref
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import orjson
+
+logger = logging.getLogger(__name__)
+
+LABEL_INDEX_DIR = os.getenv("LABEL_INDEX_DIR", "")
+LABEL_INDEX_DTYPE = os.getenv("LABEL_INDEX_DTYPE", "float32")
+LABEL_INDEX_MAX_ROWS = max(1, int(os.getenv("LABEL_INDEX_MAX_ROWS", "200000")))
+
+_UNSAFE_PATH = re.compile(r"[^A-Za-z0-9._-]+")
+_SUFFIX = {"float32": "f32", "float16": "f16"}
+
+
+class LabelRows:
+    """Row numbers of a title list in one namespace generation."""
+
+    __slots__ = ("namespace", "generation", "rows", "_shared")
+
+    def __init__(self, namespace: str, generation: int, rows: np.ndarray):
+        self.namespace = namespace
+        self.generation = generation
+        self.rows = rows
+        # the matrix last gathered for these rows, while some caller still holds it
+        self._shared: Optional[weakref.ref] = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class _LabelMatrix:
+    """Growable contiguous matrix of label embeddings plus key -> row, capped at `max_rows`."""
+
+    def __init__(self, dtype: str, directory: Optional[str], max_rows: int = LABEL_INDEX_MAX_ROWS):
+        self.dtype = np.dtype(dtype)
+        self.dir = Path(directory) if directory else None
+        self.max_rows = max(1, max_rows)
+        self.rows: Dict[str, int] = {}
+        self.matrix: Optional[np.ndarray] = None
+        self.size = 0
+        # bumped whenever the rows are dropped to stay under max_rows
+        self.generation = 0
+
+        # rows not yet written; swapped out under the index lock, written outside it
+        self._pending: List[Tuple[List[str], np.ndarray]] = []
+        self._write_lock = threading.Lock()
+        # what this process has read of the key log, only touched under _write_lock
+        self._stored: Set[str] = set()
+        self._log_offset = 0
+        self._log_generation: Optional[int] = None
+        self.saved = 0
+
+        if self.dir is not None:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            self.data_path = self.dir / f"labels.{_SUFFIX[dtype]}"
+            self.log_path = self.dir / f"labels.{_SUFFIX[dtype]}.keys"
+            self.lock_path = self.dir / "labels.lock"
+            self._load()
+
+    def _ensure_capacity(self, dim: int, needed: int) -> None:
+        if self.matrix is None:
+            self.matrix = np.empty((min(max(needed, 1024), self.max_rows), dim), dtype=self.dtype)
+        elif needed > len(self.matrix):
+            grown = np.empty((min(max(needed, 2 * len(self.matrix)), self.max_rows), dim), dtype=self.dtype)
+            grown[:self.size] = self.matrix[:self.size]
+            self.matrix = grown
+
+    def _append(self, keys: List[str], vectors: np.ndarray) -> None:
+        if self.size + len(keys) > self.max_rows:
+            # drop every row rather than single ones: rows handed out stay valid until the generation changes
+            logger.info("label index %s: %d rows reached the limit, starting over", self.dir, self.size)
+            self.rows, self.size = {}, 0
+            self.generation += 1
+            keys, vectors = keys[-self.max_rows:], vectors[-self.max_rows:]
+        self._ensure_capacity(vectors.shape[1], self.size + len(keys))
+        self.matrix[self.size:self.size + len(keys)] = vectors
+        for offset, key in enumerate(keys):
+            self.rows[key] = self.size + offset
+        self.size += len(keys)
+
+    def add(self, keys: List[str], vectors: np.ndarray) -> int:
+        """Append rows for keys not present yet; caller holds the index lock. Returns the rows added."""
+        fresh = [i for i, key in enumerate(keys) if key not in self.rows]
+        if fresh:
+            fresh_keys = [keys[i] for i in fresh]
+            fresh_vectors = np.asarray(vectors, dtype=self.dtype)[fresh]
+            self._append(fresh_keys, fresh_vectors)
+            if self.dir is not None:
+                self._pending.append((fresh_keys, fresh_vectors))
+        return len(fresh)
+
+    def _read_log(self, offset: int) -> Tuple[Optional[Dict[str, Any]], List[str], int]:
+        """(header when read from the start, keys, end of the last complete line) from `offset` on."""
+        try:
+            with open(self.log_path, "rb") as log:
+                log.seek(offset)
+                chunk = log.read()
+        except FileNotFoundError:
+            return None, [], 0
+
+        header, keys, end = None, [], offset
+        for line in chunk.splitlines(keepends=True):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("torn line")
+                record = orjson.loads(line)
+            except ValueError:
+                # torn tail from a writer that died mid-append
+                break
+            if isinstance(record, dict):
+                header = record
+            else:
+                keys.extend(record)
+            end += len(line)
+        return header, keys, end
+
+    def _load(self) -> None:
+        try:
+            header, keys, end = self._read_log(0)
+            if header is None:
+                return
+            row_bytes = header["dim"] * self.dtype.itemsize
+            if self.data_path.stat().st_size < len(keys) * row_bytes:
+                raise ValueError("data file shorter than its key log")
+            self._stored, self._log_offset, self._log_generation = set(keys), end, header["generation"]
+            self.saved = len(keys)
+            if not keys:
+                return
+            stored = np.memmap(self.data_path, dtype=self.dtype, mode="r", shape=(len(keys), header["dim"]))
+            # newest rows when LABEL_INDEX_MAX_ROWS was lowered since they were written
+            self._append(keys[-self.max_rows:], stored[-self.max_rows:])
+            logger.info("label index %s: loaded %d rows", self.dir, self.size)
+        except Exception as e:
+            logger.warning("label index %s unreadable, starting empty: %s", self.dir, e)
+            self.rows, self.matrix, self.size = {}, None, 0
+            self._stored, self._log_offset, self._log_generation, self.saved = set(), 0, None, 0
+
+    def _read_header(self) -> Tuple[Optional[Dict[str, Any]], int]:
+        try:
+            with open(self.log_path, "rb") as log:
+                first = log.readline()
+            header = orjson.loads(first)
+        except (FileNotFoundError, ValueError):
+            return None, 0
+        return (header, len(first)) if isinstance(header, dict) and first.endswith(b"\n") else (None, 0)
+
+    def _start_log(self, dim: int, generation: int) -> None:
+        # caller holds the file lock; the log goes first, so a crash never leaves keys without rows
+        header = orjson.dumps({"dim": dim, "dtype": self.dtype.name, "generation": generation}) + b"\n"
+        tmp_path = self.log_path.with_name(f".{self.log_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(header)
+        tmp_path.replace(self.log_path)
+        with open(self.data_path, "wb"):
+            pass
+        self._stored, self._log_offset, self._log_generation = set(), len(header), generation
+
+    def _sync_log(self, dim: int) -> None:
+        """Catch up with rows other writers stored since our last flush; caller holds the file lock."""
+        header, header_end = self._read_header()
+        if header is None or header["dim"] != dim:
+            self._start_log(dim, (header["generation"] if header else 0) + 1)
+            return
+        if header["generation"] != self._log_generation:
+            # another writer started a new generation
+            self._stored, self._log_offset, self._log_generation = set(), header_end, header["generation"]
+
+        _, keys, end = self._read_log(self._log_offset)
+        self._stored.update(keys)
+        self._log_offset = end
+        row_bytes = dim * self.dtype.itemsize
+        try:
+            data_size = self.data_path.stat().st_size
+        except FileNotFoundError:
+            data_size = 0
+        if data_size < len(self._stored) * row_bytes:
+            logger.warning("label index %s: data file shorter than its key log, starting over", self.dir)
+            self._start_log(dim, header["generation"] + 1)
+            return
+        # drop torn tails: bytes past the last complete log line, rows past the last logged key
+        os.truncate(self.log_path, end)
+        os.truncate(self.data_path, len(self._stored) * row_bytes)
+
+    def flush(self, index_lock: threading.Lock, wait: bool = True) -> None:
+        """
+        Append pending rows no other writer has stored yet. Only the hand-off
+        runs under `index_lock`. With wait=False a flush already in progress
+        is left to pick the rows up next time.
+        """
+        if self.dir is None or not self._write_lock.acquire(blocking=wait):
+            return
+        try:
+            with index_lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+
+            new: Dict[str, np.ndarray] = {}
+            for keys, vectors in pending:
+                new.update(zip(keys, vectors))
+            dim = pending[0][1].shape[1]
+
+            with open(self.lock_path, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._sync_log(dim)
+                new = {key: vector for key, vector in new.items() if key not in self._stored}
+                if not new:
+                    return
+                if len(self._stored) + len(new) > self.max_rows:
+                    self._start_log(dim, self._log_generation + 1)
+                    new = dict(list(new.items())[-self.max_rows:])
+
+                with open(self.data_path, "ab") as data:
+                    data.write(np.ascontiguousarray(np.stack(list(new.values())), dtype=self.dtype).tobytes())
+                line = orjson.dumps(list(new)) + b"\n"
+                with open(self.log_path, "ab") as log:
+                    log.write(line)
+                self._stored.update(new)
+                self._log_offset += len(line)
+                self.saved = len(self._stored)
+        finally:
+            self._write_lock.release()
+
+
+class LabelEmbeddingIndex:
+    """
+    Title-hash keyed embedding rows shared by every DNA request in the process.
+
+    Usage:
+        label_embeddings = label_index.encode(titles, embedder, namespace)
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if LabelEmbeddingIndex._initialized:
+            return
+
+        self.dtype = LABEL_INDEX_DTYPE
+        if self.dtype not in _SUFFIX:
+            raise ValueError(f"Unsupported LABEL_INDEX_DTYPE: {self.dtype}")
+        self.max_rows = LABEL_INDEX_MAX_ROWS
+        self._matrices: Dict[str, _LabelMatrix] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        if LABEL_INDEX_DIR:
+            atexit.register(self.flush)
+
+        LabelEmbeddingIndex._initialized = True
+
+    @staticmethod
+    def key(title: str) -> str:
+        return hashlib.blake2b(title.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _matrix(self, namespace: str) -> _LabelMatrix:
+        # caller holds the lock
+        matrix = self._matrices.get(namespace)
+        if matrix is None:
+            directory = os.path.join(LABEL_INDEX_DIR, _UNSAFE_PATH.sub("_", namespace)) if LABEL_INDEX_DIR else None
+            matrix = self._matrices[namespace] = _LabelMatrix(self.dtype, directory, self.max_rows)
+        return matrix
+
+    def add(self, namespace: str, keys: List[str], vectors: np.ndarray) -> None:
+        """Store normalized `vectors` under `keys`; rows already present are kept."""
+        with self._lock:
+            matrix = self._matrix(namespace)
+            added = matrix.add(keys, vectors)
+        if added:
+            try:
+                # another request may already be writing; it picks these rows up next time
+                matrix.flush(self._lock, wait=False)
+            except OSError as e:
+                logger.warning("label index flush failed: %s", e)
+
+    def lookup(
+        self, titles: List[str], namespace: str = "default", count: bool = True
+    ) -> Tuple[Optional[LabelRows], Dict[str, str]]:
+        """
+        (rows, {}) when every title has a row, else (None, missing) with the
+        key -> title pairs to encode and add() before looking up again
+        (with count=False, so hits and misses are counted once).
+
+        Raises:
+            ValueError: If `titles` holds more distinct titles than a namespace keeps
+        """
+        keys = [self.key(title) for title in titles]
+        distinct = dict(zip(keys, titles))
+        if len(distinct) > self.max_rows:
+            raise ValueError(f"{len(distinct)} distinct titles exceed LABEL_INDEX_MAX_ROWS ({self.max_rows})")
+
+        with self._lock:
+            matrix = self._matrix(namespace)
+            missing = {key: title for key, title in distinct.items() if key not in matrix.rows}
+            if count:
+                misses = sum(1 for key in keys if key in missing) if missing else 0
+                self.hits += len(keys) - misses
+                self.misses += misses
+            if missing:
+                return None, missing
+            rows = np.fromiter((matrix.rows[key] for key in keys), dtype=np.int64, count=len(keys))
+            return LabelRows(namespace, matrix.generation, rows), {}
+
+    def gather(self, label_rows: LabelRows) -> Optional[np.ndarray]:
+        """
+        Normalized float32 matrix of `label_rows`, (len(label_rows), dim). Shared
+        with other callers gathering the same rows at the same time; treat it as
+        read-only. None when the namespace started a new generation since the lookup.
+        """
+        shared = label_rows._shared() if label_rows._shared is not None else None
+        if shared is not None:
+            return shared
+
+        with self._lock:
+            matrix = self._matrices.get(label_rows.namespace)
+            if matrix is None or matrix.generation != label_rows.generation:
+                return None
+            source = matrix.matrix
+        # copied outside the lock: rows below the size are only rewritten after a reset, checked below
+        embeddings = source[label_rows.rows].astype(np.float32, copy=False)
+        embeddings.flags.writeable = False
+        with self._lock:
+            if matrix.generation != label_rows.generation:
+                return None
+            shared = label_rows._shared() if label_rows._shared is not None else None
+            if shared is not None:
+                return shared
+            label_rows._shared = weakref.ref(embeddings)
+        return embeddings
+
+    def encode(self, titles: List[str], encoder, namespace: str = "default") -> np.ndarray:
+        """
+        Normalized float32 embeddings of `titles` (len(titles), dim), encoding
+        only titles this index has not seen, in one call.
+        """
+        if len(set(titles)) > self.max_rows:
+            # more titles than a namespace holds: encode them without the index
+            with self._lock:
+                self.misses += len(titles)
+            return self._encode(encoder, titles)
+
+        counted = False
+        while True:
+            label_rows, missing = self.lookup(titles, namespace, count=not counted)
+            counted = True
+            if label_rows is not None:
+                embeddings = self.gather(label_rows)
+                if embeddings is not None:
+                    return embeddings
+                continue
+            # encoded outside the lock; a concurrent request may encode the same titles, first one wins.
+            # Looked up again: a reset by another request may have dropped rows this one reused.
+            self.add(namespace, list(missing), self._encode(encoder, list(missing.values())))
+
+    @staticmethod
+    def _encode(encoder, titles: List[str]) -> np.ndarray:
+        return np.asarray(
+            encoder.encode(titles, normalize_embeddings=True, show_progress_bar=False), dtype=np.float32
+        )
+
+    def flush(self) -> None:
+        """Write pending rows of every namespace."""
+        with self._lock:
+            matrices = list(self._matrices.values())
+        for matrix in matrices:
+            try:
+                matrix.flush(self._lock)
+            except OSError as e:
+                logger.warning("label index flush failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "dtype": self.dtype,
+                "max_rows": self.max_rows,
+                "namespaces": {
+                    namespace: {
+                        "rows": matrix.size,
+                        "saved": matrix.saved,
+                        "generation": matrix.generation,
+                        "dir": str(matrix.dir) if matrix.dir else None,
+                    }
+                    for namespace, matrix in self._matrices.items()
+                },
+            }
+
+
+# Singleton instance - import and use this
+label_index = LabelEmbeddingIndex()
@@ -1,10 +1,12 @@
 """
 Universal JSON Data Loader - Load any JSON files from assets/libs/
 
-Simple singleton to load and cache JSON configuration files at startup.
+Simple singleton to load and cache JSON configuration files on first use, so
+pods whose SERVICE_PROFILE never reads them (e.g. dna_image) skip the load.
 """
 
 import orjson
+import threading
 from pathlib import Path
 from typing import Dict, Any
 
@@ -13,7 +15,7 @@ class LibsLoader:
     """
     Universal JSON loader for configuration files.
     
-    Loads all JSON files from assets/libs/ once at startup and caches them.
+    Loads all JSON files from assets/libs/ on the first lookup and caches them.
     Access any loaded JSON via: libs_loader.get('filename')
     """
     
@@ -36,18 +38,25 @@ class LibsLoader:
         
         # Cache for loaded data
         self._data: Dict[str, Any] = {}
+        self._loaded = False
+        self._load_lock = threading.Lock()
         
         LibsLoader._initialized = True
     
     def load_all(self) -> None:
         """Load all JSON files from assets/libs/ directory."""
+        with self._load_lock:
+            self._load_locked()
+
+    def _load_locked(self) -> None:
+        """Read every file, then publish them at once; callers hold _load_lock."""
         print(f"🔄 Loading JSON files from {self.libs_dir}")
         
         json_files = list(self.libs_dir.glob("*.json"))
+        data_by_name: Dict[str, Any] = {}
         
         if not json_files:
             print("No JSON files found in assets/libs/")
-            return
         
         for json_file in json_files:
             try:
@@ -57,7 +66,7 @@ class LibsLoader:
                     
                 # Store with filename (without extension) as key
                 key = json_file.stem
-                self._data[key] = {
+                data_by_name[key] = {
                     'raw': content,      # Raw string for LLM prompts
                     'parsed': data,      # Parsed dict for processing
                     'path': json_file    # Path reference
@@ -68,6 +77,9 @@ class LibsLoader:
             except Exception as e:
                 print(f"Failed to load {json_file.name}: {str(e)}")
         
+        # get() reads without the lock once _loaded is set, so _data must be complete first
+        self._data = data_by_name
+        self._loaded = True
         print(f"Loaded {len(self._data)} JSON file(s)")
     
     def get(self, name: str, parsed: bool = True) -> Any:
@@ -84,11 +96,17 @@ class LibsLoader:
         Raises:
             KeyError: If file not found
         """
-        if name not in self._data:
-            available = list(self._data.keys())
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._load_locked()
+
+        data = self._data
+        if name not in data:
+            available = list(data.keys())
             raise KeyError(f"'{name}.json' not loaded. Available: {available}")
         
-        return self._data[name]['parsed'] if parsed else self._data[name]['raw']
+        return data[name]['parsed'] if parsed else data[name]['raw']
     
     def get_raw(self, name: str) -> str:
         """Get raw string content (useful for LLM prompts)."""
@@ -105,7 +123,6 @@ class LibsLoader:
     def reload(self) -> None:
         """Reload all JSON files from disk."""
         print("🔄 Reloading JSON files...")
-        self._data.clear()
         self.load_all()
 
 
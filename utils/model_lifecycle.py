@@ -0,0 +1,217 @@
+"""
+Model Lifecycle - lazy / background model loading, warm-up and readiness
+
+Services register their models instead of building them at import time:
+
+    model_lifecycle.register("embedder", EmbeddingBackendFactory.create_embedder,
+                             warmup=lambda m: m.encode(["warm up"]))
+    embedder = model_lifecycle.proxy("embedder")
+
+The proxy loads the model on first attribute access, so importing a service
+no longer blocks on model loading. At worker startup `start()` loads and
+warms every registered model according to MODEL_LOAD_MODE, and `status()`
+feeds the /ready endpoint so orchestrators only route traffic to warm pods.
+
+Configuration (env):
+    MODEL_LOAD_MODE  background | eager | lazy (default: background)
+                     background: load + warm in a thread once the worker starts
+                     eager: load + warm before the worker accepts requests
+                     lazy: load on first use
+    MODEL_WARMUP     1 to run each model's warm-up pass after loading (default: 1)
+    MODEL_READY_REQUIRES  loaded | started (default: loaded)
+                     loaded: /ready fails until every required model is READY; in lazy
+                       mode the first readiness check starts loading them in the background
+                     started: lazy mode only, /ready only fails on load errors, so the
+                       first requests pay for loading
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MODEL_LOAD_MODE = os.getenv("MODEL_LOAD_MODE", "background").lower()
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+MODEL_READY_REQUIRES = os.getenv("MODEL_READY_REQUIRES", "loaded").lower()
+
+PENDING = "pending"
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+class _ModelEntry:
+    def __init__(self, name: str, loader: Callable[[], Any], warmup: Optional[Callable[[Any], Any]]):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.lock = threading.Lock()
+        self.state = PENDING
+        self.model: Any = None
+        self.loaded = False
+        self.load_ms: Optional[float] = None
+        self.warmup_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+
+class _LazyModel:
+    """Attribute proxy that resolves the registered model on first use."""
+
+    def __init__(self, lifecycle: "ModelLifecycle", name: str):
+        self._lifecycle = lifecycle
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._lifecycle.get(self._name), attr)
+
+
+class ModelLifecycle:
+    """Registry of lazily loaded models with warm-up and per-model state"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if ModelLifecycle._initialized:
+            return
+
+        self.mode = MODEL_LOAD_MODE
+        self.ready_requires = MODEL_READY_REQUIRES
+        self._entries: Dict[str, _ModelEntry] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        # models start() loads and /ready waits for; None means every registered model
+        self._required: Optional[tuple] = None
+
+        ModelLifecycle._initialized = True
+
+    def register(self, name: str, loader: Callable[[], Any], warmup: Callable[[Any], Any] = None) -> None:
+        """Register `loader` (no args, returns the model) and an optional `warmup(model)` pass."""
+        if name not in self._entries:
+            self._entries[name] = _ModelEntry(name, loader, warmup)
+
+    def require(self, names) -> None:
+        """Limit start() and readiness to `names`; other models stay lazy."""
+        self._required = tuple(names)
+
+    def _required_entries(self) -> list:
+        if self._required is None:
+            return list(self._entries.values())
+        return [self._entries[name] for name in self._required if name in self._entries]
+
+    def proxy(self, name: str) -> _LazyModel:
+        return _LazyModel(self, name)
+
+    def get(self, name: str) -> Any:
+        """The loaded model, loading it now (blocking) if no one has yet."""
+        entry = self._entries[name]
+        if entry.loaded:
+            return entry.model
+
+        with entry.lock:
+            if not entry.loaded:
+                self._load(entry)
+        return entry.model
+
+    def _load(self, entry: _ModelEntry) -> None:
+        # caller holds entry.lock
+        entry.state = LOADING
+        entry.error = None
+        started = time.perf_counter()
+        try:
+            entry.model = entry.loader()
+        except Exception as e:
+            entry.state = FAILED
+            entry.error = f"{type(e).__name__}: {e}"
+            logger.exception("model %s failed to load", entry.name)
+            raise
+        entry.load_ms = (time.perf_counter() - started) * 1000
+        entry.loaded = True
+        # usable from here on; a warm-up may still follow
+        entry.state = READY if entry.warmup is None or not MODEL_WARMUP else WARMING
+        logger.info("model %s loaded in %.0f ms", entry.name, entry.load_ms)
+
+    def warm(self, name: str) -> None:
+        """Load `name` if needed, then run its warm-up pass once."""
+        entry = self._entries[name]
+        model = self.get(name)
+        if entry.state != WARMING:
+            return
+
+        started = time.perf_counter()
+        try:
+            entry.warmup(model)
+        except Exception as e:
+            # a failed warm-up leaves a loaded, usable model; report it but stay ready
+            entry.error = f"warm-up failed: {type(e).__name__}: {e}"
+            logger.exception("model %s warm-up failed", name)
+        entry.warmup_ms = (time.perf_counter() - started) * 1000
+        entry.state = READY
+        logger.info("model %s warmed up in %.0f ms", name, entry.warmup_ms)
+
+    def load_all(self) -> None:
+        for entry in self._required_entries():
+            try:
+                self.warm(entry.name)
+            except Exception:
+                # state and error are recorded on the entry for /ready
+                pass
+
+    def _load_in_background(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.load_all, name="model-loader", daemon=True)
+                self._thread.start()
+
+    def start(self) -> None:
+        """Worker startup hook: load and warm all models per MODEL_LOAD_MODE."""
+        if self.ready_requires not in ("loaded", "started"):
+            raise ValueError(f"Unsupported MODEL_READY_REQUIRES: {self.ready_requires}")
+        if self.mode == "eager":
+            self.load_all()
+        elif self.mode == "background":
+            self._load_in_background()
+        elif self.mode != "lazy":
+            raise ValueError(f"Unsupported MODEL_LOAD_MODE: {self.mode}")
+
+    def is_ready(self) -> bool:
+        states = [entry.state for entry in self._required_entries()]
+        if self.mode == "lazy":
+            if self.ready_requires == "started":
+                return FAILED not in states
+            # nothing routes traffic to an unready pod, so first use would never come
+            self._load_in_background()
+        return all(state == READY for state in states)
+
+    def status(self) -> Dict[str, Any]:
+        """Readiness plus per-model state, load time and warm-up time."""
+        required = {entry.name for entry in self._required_entries()}
+        return {
+            "ready": self.is_ready(),
+            "mode": self.mode,
+            "ready_requires": self.ready_requires,
+            "pid": os.getpid(),
+            "models": {
+                name: {
+                    "state": entry.state,
+                    "required": name in required,
+                    "load_ms": round(entry.load_ms, 1) if entry.load_ms is not None else None,
+                    "warmup_ms": round(entry.warmup_ms, 1) if entry.warmup_ms is not None else None,
+                    "error": entry.error,
+                }
+                for name, entry in self._entries.items()
+            },
+        }
+
+
+# Singleton instance - import and use this
+model_lifecycle = ModelLifecycle()
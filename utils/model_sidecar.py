@@ -0,0 +1,438 @@
+"""
+Model Sidecar - one model footprint shared by every Robyn worker process
+
+With `--processes N` each worker imports the services and loads its own
+MiniLM (plus torch) and u2net. In sidecar mode one local process owns the
+models and workers talk to it over a Unix socket:
+
+    worker --(texts / image bytes)--> sidecar
+    worker <--(shared-memory name)--- sidecar writes the result array into /dev/shm
+
+Results above MODEL_SIDECAR_INLINE_BYTES are returned through a shared-memory
+file that the worker maps read-only and unlinks straight away, so the array
+is never copied through the socket. Small results (a single label embedding)
+are sent inline. Sidecar-side encodes go through the EmbeddingBatcher, so
+encode calls from all workers coalesce into shared forward passes.
+
+Calls are sent once: a timeout or a connection lost mid-call raises instead
+of re-sending work the sidecar may still be running. Buffers whose reply was
+never read are unlinked by the side that gave up, and the sidecar sweeps any
+older than MODEL_SIDECAR_TIMEOUT.
+
+Run it standalone with `python -m utils.model_sidecar`, or let app.py spawn
+it when MODEL_SIDECAR=1; a spawned sidecar that exits is respawned after
+MODEL_SIDECAR_RESPAWN_DELAY seconds.
+
+Configuration (env):
+    MODEL_SIDECAR               1 to route model calls through the sidecar (default: 0)
+    MODEL_SIDECAR_SOCKET        Unix socket path (default: /tmp/ai-rep-models.sock)
+    MODEL_SIDECAR_SHM_DIR       directory for result buffers (default: /dev/shm)
+    MODEL_SIDECAR_INLINE_BYTES  results up to this size skip shared memory (default: 65536)
+    MODEL_SIDECAR_TIMEOUT       client socket timeout in seconds (default: 120)
+    MODEL_SIDECAR_RESPAWN_DELAY seconds before respawning an exited sidecar (default: 1)
+"""
+
+import asyncio
+import atexit
+import glob
+import logging
+import mmap
+import os
+import signal
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import orjson
+
+logger = logging.getLogger(__name__)
+
+MODEL_SIDECAR = os.getenv("MODEL_SIDECAR", "0") == "1"
+MODEL_SIDECAR_SOCKET = os.getenv("MODEL_SIDECAR_SOCKET", "/tmp/ai-rep-models.sock")
+MODEL_SIDECAR_SHM_DIR = os.getenv("MODEL_SIDECAR_SHM_DIR", "/dev/shm")
+MODEL_SIDECAR_INLINE_BYTES = int(os.getenv("MODEL_SIDECAR_INLINE_BYTES", "65536"))
+MODEL_SIDECAR_TIMEOUT = float(os.getenv("MODEL_SIDECAR_TIMEOUT", "120"))
+MODEL_SIDECAR_RESPAWN_DELAY = float(os.getenv("MODEL_SIDECAR_RESPAWN_DELAY", "1"))
+
+_SHM_PREFIX = "ai-rep-"
+_HEADER = struct.Struct("!II")  # header length, payload length
+
+
+class ModelSidecarError(RuntimeError):
+    """Raised when the sidecar is unreachable or reports a failed call."""
+
+
+def _send(sock: socket.socket, header: dict, payload: bytes = b"") -> None:
+    body = orjson.dumps(header)
+    sock.sendall(_HEADER.pack(len(body), len(payload)) + body + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("sidecar connection closed")
+        received += n
+    return bytes(buf)
+
+
+def _recv(sock: socket.socket) -> Tuple[dict, bytes]:
+    header_len, payload_len = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    header = orjson.loads(_recv_exact(sock, header_len))
+    payload = _recv_exact(sock, payload_len) if payload_len else b""
+    return header, payload
+
+
+def _write_shm(arr: np.ndarray) -> str:
+    """Copy `arr` into a fresh shared-memory file; the reader unlinks it."""
+    name = f"{_SHM_PREFIX}{uuid.uuid4().hex}"
+    path = os.path.join(MODEL_SIDECAR_SHM_DIR, name)
+    fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_RDWR, 0o600)
+    try:
+        os.ftruncate(fd, arr.nbytes)
+        with mmap.mmap(fd, arr.nbytes) as mm:
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=mm)[...] = arr
+    finally:
+        os.close(fd)
+    return name
+
+
+def _read_shm(name: str, dtype: str, shape: list) -> np.ndarray:
+    """Map a result buffer read-only. The array keeps the mapping alive after unlink."""
+    path = os.path.join(MODEL_SIDECAR_SHM_DIR, name)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        mm = mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+        os.unlink(path)
+    return np.frombuffer(mm, dtype=np.dtype(dtype)).reshape(shape)
+
+
+def _unlink_shm(name: str) -> None:
+    try:
+        os.unlink(os.path.join(MODEL_SIDECAR_SHM_DIR, name))
+    except FileNotFoundError:
+        pass
+
+
+def _sweep_shm(max_age: float) -> int:
+    """Unlink result buffers older than `max_age` seconds; no client can still be about to read them."""
+    removed = 0
+    cutoff = time.time() - max_age
+    for path in glob.glob(os.path.join(MODEL_SIDECAR_SHM_DIR, f"{_SHM_PREFIX}*")):
+        try:
+            if os.stat(path).st_mtime < cutoff:
+                os.unlink(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+class _SidecarHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        models: "SidecarModels" = self.server.models
+        while True:
+            try:
+                header, payload = _recv(self.request)
+            except (ConnectionError, OSError):
+                return
+
+            try:
+                result, meta = models.call(header, payload)
+                reply = {"ok": True, "meta": meta}
+                if result is None:
+                    _send(self.request, reply)
+                    continue
+
+                reply["dtype"] = str(result.dtype)
+                reply["shape"] = list(result.shape)
+                if result.nbytes <= MODEL_SIDECAR_INLINE_BYTES:
+                    _send(self.request, reply, np.ascontiguousarray(result).tobytes())
+                else:
+                    reply["shm"] = _write_shm(result)
+                    try:
+                        _send(self.request, reply)
+                    except OSError:
+                        # the client is gone and will never unlink it
+                        _unlink_shm(reply["shm"])
+                        return
+            except Exception as e:
+                logger.exception("sidecar op %s failed", header.get("op"))
+                _send(self.request, {"ok": False, "error": f"{type(e).__name__}: {e}"})
+
+
+class _SidecarServer(socketserver.ThreadingUnixStreamServer):
+    # worker connections are long-lived; never wait for them on shutdown
+    daemon_threads = True
+    block_on_close = False
+
+
+class SidecarModels:
+    """The models owned by the sidecar process"""
+
+    def __init__(self):
+        from services.embedding_service import EmbeddingBackendFactory
+
+        self.embedder = EmbeddingBackendFactory.create_embedder(local=True)
+        # imported on the main thread: pymatting's numba setup hangs interpreter exit when first imported from a worker thread
+        from utils.rembg_pool import rembg_pool
+
+        # one session per REMBG_POOL_SIZE, shared by every worker process
+        self.rembg_pool = rembg_pool
+
+    def call(self, header: dict, payload: bytes) -> Tuple[Optional[np.ndarray], Dict[str, Any]]:
+        op = header.get("op")
+        if op == "info":
+            return None, {
+                "pid": os.getpid(),
+                "dim": self.embedder.get_sentence_embedding_dimension(),
+            }
+
+        if op == "encode":
+            vectors = self.embedder.encode(
+                header["texts"],
+                normalize_embeddings=header.get("normalize", False),
+                show_progress_bar=False,
+            )
+            return np.asarray(vectors, dtype=np.float32), {}
+
+        if op == "remove_background":
+            from PIL import Image
+
+            image = self.rembg_pool.remove(Image.open(BytesIO(payload)))
+            return np.asarray(image.convert("RGBA")), {}
+
+        raise ValueError(f"unknown sidecar op {op!r}")
+
+
+class ModelSidecarClient:
+    """
+    Worker-side handle to the sidecar. One connection per thread.
+
+    Usage:
+        embs = model_sidecar.encode(texts, normalize=True)
+        rgba = model_sidecar.remove_background(image_bytes)
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if ModelSidecarClient._initialized:
+            return
+
+        self.enabled = MODEL_SIDECAR
+        self.socket_path = MODEL_SIDECAR_SOCKET
+        self._local = threading.local()
+        self._process: Optional[subprocess.Popen] = None
+        self._owner_pid: Optional[int] = None
+        self._info: Optional[dict] = None
+        self._stopping = threading.Event()
+
+        # a forked worker must not share the parent's connection
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+        ModelSidecarClient._initialized = True
+
+    def _reset_after_fork(self) -> None:
+        self._local = threading.local()
+
+    @staticmethod
+    def _is_closed(sock: socket.socket) -> bool:
+        """True when the sidecar closed this idle connection, e.g. because it was restarted."""
+        try:
+            return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+
+    def _connect(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None and self._is_closed(sock):
+            self._drop()
+            sock = None
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(MODEL_SIDECAR_TIMEOUT)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _drop(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def call(self, header: dict, payload: bytes = b"") -> Tuple[Optional[np.ndarray], dict]:
+        # sent at most once: after a timeout the sidecar may still be running the call, and a
+        # late reply would answer the next request on this connection, so it is dropped instead
+        try:
+            sock = self._connect()
+            _send(sock, header, payload)
+            reply, data = _recv(sock)
+        except (ConnectionError, OSError) as e:
+            self._drop()
+            raise ModelSidecarError(f"model sidecar at {self.socket_path} failed: {e}")
+
+        shm = reply.get("shm")
+        try:
+            if not reply["ok"]:
+                raise ModelSidecarError(reply["error"])
+            if "shape" not in reply:
+                return None, reply["meta"]
+            if shm:
+                result = _read_shm(shm, reply["dtype"], reply["shape"])
+                shm = None
+                return result, reply["meta"]
+            return np.frombuffer(data, dtype=np.dtype(reply["dtype"])).reshape(reply["shape"]), reply["meta"]
+        finally:
+            if shm:
+                _unlink_shm(shm)
+
+    def info(self) -> dict:
+        if self._info is None:
+            self._info = self.call({"op": "info"})[1]
+        return self._info
+
+    def encode(self, texts: list, normalize: bool = False) -> np.ndarray:
+        return self.call({"op": "encode", "texts": list(texts), "normalize": normalize})[0]
+
+    def remove_background(self, image_bytes: bytes) -> np.ndarray:
+        """RGBA (h, w, 4) uint8 array of the image with its background removed."""
+        return self.call({"op": "remove_background"}, image_bytes)[0]
+
+    def wait_ready(self, timeout: float = 300.0) -> dict:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.info()
+            except ModelSidecarError:
+                if self._process is not None and self._process.poll() is not None:
+                    raise ModelSidecarError(f"model sidecar exited with code {self._process.returncode}")
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+
+    def spawn(self) -> None:
+        """Start the sidecar process unless one is already listening, then wait until it serves."""
+        try:
+            info = self.info()
+            logger.info("model sidecar already running (pid %s)", info["pid"])
+            return
+        except ModelSidecarError:
+            pass
+
+        self._stopping.clear()
+        self._process = self._start_process()
+        self._owner_pid = os.getpid()
+        atexit.register(self.shutdown)
+        info = self.wait_ready()
+        logger.info("model sidecar ready (pid %s, dim %s)", info["pid"], info["dim"])
+        threading.Thread(target=self._supervise, name="model-sidecar-supervisor", daemon=True).start()
+
+    @staticmethod
+    def _start_process() -> subprocess.Popen:
+        env = dict(os.environ, MODEL_SIDECAR="0")
+        return subprocess.Popen([sys.executable, "-m", "utils.model_sidecar"], env=env)
+
+    def _supervise(self) -> None:
+        """Respawn the sidecar whenever it exits, until shutdown."""
+        while not self._stopping.is_set():
+            process = self._process
+            if process is None:
+                return
+            code = process.wait()
+            if self._stopping.wait(MODEL_SIDECAR_RESPAWN_DELAY):
+                return
+            logger.error("model sidecar exited with code %s, respawning", code)
+            self._process = self._start_process()
+
+    def shutdown(self) -> None:
+        self._drop()
+        # forked Robyn workers inherit the handle; only the spawning process stops the sidecar
+        if self._process is not None and self._owner_pid == os.getpid():
+            self._stopping.set()
+            self._process.terminate()
+            self._process = None
+
+
+class SidecarEmbedder:
+    """SentenceTransformer-style encode that runs in the sidecar"""
+
+    def __init__(self, client: ModelSidecarClient):
+        self.client = client
+
+    def encode(self, sentences, normalize_embeddings: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        vectors = self.client.encode(texts, normalize=normalize_embeddings)
+        return vectors[0] if single else vectors
+
+    async def encode_async(self, sentences, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.encode(sentences, **kwargs))
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.client.info()["dim"]
+
+
+def serve(socket_path: str = MODEL_SIDECAR_SOCKET) -> None:
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    started = time.perf_counter()
+    models = SidecarModels()
+    server = _SidecarServer(socket_path, _SidecarHandler)
+    server.models = models
+    os.chmod(socket_path, 0o600)
+
+    def _stop(*_):
+        # native runtime thread pools (ORT, OpenMP) can hang interpreter
+        # finalization from daemon threads; the sidecar holds no state to flush
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        os._exit(0)
+
+    def _sweep():
+        # buffers whose client timed out before reading the reply, or of a sidecar that crashed
+        while True:
+            time.sleep(MODEL_SIDECAR_TIMEOUT)
+            _sweep_shm(MODEL_SIDECAR_TIMEOUT)
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    threading.Thread(target=_sweep, name="model-sidecar-shm-sweep", daemon=True).start()
+    logger.info("model sidecar listening on %s (models loaded in %.2fs)", socket_path, time.perf_counter() - started)
+    server.serve_forever()
+
+
+# Singleton instance - import and use this
+model_sidecar = ModelSidecarClient()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    serve()
@@ -0,0 +1,255 @@
+"""
+Rembg Session Pool - reusable background-removal sessions on a dedicated worker
+
+rembg.remove() without a session builds a new ONNX Runtime session (and reads
+the model from disk) on every call. The pool creates REMBG_POOL_SIZE sessions
+once, each with a fixed intra-op thread count, and runs removals on its own
+executor so badge post-processing never competes with embedding / sklearn
+jobs on the compute pool:
+
+    image = await rembg_pool.run(DNAService._remove_background, b64_json)
+    nobg = rembg_pool.remove(pil_image)     # inside a job: borrows one session
+
+Configuration (env):
+    REMBG_MODEL              rembg model name (default: u2net)
+    REMBG_LOW_LATENCY        1 to use REMBG_LOW_LATENCY_MODEL instead (default: 0)
+    REMBG_LOW_LATENCY_MODEL  lighter model for low-latency mode, u2netp | silueta (default: u2netp)
+    REMBG_POOL_SIZE          sessions, and worker threads running them (default: 1)
+    REMBG_ORT_THREADS        intra-op threads per session, 0 = cpu count / pool size (default: 0)
+    REMBG_BATCH_SIZE         max images per batched inference (default: 8)
+    REMBG_BATCH_WAIT_MS      how long run_batched() waits for more items (default: 25)
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import onnxruntime as ort
+from PIL import Image
+# imported at module load (main thread): pymatting's numba setup hangs interpreter exit when first imported from a worker thread
+from rembg import new_session, remove
+
+logger = logging.getLogger(__name__)
+
+REMBG_MODEL = os.getenv("REMBG_MODEL", "u2net")
+REMBG_LOW_LATENCY = os.getenv("REMBG_LOW_LATENCY", "0") == "1"
+REMBG_LOW_LATENCY_MODEL = os.getenv("REMBG_LOW_LATENCY_MODEL", "u2netp")
+REMBG_POOL_SIZE = max(1, int(os.getenv("REMBG_POOL_SIZE", "1")))
+REMBG_ORT_THREADS = int(os.getenv("REMBG_ORT_THREADS", "0"))
+REMBG_BATCH_SIZE = max(1, int(os.getenv("REMBG_BATCH_SIZE", "8")))
+REMBG_BATCH_WAIT_MS = float(os.getenv("REMBG_BATCH_WAIT_MS", "25"))
+
+# u2net-family sessions: same 320x320 ImageNet-normalized input and min-max scaled output
+_BATCHABLE_MODELS = {"u2net", "u2netp", "u2net_human_seg", "silueta"}
+_U2NET_MEAN = (0.485, 0.456, 0.406)
+_U2NET_STD = (0.229, 0.224, 0.225)
+_U2NET_SIZE = (320, 320)
+
+
+def session_options(intra_op_threads: int) -> ort.SessionOptions:
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = intra_op_threads
+    # one removal at a time per session; parallelism comes from the pool size
+    opts.inter_op_num_threads = 1
+    opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    return opts
+
+
+class RembgSessionPool:
+    """
+    Fixed set of rembg sessions plus the executor that runs them.
+
+    Sessions are borrowed per removal, so REMBG_POOL_SIZE removals run in
+    parallel and further callers wait for a free session.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if RembgSessionPool._initialized:
+            return
+
+        self.model_name = REMBG_LOW_LATENCY_MODEL if REMBG_LOW_LATENCY else REMBG_MODEL
+        self.size = REMBG_POOL_SIZE
+        self.ort_threads = REMBG_ORT_THREADS or max(1, (os.cpu_count() or 1) // self.size)
+        self._sessions: "queue.Queue" = queue.Queue()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._executor_pid: Optional[int] = None
+        self._stats = {"removals": 0, "remove_ms": 0.0, "wait_ms": 0.0, "session_ms": 0.0, "batches": 0, "batched_images": 0}
+        self._batch_supported: Optional[bool] = None
+        # run_batched() queues per (event loop, batch function)
+        self._pending: Dict[tuple, list] = {}
+
+        RembgSessionPool._initialized = True
+
+    def start(self) -> "RembgSessionPool":
+        """Create the sessions; idempotent per process."""
+        with self._lock:
+            # ORT sessions do not survive fork
+            if self._pid == os.getpid():
+                return self
+
+            started = time.perf_counter()
+            sessions: "queue.Queue" = queue.Queue()
+            for _ in range(self.size):
+                sessions.put(new_session(self.model_name, sess_opts=session_options(self.ort_threads)))
+            self._sessions = sessions
+            self._pid = os.getpid()
+            self._stats["session_ms"] = (time.perf_counter() - started) * 1000
+
+        logger.info(
+            "rembg pool: %d x %s sessions, %d intra-op threads each, created in %.0f ms",
+            self.size, self.model_name, self.ort_threads, self._stats["session_ms"],
+        )
+        return self
+
+    def remove(self, image, **kwargs):
+        """rembg.remove() on a borrowed session; blocks while all sessions are busy."""
+        self.start()
+        waited = time.perf_counter()
+        session = self._sessions.get()
+        started = time.perf_counter()
+        try:
+            return remove(image, session=session, **kwargs)
+        finally:
+            self._sessions.put(session)
+            finished = time.perf_counter()
+            with self._lock:
+                self._stats["removals"] += 1
+                self._stats["wait_ms"] += (started - waited) * 1000
+                self._stats["remove_ms"] += (finished - started) * 1000
+
+    def _supports_batch(self, session) -> bool:
+        if self._batch_supported is None:
+            batch_dim = session.inner_session.get_inputs()[0].shape[0]
+            # a symbolic / unknown dim accepts any batch size; exported-as-1 does not
+            self._batch_supported = self.model_name in _BATCHABLE_MODELS and not isinstance(batch_dim, int)
+        return self._batch_supported
+
+    def remove_masks(self, images: List[Image.Image]) -> List[Image.Image]:
+        """Foreground masks ("L", input size) of `images`, in one inference where the model allows it."""
+        self.start()
+        if len(images) == 1:
+            return [self.remove(images[0], only_mask=True)]
+
+        session = self._sessions.get()
+        started = time.perf_counter()
+        try:
+            if not self._supports_batch(session):
+                return [remove(image, session=session, only_mask=True) for image in images]
+
+            input_name = session.inner_session.get_inputs()[0].name
+            batch = np.concatenate([
+                session.normalize(image, _U2NET_MEAN, _U2NET_STD, _U2NET_SIZE)[input_name] for image in images
+            ])
+            try:
+                preds = session.inner_session.run(None, {input_name: batch})[0][:, 0, :, :]
+            except Exception as e:
+                logger.warning("rembg %s rejected a batch of %d, using one inference per image: %s",
+                               self.model_name, len(images), e)
+                self._batch_supported = False
+                return [remove(image, session=session, only_mask=True) for image in images]
+
+            masks = []
+            for image, pred in zip(images, preds):
+                # per image, exactly as the u2net sessions' predict()
+                lo, hi = pred.min(), pred.max()
+                pred = (pred - lo) / (hi - lo)
+                mask = Image.fromarray((pred.clip(0, 1) * 255).astype("uint8"), mode="L")
+                masks.append(mask.resize(image.size, Image.Resampling.LANCZOS))
+            return masks
+        finally:
+            self._sessions.put(session)
+            with self._lock:
+                self._stats["removals"] += len(images)
+                self._stats["remove_ms"] += (time.perf_counter() - started) * 1000
+                self._stats["batches"] += 1
+                self._stats["batched_images"] += len(images)
+
+    def _worker(self) -> ThreadPoolExecutor:
+        # separate from start(): in sidecar mode this worker only forwards to the sidecar's sessions;
+        # executor threads do not survive fork either
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="rembg")
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` (which calls remove()) on the rembg worker."""
+        executor = self._worker()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, lambda: fn(*args, **kwargs))
+
+    async def run_batched(self, fn_batch: Callable[[list], list], item: Any) -> Any:
+        """
+        Queue `item` for `fn_batch(items) -> results` on the rembg worker.
+
+        Items queued on the same event loop within REMBG_BATCH_WAIT_MS share
+        one call; a result that is an Exception is raised to its caller.
+        """
+        loop = asyncio.get_running_loop()
+        key = (loop, fn_batch)
+        future = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((item, future))
+
+        if len(pending) >= REMBG_BATCH_SIZE:
+            self._flush(key)
+        elif len(pending) == 1:
+            loop.call_later(REMBG_BATCH_WAIT_MS / 1000, self._flush, key)
+        return await future
+
+    def _flush(self, key: tuple) -> None:
+        pending = self._pending.pop(key, None)
+        if not pending:
+            return
+        _, fn_batch = key
+        task = asyncio.ensure_future(self.run(fn_batch, [item for item, _ in pending]))
+
+        def _resolve(done: asyncio.Future) -> None:
+            for index, (_, future) in enumerate(pending):
+                if future.done():
+                    continue
+                if done.cancelled():
+                    future.cancel()
+                elif done.exception() is not None:
+                    future.set_exception(done.exception())
+                elif isinstance(done.result()[index], BaseException):
+                    future.set_exception(done.result()[index])
+                else:
+                    future.set_result(done.result()[index])
+
+        task.add_done_callback(_resolve)
+
+    def stats(self) -> Dict[str, Any]:
+        removals = self._stats["removals"]
+        return {
+            "model": self.model_name,
+            "size": self.size,
+            "ort_threads": self.ort_threads,
+            "session_ms": round(self._stats["session_ms"], 1),
+            "removals": removals,
+            "avg_remove_ms": round(self._stats["remove_ms"] / removals, 1) if removals else None,
+            "avg_wait_ms": round(self._stats["wait_ms"] / removals, 1) if removals else None,
+            "batches": self._stats["batches"],
+            "avg_batch_size": round(self._stats["batched_images"] / self._stats["batches"], 2) if self._stats["batches"] else None,
+        }
+
+
+# Singleton instance - import and use this
+rembg_pool = RembgSessionPool()
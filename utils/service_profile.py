@@ -0,0 +1,188 @@
+"""
+Service Profiles - register (and import) only the controllers a pod serves
+
+    SERVICE_PROFILE=identifi,persona python app.py
+
+Each profile names one controller module; only the selected modules are
+imported, so a pod that serves /api/identifi/* never imports rembg, web3 or
+the LLM SDKs. A profile also lists the models it needs warm before /ready
+passes; models that are imported but not listed stay lazy.
+
+    all        every controller (default)
+    identifi   /api/identifi/*                 embedder, tfidf
+    dna        /api/dna/*                      embedder, rembg
+    dna_image  /api/dna/image*                 rembg
+    persona    /api/persona/*
+    tweet      /api/tweet/*
+
+Import cost report for a profile (per-module self/cumulative time from
+`python -X importtime` in a fresh interpreter, plus peak RSS):
+
+    python -m utils.service_profile identifi --top 25
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+SERVICE_PROFILE = os.getenv("SERVICE_PROFILE", "all")
+
+# profile -> (controller module, controller class, models to warm)
+PROFILES: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {
+    "dna": ("controllers.dna_controller", "DNAController", ("embedder", "rembg")),
+    "dna_image": ("controllers.dna_controller", "DNAImageController", ("rembg",)),
+    "persona": ("controllers.persona_controller", "PersonaController", ()),
+    "identifi": ("controllers.identifi_controller", "IdentifiController", ("embedder", "tfidf")),
+    "tweet": ("controllers.tweet_controller", "TweetController", ()),
+}
+
+# "all" keeps the historical registration order
+ALL_PROFILES = ("dna", "persona", "identifi", "tweet")
+
+# profile -> profile that already serves all of its routes
+SUBSUMED_BY = {"dna_image": "dna"}
+
+
+def parse_profile(value: str = SERVICE_PROFILE) -> List[str]:
+    names = [name.strip().lower() for name in value.split(",") if name.strip()]
+    if not names or "all" in names:
+        return list(ALL_PROFILES)
+
+    unknown = [name for name in names if name not in PROFILES]
+    if unknown:
+        raise ValueError(f"Unknown SERVICE_PROFILE entries {unknown}; choose from {sorted(PROFILES)} or 'all'")
+    # registering both would add the same routes twice
+    return [name for name in names if SUBSUMED_BY.get(name) not in names]
+
+
+def profile_models(value: str = SERVICE_PROFILE) -> List[str]:
+    """Models a profile warms, in first-mentioned order."""
+    models = []
+    for name in parse_profile(value):
+        models.extend(m for m in PROFILES[name][2] if m not in models)
+    return models
+
+
+def preload(value: str = SERVICE_PROFILE) -> None:
+    """Import a profile's controller modules (which register their models) without an app."""
+    from utils.model_lifecycle import model_lifecycle
+
+    for module_name in sorted({PROFILES[name][0] for name in parse_profile(value)}):
+        importlib.import_module(module_name)
+    model_lifecycle.require(profile_models(value))
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def register_profile(app, value: str = SERVICE_PROFILE) -> List[dict]:
+    """
+    Import and register the controllers of `value`, and tell the model
+    lifecycle which models to warm. Returns per-controller import cost.
+    """
+    from utils.model_lifecycle import model_lifecycle
+
+    names = parse_profile(value)
+    report = []
+    registered = set()
+
+    for name in names:
+        module_name, class_name, _ = PROFILES[name]
+        if (module_name, class_name) in registered:
+            continue
+        registered.add((module_name, class_name))
+
+        rss_before = _peak_rss_mb()
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        import_ms = (time.perf_counter() - started) * 1000
+
+        getattr(module, class_name)(app)
+        report.append({
+            "profile": name,
+            "controller": class_name,
+            "import_ms": round(import_ms, 1),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "peak_rss_delta_mb": round(_peak_rss_mb() - rss_before, 1),
+        })
+        logger.info(
+            "profile %s: %s imported in %.0f ms, peak RSS %.0f MB (+%.0f)",
+            name, class_name, import_ms, report[-1]["peak_rss_mb"], report[-1]["peak_rss_delta_mb"],
+        )
+
+    model_lifecycle.require(profile_models(value))
+    return report
+
+
+def import_report(value: str = SERVICE_PROFILE, top: int = 25) -> dict:
+    """Per-module import cost of a profile, measured in a fresh interpreter."""
+    modules = sorted({PROFILES[name][0] for name in parse_profile(value)})
+    code = (
+        "import importlib, resource, sys\n"
+        f"for m in {modules!r}: importlib.import_module(m)\n"
+        "sys.stdout.write(str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=root, capture_output=True, text=True, check=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "top_level": not name.startswith("  "),
+        })
+
+    top_level = sorted((r for r in rows if r["top_level"]), key=lambda r: -r["cumulative_ms"])
+    return {
+        "profile": value,
+        "controllers": modules,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(sum(r["cumulative_ms"] for r in top_level), 1),
+        "peak_rss_mb": round(int(proc.stdout.strip() or 0) / 1024, 1),
+        "modules": len(rows),
+        "top_cumulative": top_level[:top],
+        "top_self": sorted(rows, key=lambda r: -r["self_ms"])[:top],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time report for a SERVICE_PROFILE")
+    parser.add_argument("profile", nargs="?", default=SERVICE_PROFILE)
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    report = import_report(args.profile, args.top)
+    print(f"profile {report['profile']}: {report['modules']} modules, "
+          f"{report['import_ms']:.0f} ms import, {report['wall_ms']:.0f} ms wall, "
+          f"peak RSS {report['peak_rss_mb']:.0f} MB")
+    print("\ntop-level imports by cumulative time")
+    for row in report["top_cumulative"]:
+        print(f"  {row['cumulative_ms']:9.1f} ms  {row['module'].strip()}")
+    print("\nmodules by self time")
+    for row in report["top_self"]:
+        print(f"  {row['self_ms']:9.1f} ms  {row['module'].strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Single Flight - one shared run of an async build per key
+
+Concurrent callers asking for the same missing value (a badge, a catalog's
+derived structure) await one build instead of each starting their own:
+
+    value, joined = await self._inflight.run(key, lambda: build(key))
+
+The build runs as its own task and every caller awaits it through
+asyncio.shield, the first one included: a cancelled caller (a closed
+stream, a disconnected client) only stops its own wait and never cancels
+the build under the others. The build is cancelled once no caller is left
+to receive its result.
+
+Tasks are bound to their event loop; a caller on another loop starts its
+own build.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Flight:
+    """One in-progress build and the number of callers awaiting it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """In-progress builds by key; not thread-safe, use it from event loop code only."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def run(self, key: Hashable, build: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        (result of the build for `key`, joined). joined is True when the
+        caller waited on a build another caller had already started.
+        """
+        loop = asyncio.get_running_loop()
+        flight = self._flights.get(key)
+        joined = flight is not None and flight.task.get_loop() is loop
+        if not joined:
+            flight = _Flight(loop.create_task(self._build(key, build)))
+            self._flights[key] = flight
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), joined
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # every caller went away; nobody would receive the result
+                flight.task.cancel()
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    async def _build(self, key: Hashable, build: Callable[[], Awaitable[T]]) -> T:
+        try:
+            return await build()
+        finally:
+            flight = self._flights.get(key)
+            if flight is not None and flight.task is asyncio.current_task():
+                del self._flights[key]
@@ -1,6 +1,9 @@
 import orjson
-from typing import List
-from google.genai.client import Models
+from typing import TYPE_CHECKING, List
+
+if TYPE_CHECKING:
+    # annotation only; importing google.genai.client costs close to a second of cold start
+    from google.genai.client import Models
 
 
 def emoji_to_codepoints(text: str) -> str:
@@ -27,7 +30,7 @@ def codepoints_to_emoji(unicode_str: str) -> str:
             emojis += p  # fallback if not valid hex
     return emojis
 
-def truncate_by_tokens(texts: List[dict], model: Models, max_tokens: int):
+def truncate_by_tokens(texts: List[dict], model: "Models", max_tokens: int):
     lo, hi = 0, len(texts)
     best_fit = 0
 